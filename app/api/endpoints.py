@@ -1,40 +1,207 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.models.book import BookRecommendationRequest, BookRecommendationResponse
-from app.services.recommendation_service import RecommendationService
+import secrets
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from app.models.book import (
+    BookRecommendationRequest, BookRecommendationResponse,
+    BatchRecommendationRequest, BatchRecommendationResult, BatchRecommendationResponse
+)
+from app.services.recommendation_service import RecommendationService, BookNotFoundError
+from app.services.service_provider import service_provider, ServiceNotReadyError
+from app.services.compute_executor import compute_executor, ExecutorSaturatedError
+from app.core.config import settings
 from app.core.logger import api_logger
+from app.core.metrics import metrics
 
 router = APIRouter()
 
+def get_recommendation_service() -> RecommendationService:
+    try:
+        return service_provider.get()
+    except ServiceNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _filters(request):
+    return request.filters.to_dict() if request.filters else None
+
+def _filters_key(request):
+    return request.filters.key() if request.filters else None
+
+def _job_key(kind, *parts):
+    # The service generation rather than id(service): after a reload frees the old service,
+    # CPython may give the new one the same id while its jobs are still in flight
+    return (kind, service_provider.generation, *parts)
+
 @router.post("/recommend/faiss", response_model=BookRecommendationResponse)
 async def recommend_books_faiss(
-    request: BookRecommendationRequest, 
-    recommendation_service: RecommendationService = Depends(RecommendationService)
+    request: BookRecommendationRequest,
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
-    api_logger.info(f"Received FAISS recommendation request for description: {request.description[:50]}...")
+    api_logger.info("Received FAISS recommendation request for description: %.50s...", request.description)
     try:
-        recommendations = recommendation_service.recommend_books_faiss(request.description, k=request.num_recommendations)
-        api_logger.info(f"Successfully generated {len(recommendations)} FAISS recommendations")
+        recommendations = await compute_executor.run(
+            _job_key("faiss", request.description, request.num_recommendations, _filters_key(request),
+                     request.collapse_duplicates),
+            recommendation_service.recommend_books_faiss, request.description, k=request.num_recommendations,
+            filters=_filters(request), collapse=request.collapse_duplicates
+        )
+        api_logger.info("Successfully generated %d FAISS recommendations", len(recommendations))
         return BookRecommendationResponse(recommendations=recommendations)
     except ValueError as ve:
         api_logger.error(f"ValueError in FAISS recommendation: {str(ve)}")
         raise HTTPException(status_code=422, detail=str(ve))
+    except ExecutorSaturatedError as se:
+        api_logger.warning(f"Rejected FAISS recommendation request: {str(se)}")
+        raise HTTPException(status_code=503, detail=str(se), headers={"Retry-After": "1"})
     except Exception as e:
         api_logger.error(f"Unexpected error in FAISS recommendation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
 @router.post("/recommend/cosine", response_model=BookRecommendationResponse)
 async def recommend_books_cosine(
-    request: BookRecommendationRequest, 
-    recommendation_service: RecommendationService = Depends(RecommendationService)
+    request: BookRecommendationRequest,
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
-    api_logger.info(f"Received Cosine recommendation request for description: {request.description[:50]}...")
+    api_logger.info("Received Cosine recommendation request for description: %.50s...", request.description)
     try:
-        recommendations = recommendation_service.recommend_books_cosine(request.description, k=request.num_recommendations)
-        api_logger.info(f"Successfully generated {len(recommendations)} Cosine recommendations")
+        recommendations = await compute_executor.run(
+            _job_key("cosine", request.description, request.num_recommendations, _filters_key(request),
+                     request.collapse_duplicates),
+            recommendation_service.recommend_books_cosine, request.description, k=request.num_recommendations,
+            filters=_filters(request), collapse=request.collapse_duplicates
+        )
+        api_logger.info("Successfully generated %d Cosine recommendations", len(recommendations))
         return BookRecommendationResponse(recommendations=recommendations)
     except ValueError as ve:
         api_logger.error(f"ValueError in Cosine recommendation: {str(ve)}")
         raise HTTPException(status_code=422, detail=str(ve))
+    except ExecutorSaturatedError as se:
+        api_logger.warning(f"Rejected Cosine recommendation request: {str(se)}")
+        raise HTTPException(status_code=503, detail=str(se), headers={"Retry-After": "1"})
     except Exception as e:
         api_logger.error(f"Unexpected error in Cosine recommendation: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An unexpected error occurred")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+@router.get("/recommend/by-id/{book_id}", response_model=BookRecommendationResponse)
+async def recommend_books_by_id(
+    book_id: str,
+    num_recommendations: int = Query(5, ge=0),
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
+):
+    api_logger.info("Received recommendation request for book %s", book_id)
+    try:
+        recommendations = await compute_executor.run(
+            _job_key("by_id", book_id, num_recommendations),
+            recommendation_service.recommend_books_by_id, book_id, k=num_recommendations
+        )
+        api_logger.info("Successfully generated %d recommendations for book %s", len(recommendations), book_id)
+        return BookRecommendationResponse(recommendations=recommendations)
+    except BookNotFoundError as ne:
+        api_logger.warning(f"Recommendation request for unknown book: {str(ne)}")
+        raise HTTPException(status_code=404, detail=str(ne))
+    except ValueError as ve:
+        api_logger.error(f"ValueError in by-id recommendation: {str(ve)}")
+        raise HTTPException(status_code=422, detail=str(ve))
+    except ExecutorSaturatedError as se:
+        api_logger.warning(f"Rejected by-id recommendation request: {str(se)}")
+        raise HTTPException(status_code=503, detail=str(se), headers={"Retry-After": "1"})
+    except Exception as e:
+        api_logger.error(f"Unexpected error in by-id recommendation: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+def _batch_result(index, outcome):
+    if not isinstance(outcome, Exception):
+        return BatchRecommendationResult(index=index, recommendations=outcome)
+    if isinstance(outcome, ValueError):
+        return BatchRecommendationResult(index=index, error=str(outcome))
+    api_logger.error(f"Unexpected error in batch item {index}: {str(outcome)}", exc_info=outcome)
+    return BatchRecommendationResult(index=index, error="An unexpected error occurred")
+
+async def _run_batch_chunks(recommendation_service, request):
+    """Yield the results of a batch request chunk by chunk, in input order."""
+    chunk_size = settings.BATCH_CHUNK_SIZE
+    for start in range(0, len(request.requests), chunk_size):
+        chunk = [(item.description, item.num_recommendations, _filters(item), item.collapse_duplicates)
+                 for item in request.requests[start:start + chunk_size]]
+        outcomes = await compute_executor.run(None, recommendation_service.recommend_books_batch, chunk, method=request.method)
+        yield [_batch_result(start + offset, outcome) for offset, outcome in enumerate(outcomes)]
+
+async def _stream_batch(recommendation_service, request):
+    try:
+        async for results in _run_batch_chunks(recommendation_service, request):
+            for result in results:
+                yield result.model_dump_json() + "\n"
+    except Exception as e:
+        # The status line is already sent; end the stream with an error line instead
+        api_logger.error(f"Batch recommendation stream aborted: {str(e)}", exc_info=True)
+        yield '{"error": "Batch aborted, results are incomplete"}\n'
+
+@router.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def recommend_books_batch(
+    request: BatchRecommendationRequest,
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
+):
+    api_logger.info("Received batch %s recommendation request for %d descriptions", request.method, len(request.requests))
+    if len(request.requests) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=422, detail=f"A batch holds at most {settings.BATCH_MAX_SIZE} descriptions")
+    if request.stream:
+        return StreamingResponse(_stream_batch(recommendation_service, request), media_type="application/x-ndjson")
+    try:
+        results = []
+        async for chunk_results in _run_batch_chunks(recommendation_service, request):
+            results.extend(chunk_results)
+        api_logger.info("Successfully generated batch recommendations for %d descriptions", len(results))
+        return BatchRecommendationResponse(results=results)
+    except ValueError as ve:
+        api_logger.error(f"ValueError in batch recommendation: {str(ve)}")
+        raise HTTPException(status_code=422, detail=str(ve))
+    except ExecutorSaturatedError as se:
+        api_logger.warning(f"Rejected batch recommendation request: {str(se)}")
+        raise HTTPException(status_code=503, detail=str(se), headers={"Retry-After": "1"})
+    except Exception as e:
+        api_logger.error(f"Unexpected error in batch recommendation: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+@router.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    if not service_provider.ready:
+        return JSONResponse(status_code=503, content={"status": "loading", "reloading": service_provider.reloading})
+    service = service_provider.get()
+    return {
+        "status": "ready",
+        "generation": service_provider.generation,
+        "loaded_at": service_provider.loaded_at,
+        "reloading": service_provider.reloading,
+        "num_books": service.num_books,
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _reload_service():
+    try:
+        service_provider.reload()
+    except Exception:
+        # The previous service stays live; the error is logged by the provider
+        pass
+
+@router.post("/admin/reload", status_code=202, dependencies=[Depends(require_admin_token)])
+async def reload_index(background_tasks: BackgroundTasks):
+    if service_provider.reloading:
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    api_logger.info("Index reload requested")
+    background_tasks.add_task(_reload_service)
+    return {"status": "reloading", "generation": service_provider.generation}
@@ -0,0 +1,116 @@
+import logging
+import re
+import time
+import uuid
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.logger import api_logger, request_id
+from app.core.metrics import metrics, request_timings, RequestTimings
+
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+IN_FLIGHT = metrics.gauge("http_requests_in_flight", "HTTP requests being served")
+# Client-supplied request ids are echoed into logs and headers, so only accept plain tokens
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and, with server_timing, adds a Server-Timing header.
+
+    A plain ASGI middleware (not BaseHTTPMiddleware), so the endpoint runs in the same
+    context and sees the RequestTimings set here.
+    """
+
+    def __init__(self, app, server_timing=False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (metrics.enabled or self.server_timing):
+            return await self.app(scope, receive, send)
+
+        # An outer middleware (request logging) may already collect the stages of this request
+        timings = request_timings.get()
+        token = None
+        if timings is None and self.server_timing:
+            timings = RequestTimings()
+            token = request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.header(total=time.perf_counter() - start))
+            await send(message)
+
+        if metrics.enabled:
+            IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                request_timings.reset(token)
+            if metrics.enabled:
+                IN_FLIGHT.dec()
+                # The matched route's template, not the raw path, keeps label cardinality bounded
+                route = scope.get("route")
+                REQUEST_SECONDS.labels(
+                    scope["method"], getattr(route, "path", "unmatched"), status
+                ).observe(time.perf_counter() - start)
+
+
+class RequestLoggingMiddleware:
+    """Tags every request with an id and writes one structured access log line for it.
+
+    The id comes from the client's X-Request-ID header when it is a plain token, otherwise
+    it is generated; it is returned in X-Request-ID and attached to every log record written
+    while the request is served. The access line carries the route, status, duration and the
+    time spent in each recommendation stage.
+    """
+
+    def __init__(self, app, log_requests=True):
+        self.app = app
+        self.log_requests = log_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = Headers(scope=scope).get("x-request-id")
+        current_id = incoming if incoming and _VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        id_token = request_id.set(current_id)
+        timings = RequestTimings() if self.log_requests else None
+        timings_token = request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", current_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if self.log_requests:
+                self._log(scope, status, time.perf_counter() - start, timings)
+            request_timings.reset(timings_token)
+            request_id.reset(id_token)
+
+    @staticmethod
+    def _log(scope, status, elapsed, timings):
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        if not api_logger.isEnabledFor(level):
+            return
+        route = getattr(scope.get("route"), "path", None)
+        api_logger.log(level, "%s %s %s", scope["method"], scope["path"], status, extra={
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.stages.items()},
+        })
@@ -1,12 +1,98 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Book Recommendation System"
     PROJECT_VERSION: str = "1.0.0"
     V1_STR: str = "/api/v1"
-    OPENAI_API_KEY: str
+    # Needed for the "openai" embedding provider (and query rephrasing) only
+    OPENAI_API_KEY: Optional[str] = None
     GOOGLE_BOOKS_API_KEY: str
     DATA_DIR: str = "data"
+    # Required as X-Admin-Token on admin endpoints (index reload); admin endpoints are disabled when unset
+    ADMIN_TOKEN: Optional[str] = None
+    # Recommendation work runs on a bounded thread pool; requests beyond workers + queue get a 503
+    COMPUTE_MAX_WORKERS: int = 4
+    COMPUTE_MAX_QUEUE: int = 64
+    # Storage precision of the normalized embedding matrix used by cosine search ("float32" or "float16")
+    COSINE_DTYPE: str = "float32"
+    # FAISS index: "flat_ip" (exact), "ivf_flat", "hnsw", or compressed "ivf_pq", "sq8" (int8 scalar
+    # quantization) and "pq" (product quantization), with build parameters (0 = chosen from the
+    # catalog size) and search-time nprobe (IVF) / efSearch (HNSW)
+    FAISS_INDEX_TYPE: str = "flat_ip"
+    FAISS_NLIST: int = 0
+    FAISS_HNSW_M: int = 32
+    FAISS_EF_CONSTRUCTION: int = 200
+    FAISS_PQ_M: int = 0
+    FAISS_PQ_NBITS: int = 8
+    FAISS_NPROBE: int = 16
+    FAISS_EF_SEARCH: int = 64
+    # FAISS_TRUNCATE_DIM indexes only that prefix of each vector (0 = all of it). Compressed or
+    # truncated indexes shortlist FAISS_RERANK_CANDIDATES books per query, which are then scored
+    # exactly against the full vectors of the memory-mapped cosine matrix (0 = no re-rank)
+    FAISS_TRUNCATE_DIM: int = 0
+    FAISS_RERANK_CANDIDATES: int = 100
+    # Sharded search: the corpus is split into SEARCH_SHARDS row ranges, each with its own FAISS
+    # index file, searched concurrently on SEARCH_THREADS threads (0 = one per shard) and merged
+    SEARCH_SHARDS: int = 1
+    SEARCH_THREADS: int = 0
+    # Neighbors precomputed per book for /recommend/by-id by scripts/populate_data.py (0 = no graph);
+    # requests for more than the live neighbors stored fall back to an exact search
+    NEIGHBORS_M: int = 50
+    # Filtered searches (authors, genres) over at most this many books score them exactly instead
+    # of searching the FAISS index with an ID selector
+    FILTER_EXACT_MAX_ROWS: int = 4096
+    # Serve embeddings, the normalized cosine matrix and the FAISS index memory-mapped, so
+    # uvicorn workers on a host share one copy through the page cache
+    USE_MMAP: bool = True
+    # Query embedding cache: in-memory LRU size, entry TTL in seconds (None = no expiry)
+    # and an optional SQLite file that keeps warm embeddings across restarts
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: Optional[float] = 7 * 24 * 3600
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+    # Embedding model: "openai" (text-embedding-3-large, remote), or in-process "tfidf_svd" (fitted
+    # on the catalog by scripts/populate_data.py) or "hashing"; EMBEDDING_DIM sizes the local ones
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_DIM: int = 256
+    # Corpus embedding builds: texts per embed_documents call and number of calls in flight
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    # Duplicate books dropped before embedding: besides repeated ids and identical descriptions, those
+    # whose descriptions have an estimated Jaccard similarity (MinHash over DEDUP_NUM_PERM
+    # permutations of word 3-shingles) of at least DEDUP_NEAR_THRESHOLD (0 = exact duplicates only)
+    DEDUP_NEAR_THRESHOLD: float = 0.8
+    DEDUP_NUM_PERM: int = 128
+    # Text preprocessing of the catalog: worker processes (0 = one per CPU) and books per task
+    PREPROCESSING_WORKERS: int = 0
+    PREPROCESSING_CHUNK_SIZE: int = 64
+    # Query normalization on the FAISS path: "nltk" (word_tokenize) or "regex" (faster, same tokens
+    # on our corpus) and the number of lemmatized tokens kept in its cache
+    QUERY_TOKENIZER: str = "nltk"
+    QUERY_LEMMA_CACHE_SIZE: int = 50_000
+    # /recommend/batch: most descriptions accepted per request, and descriptions per
+    # embed + search job (also the granularity at which streamed results are flushed)
+    BATCH_MAX_SIZE: int = 10_000
+    BATCH_CHUNK_SIZE: int = 256
+    # Google Books harvesting: page requests in flight, request rate limit and retries per page
+    GOOGLE_BOOKS_MAX_CONCURRENCY: int = 8
+    GOOGLE_BOOKS_QPS: float = 5.0
+    GOOGLE_BOOKS_MAX_RETRIES: int = 5
+    # Stage timers, cache/index gauges and /metrics (Prometheus format); with SERVER_TIMING,
+    # responses also carry a Server-Timing header with the time spent in each stage
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING: bool = False
+    # Logging: records go through a queue to a background writer, as JSON lines ("json") or the
+    # plain "text" format, into files rotated at LOG_MAX_BYTES. LOG_SUCCESS_SAMPLE_RATE keeps the
+    # INFO logs of that fraction of requests (warnings and errors are always kept); records beyond
+    # LOG_QUEUE_SIZE waiting to be written are dropped rather than blocking requests
+    LOG_DIR: str = "logs"
+    LOG_FORMAT: str = "json"
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    LOG_QUEUE_SIZE: int = 10_000
+    # Emit one access log line (method, route, status, duration and stage timings) per request
+    LOG_REQUESTS: bool = True
 
     class Config:
         env_file = ".env"
@@ -1,22 +1,185 @@
+import atexit
+import contextvars
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
+import zlib
 from pathlib import Path
+from app.core.config import settings
 
-def setup_logger(name, log_file, level=logging.INFO):
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+# Skip the LogRecord fields we never write (the calling function's frame walk is the most
+# expensive part of creating a record), per "Optimization" in the logging documentation
+logging._srcfile = None
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Set per HTTP request by RequestLoggingMiddleware; compute_executor copies the context into its
+# worker threads, so service logs written on behalf of a request carry its id too
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id, `extra=` fields and traceback."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps warnings and errors, and INFO/DEBUG records of a `rate` fraction of requests.
+
+    The decision hashes the request id, so a request's records are kept or dropped together.
+    Records outside a request (startup, scripts) are always kept.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        current = getattr(record, "request_id", None) or request_id.get()
+        if current is None:
+            return True
+        return zlib.crc32(current.encode()) / 2**32 < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that attaches the request id, keeps the traceback as a field, and drops records when the queue is full."""
+
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Runs on the caller's thread: resolve everything that depends on its state, nothing more.
+        # The record is updated in place rather than copied; it is not used again after handling
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, "request_id", None) is None:
+            current = request_id.get()
+            if current is not None:
+                record.request_id = current
+        return record
+
+    def enqueue(self, record):
+        # A SimpleQueue is much cheaper to put to than queue.Queue; its size bound is checked here.
+        # Never block a request on logging; the loss is visible in /metrics
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
 
-    log_path = Path("logs")
-    log_path.mkdir(exist_ok=True)
-    
-    handler = logging.FileHandler(log_path / log_file)        
-    handler.setFormatter(formatter)
 
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
+class _RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates once the file has grown past max_bytes.
 
-    return logger
+    The stdlib handler formats every record a second time and stats the file to decide that
+    up front; checking the stream position instead halves the writer's work per record.
+    """
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+
+class LogPipeline:
+    """Routes the records of several loggers through one queue to a background writer thread.
+
+    Callers only put the record on the queue; formatting and disk writes happen on the
+    QueueListener thread, into one size-rotated file per logger.
+    """
+
+    def __init__(self, log_dir="logs", fmt="json", max_bytes=50 * 2**20, backup_count=5, sample_rate=1.0, queue_size=10_000):
+        self.log_dir = Path(log_dir)
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = _QueueHandler(self.queue, queue_size)
+        self.queue_handler.addFilter(SuccessSampler(sample_rate))
+        self.file_handlers = []
+        self.listener = None
+
+    @property
+    def dropped(self):
+        return self.queue_handler.dropped
+
+    def add_logger(self, name, log_file, level=logging.INFO):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        handler = _RotatingFileHandler(
+            self.log_dir / log_file, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(JsonFormatter() if self.fmt == "json" else logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        # All records share the queue; each file only takes its own logger's records
+        handler.addFilter(logging.Filter(name))
+        self.file_handlers.append(handler)
+
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(self.queue_handler)
+        logger.propagate = False
+        if self.listener is not None:
+            # The listener's handlers are fixed when it starts
+            self.stop()
+            self.start()
+        return logger
+
+    def start(self):
+        if self.listener is None:
+            self.listener = logging.handlers.QueueListener(self.queue, *self.file_handlers, respect_handler_level=True)
+            self.listener.start()
+
+    def stop(self):
+        """Write out everything queued so far and stop the writer thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for handler in self.file_handlers:
+            handler.flush()
+
+
+log_pipeline = LogPipeline(
+    log_dir=settings.LOG_DIR,
+    fmt=settings.LOG_FORMAT,
+    max_bytes=settings.LOG_MAX_BYTES,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    sample_rate=settings.LOG_SUCCESS_SAMPLE_RATE,
+    queue_size=settings.LOG_QUEUE_SIZE
+)
+
+def setup_logger(name, log_file, level=logging.INFO):
+    return log_pipeline.add_logger(name, log_file, level)
 
 # Create loggers
 main_logger = setup_logger('main_logger', 'main.log')
 api_logger = setup_logger('api_logger', 'api.log')
 service_logger = setup_logger('service_logger', 'service.log')
+
+log_pipeline.start()
+atexit.register(log_pipeline.stop)
@@ -9,14 +9,24 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from app.api.endpoints import router as api_router
+from app.api.middleware import MetricsMiddleware, RequestLoggingMiddleware
+from app.services.service_provider import service_provider
+from app.services.compute_executor import compute_executor
+import app.services.service_metrics  # registers the service gauges served by /metrics
 from app.core.config import settings
-from app.core.logger import main_logger
+from app.core.logger import main_logger, log_pipeline
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
 
 app.include_router(api_router, prefix=settings.V1_STR)
 
+# Request latency metrics and the optional Server-Timing header
+app.add_middleware(MetricsMiddleware, server_timing=settings.SERVER_TIMING)
+# Wraps the metrics middleware, so the request id and stage timings cover everything inside it
+app.add_middleware(RequestLoggingMiddleware, log_requests=settings.LOG_REQUESTS)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -37,7 +47,13 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.on_event("startup")
 async def startup_event():
     main_logger.info("Application is starting up")
+    # Build the shared service (dataframe, FAISS index, embeddings) once, off the event loop
+    await run_in_threadpool(service_provider.load)
+    main_logger.info(f"Recommendation service ready with {service_provider.get().num_books} books")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     main_logger.info("Application is shutting down")
+    compute_executor.shutdown()
+    # Write out the log records still queued for the background writer
+    log_pipeline.stop()
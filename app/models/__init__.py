@@ -1 +1,4 @@
-from .book import RecommendedBook, BookRecommendationRequest, BookRecommendationResponse
\ No newline at end of file
+from .book import (
+    RecommendedBook, BookFilters, BookRecommendationRequest, BookRecommendationResponse,
+    BatchRecommendationRequest, BatchRecommendationResult, BatchRecommendationResponse
+)
\ No newline at end of file
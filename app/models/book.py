@@ -1,5 +1,5 @@
 from pydantic import BaseModel, StringConstraints, Field
-from typing import Annotated, List
+from typing import Annotated, List, Literal, Optional
 
 class RecommendedBook(BaseModel):
     id: str
@@ -8,9 +8,37 @@ class RecommendedBook(BaseModel):
     description: str
     similarity: float
 
+class BookFilters(BaseModel):
+    # Any of the listed authors (case-insensitive) and any of the listed genres; fields are combined with AND
+    authors: Optional[List[str]] = None
+    genres: Optional[List[str]] = None
+
+    def to_dict(self):
+        return {field: values for field, values in self.model_dump().items() if values}
+
+    def key(self):
+        """Hashable form, for coalescing identical requests."""
+        return tuple((field, tuple(values)) for field, values in sorted(self.to_dict().items()))
+
 class BookRecommendationRequest(BaseModel):
     description: Annotated[str, StringConstraints(min_length=1)]
     num_recommendations: int = Field(5, ge=0)
+    filters: Optional[BookFilters] = None
+    # Return at most one edition of each work (same title and authors)
+    collapse_duplicates: bool = False
 
 class BookRecommendationResponse(BaseModel):
     recommendations: List[RecommendedBook]
+
+class BatchRecommendationRequest(BaseModel):
+    requests: Annotated[List[BookRecommendationRequest], Field(min_length=1)]
+    method: Literal["faiss", "cosine"] = "faiss"
+    stream: bool = False
+
+class BatchRecommendationResult(BaseModel):
+    index: int
+    recommendations: Optional[List[RecommendedBook]] = None
+    error: Optional[str] = None
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[BatchRecommendationResult]
@@ -1,18 +1,22 @@
-import json
 import os
 import pandas as pd
 import nltk
-import requests
 from pathlib import Path
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+from app.services.text_cleaning import TextCleaner, clean_book, clean_book_chunk, map_chunks_in_order
+from app.services.columnar_catalog import ColumnarCatalog
+from app.services.books_harvester import BooksHarvester
+from app.services.raw_book_store import RawBookStore
+from app.services.deduplication import Deduplicator, SignatureFiles
+from app.services.data_generations import DataGenerations
 from app.core.config import settings
 
 class BookService:
     def __init__(self):
         self.data_dir = Path(settings.DATA_DIR)
+        self.raw_books = RawBookStore(os.path.join(settings.DATA_DIR, "raw_books"))
+        # Legacy raw volumes file, imported into raw_books on first use
         self.books_file = os.path.join(settings.DATA_DIR, "books.json")
+        # Legacy pickled catalog, converted to the columnar catalog on first load
         self.df_file = os.path.join(settings.DATA_DIR, "books_df.pkl")
         
         # Downloading necessary NLTK data for NLP preprocessing
@@ -21,81 +25,81 @@ class BookService:
             nltk.download('stopwords')
             nltk.download('wordnet')
         
-        self.stop_words = set(stopwords.words('english'))
-        self.lemmatizer = WordNetLemmatizer()
+        self.text_cleaner = TextCleaner()
+        self.stop_words = self.text_cleaner.stop_words
+        self.lemmatizer = self.text_cleaner.lemmatizer
 
     def collect_books(self, query: str = "", max_results: int = 40) -> dict:
-        books_data = {}
-        if max_results > 40:
-            for i in range(0, max_results, 40):
-                url = "https://www.googleapis.com/books/v1/volumes"
-                params = {
-                    "q": query if query else "*",
-                    "maxResults": 40,
-                    "startIndex": i,
-                    "key": settings.GOOGLE_BOOKS_API_KEY
-                }
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                if i == 0:
-                    books_data = response.json()
-                else:
-                    books_data['items'].extend(response.json().get('items', []))
-        else:
-            url = "https://www.googleapis.com/books/v1/volumes"
-            params = {
-                "q": query if query else "*",
-                "maxResults": max_results,
-                "key": settings.GOOGLE_BOOKS_API_KEY
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            books_data = response.json()
-        
-        return books_data
+        with BooksHarvester.from_settings() as harvester:
+            return {"items": list(harvester.harvest([query], max_results))}
+
+    def save_books(self, items):
+        """Append newly collected volumes as a new shard; earlier shards are left untouched."""
+        self._migrate_books_json()
+        return self.raw_books.append(items)
 
     def load_books(self):
-        with open(self.books_file, 'r') as f:
-            return json.load(f)
+        return {'items': list(self.iter_books())}
+
+    def iter_books(self):
+        # Streams volumes one at a time, shard by shard, instead of loading the whole history
+        self._migrate_books_json()
+        return self.raw_books.iter_items()
+
+    def _migrate_books_json(self):
+        if not self.raw_books.exists() and os.path.exists(self.books_file):
+            self.raw_books.import_books_json(self.books_file)
+
+    def clean_data(self, books, workers=1, chunksize=64):
+        return list(self.iter_cleaned_books(books['items'], workers=workers, chunksize=chunksize))
 
-    def clean_data(self, books):
-        cleaned_books = []
-        for book in books['items']:
-            if 'description' in book['volumeInfo']:
-                cleaned_book = {
-                    'id': book['id'],
-                    'title': book['volumeInfo'].get('title', '') + (' - ' + book['volumeInfo'].get('subtitle', '') if book['volumeInfo'].get('subtitle') else ''),
-                    'authors': book['volumeInfo'].get('authors', []),
-                    'processed_description': self._clean_text(book['volumeInfo'].get('description', '')),
-                    'description': book['volumeInfo'].get('description', '')
-                }
-                cleaned_books.append(cleaned_book)
-        return cleaned_books
+    def iter_cleaned_books(self, items, workers=1, chunksize=64):
+        """Yield cleaned books in input order, cleaning chunks on a process pool when workers > 1."""
+        if workers <= 1:
+            cleaned = (clean_book(book, self._clean_text) for book in items)
+        else:
+            cleaned = map_chunks_in_order(clean_book_chunk, items, workers, chunksize)
+        return (book for book in cleaned if book is not None)
 
     def _clean_text(self, text):
-        # Tokenize the text
-        tokens = word_tokenize(text.lower())
+        return self.text_cleaner(text)
 
-        # Remove stopwords and non-alphabetic tokens
-        tokens = [token for token in tokens if token.isalpha() and token not in self.stop_words]
-        
-        # Lemmatize the tokens
-        lemmatized_tokens = [self.lemmatizer.lemmatize(token) for token in tokens]
-        
-        # Join the tokens back into a string
-        cleaned_text = ' '.join(lemmatized_tokens)
-        
-        return cleaned_text
+    @property
+    def catalog_dir(self):
+        """The catalog of the current data generation: the default `catalog_dir` below, which
+        writers building a new generation pass explicitly."""
+        return os.path.join(DataGenerations(settings.DATA_DIR).current_dir(), "catalog")
 
-    def create_dataframe(self):
-        books = self.load_books()
-        cleaned_books = self.clean_data(books)
-        df = pd.DataFrame(cleaned_books)
-        df.to_pickle(self.df_file)
+    def create_dataframe(self, workers=None, catalog_dir=None, signatures_dir=None):
+        """Clean and deduplicate the raw volumes into the catalog. With `signatures_dir`, the content
+        hashes and MinHash signatures of the kept books are stored there for incremental updates."""
+        workers = workers or settings.PREPROCESSING_WORKERS or os.cpu_count()
+        cleaned_books = self.iter_cleaned_books(self.iter_books(), workers=workers, chunksize=settings.PREPROCESSING_CHUNK_SIZE)
+        # Harvests overlap and are appended run after run, so the same volume (or edition) recurs
+        books, report = Deduplicator.from_settings().deduplicate(cleaned_books)
+        df = pd.DataFrame(books)
+        self.save_dataframe(df, catalog_dir)
+        if signatures_dir is not None:
+            SignatureFiles.from_settings(signatures_dir).save(report.kept)
         return df
 
-    def load_dataframe(self):
-        if os.path.exists(self.df_file):
-            return pd.read_pickle(self.df_file)
+    def save_dataframe(self, df, catalog_dir=None):
+        ColumnarCatalog.write(df, catalog_dir or self.catalog_dir)
+
+    def load_dataframe(self, catalog_dir=None):
+        catalog_dir = catalog_dir or self.catalog_dir
+        if ColumnarCatalog.exists(catalog_dir):
+            return ColumnarCatalog(catalog_dir).to_dataframe()
+        elif os.path.exists(self.df_file):
+            df = pd.read_pickle(self.df_file)
+            self.save_dataframe(df, catalog_dir)
+            return df
         else:
-            return self.create_dataframe()
\ No newline at end of file
+            return self.create_dataframe(catalog_dir=catalog_dir)
+
+    def load_catalog(self, catalog_dir=None):
+        """The catalog for serving: columns are memory-mapped and read on demand."""
+        catalog_dir = catalog_dir or self.catalog_dir
+        if not ColumnarCatalog.exists(catalog_dir):
+            self.load_dataframe(catalog_dir)
+        return ColumnarCatalog(catalog_dir, mmap=settings.USE_MMAP)
\ No newline at end of file
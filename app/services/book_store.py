@@ -0,0 +1,89 @@
+import numpy as np
+from app.models import RecommendedBook
+from app.services.columnar_catalog import StringColumn
+from app.services.deduplication import work_key
+
+
+class BookMetadataStore:
+    """Compact, array-backed book metadata addressed by row position.
+
+    Row i holds the book whose vector is row i of the embedding matrix. Only the fields
+    returned to clients are kept (no processed_description), and both search engines
+    resolve their hits through the same store, so results are assembled in O(k).
+    Built from a ColumnarCatalog, the columns stay memory-mapped and only the k books
+    of a result are decoded; `rows` then maps positions to catalog rows.
+    """
+
+    COLUMNS = ("id", "title", "authors", "description")
+
+    def __init__(self, ids, titles, authors, descriptions, rows=None):
+        self.ids = _as_column(ids)
+        self.titles = _as_column(titles)
+        self.authors = _as_column(authors)
+        self.descriptions = _as_column(descriptions)
+        if not len(self.ids) == len(self.titles) == len(self.authors) == len(self.descriptions):
+            raise ValueError("All metadata columns must have the same length")
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self._positions = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(df['id'], df['title'], df['authors'], df['description'])
+
+    @classmethod
+    def from_catalog(cls, catalog, rows=None):
+        return cls(*(catalog.column(name) for name in cls.COLUMNS), rows=rows)
+
+    def __len__(self):
+        return len(self.ids) if self.rows is None else len(self.rows)
+
+    def position_of(self, book_id):
+        # Built on first use (the first /recommend/by-id request), since it decodes every id
+        if self._positions is None:
+            ids = self.ids.tolist()
+            positions = {}
+            for position in range(len(self)):
+                positions.setdefault(ids[self._row(position)], position)
+            self._positions = positions
+        return self._positions.get(book_id)
+
+    def _row(self, position):
+        return position if self.rows is None else self.rows[position]
+
+    def distinct_works(self, positions):
+        """Indices into `positions` of the first hit of each work (title and authors), in order."""
+        seen = set()
+        keep = []
+        for i, position in enumerate(positions):
+            row = self._row(position)
+            key = work_key(self.titles[row], self.authors[row])
+            if key not in seen:
+                seen.add(key)
+                keep.append(i)
+        return np.array(keep, dtype=np.int64)
+
+    def to_recommended_books(self, positions, scores):
+        books = []
+        for position, score in zip(positions, scores):
+            row = self._row(position)
+            books.append(RecommendedBook(
+                id=self.ids[row],
+                title=self.titles[row],
+                authors=list(self.authors[row]),
+                description=self.descriptions[row],
+                similarity=float(score)
+            ))
+        return books
+
+
+def _as_column(values):
+    # Catalog columns are used as they are (memory-mapped); anything else becomes an object array
+    return values if isinstance(values, StringColumn) else _object_array(values)
+
+
+def _object_array(values):
+    # Built element by element so list values (authors) are stored as objects, not broadcast
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from app.core.config import settings
+from app.core.logger import service_logger
+
+VOLUMES_URL = "https://www.googleapis.com/books/v1/volumes"
+# Largest maxResults the volumes API accepts
+PAGE_SIZE = 40
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces calls at least 1/qps seconds apart across all threads sharing it."""
+
+    def __init__(self, qps):
+        if qps <= 0:
+            raise ValueError("qps must be greater than 0")
+        self.interval = 1.0 / qps
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Reserve the next free slot under the lock, then sleep outside it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BooksHarvester:
+    """Fetches Google Books volumes for many queries concurrently.
+
+    Every (query, startIndex) page is a separate task on a thread pool, sent through one
+    pooled `requests.Session` under a shared QPS limit. 429s, 5xx and connection errors are
+    retried with jittered exponential backoff (honoring Retry-After). Once a page of a query
+    comes back short, its later pages are skipped.
+    """
+
+    def __init__(self, api_key=None, url=VOLUMES_URL, max_concurrency=8, qps=5.0, max_retries=5,
+                 backoff=0.5, max_backoff=30.0, timeout=30.0, session=None):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than 0")
+        self.api_key = api_key
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(qps)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session or self._create_session(max_concurrency)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            api_key=settings.GOOGLE_BOOKS_API_KEY,
+            max_concurrency=settings.GOOGLE_BOOKS_MAX_CONCURRENCY,
+            qps=settings.GOOGLE_BOOKS_QPS,
+            max_retries=settings.GOOGLE_BOOKS_MAX_RETRIES
+        )
+
+    @staticmethod
+    def _create_session(pool_size):
+        session = requests.Session()
+        # One keep-alive connection per worker thread, instead of a new connection per request
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def harvest(self, queries, max_results_per_query):
+        """Yield the volumes of all `queries`, each `id` once, in the order pages complete.
+
+        Each volume gets a `harvestQueries` list naming the queries that returned it (the genres
+        of populate_data.py). A volume is yielded the first time it is seen; queries that return
+        it later are appended to that same list, so it is complete once harvesting is done.
+        """
+        pages = [(query, start, min(PAGE_SIZE, max_results_per_query - start))
+                 for query in queries for start in range(0, max_results_per_query, PAGE_SIZE)]
+        # Smallest startIndex known to be past the end of each query's results
+        exhausted = {}
+        exhausted_lock = threading.Lock()
+
+        def fetch(query, start, size):
+            with exhausted_lock:
+                if start >= exhausted.get(query, float("inf")):
+                    return query, []
+            items = self.fetch_page(query, start, size)
+            if len(items) < size:
+                with exhausted_lock:
+                    exhausted[query] = min(exhausted.get(query, float("inf")), start + PAGE_SIZE)
+            return query, items
+
+        seen = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(fetch, *page) for page in pages]
+            try:
+                for future in as_completed(futures):
+                    query, items = future.result()
+                    for item in items:
+                        book_id = item.get("id")
+                        if book_id is not None and book_id in seen:
+                            harvest_queries = seen[book_id]
+                            if query not in harvest_queries:
+                                harvest_queries.append(query)
+                            continue
+                        item["harvestQueries"] = [query]
+                        if book_id is not None:
+                            seen[book_id] = item["harvestQueries"]
+                        yield item
+            finally:
+                # Stop queued pages when the consumer stops early or a page failed for good
+                for future in futures:
+                    future.cancel()
+
+    def fetch_page(self, query, start_index=0, max_results=PAGE_SIZE):
+        params = {"q": query or "*", "maxResults": max_results, "startIndex": start_index}
+        if self.api_key:
+            params["key"] = self.api_key
+        return self._get(params).get("items", [])
+
+    def _get(self, params):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                service_logger.warning(f"Google Books request failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = max(self._backoff_delay(attempt), min(_retry_after(response), self.max_backoff))
+                service_logger.warning(f"Google Books returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _backoff_delay(self, attempt):
+        # Full jitter: spreads out retries of pages that failed together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0.0
@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+STRING_COLUMNS = ("id", "title", "description", "processed_description")
+LIST_COLUMNS = ("authors", "genres")
+# ASCII unit separator: joins the authors of a book, never appears in Google Books metadata
+LIST_SEPARATOR = "\x1f"
+
+
+class StringColumn:
+    """UTF-8 strings stored as one byte buffer plus int64 offsets; values are decoded on access.
+
+    Both arrays can be memory-mapped, so opening a column costs nothing until values are read.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def open(cls, directory, name, mmap=True):
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode='r' if mmap else None)
+        data_path = os.path.join(directory, f"{name}.data")
+        # np.memmap cannot map an empty file
+        if os.path.getsize(data_path) == 0:
+            data = np.empty(0, dtype=np.uint8)
+        elif mmap:
+            data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        else:
+            data = np.fromfile(data_path, dtype=np.uint8)
+        return cls(offsets, data)
+
+    @staticmethod
+    def write(directory, name, values):
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+        with open(os.path.join(directory, f"{name}.data"), 'wb') as f:
+            f.write(b''.join(encoded))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def tolist(self):
+        # One decode of the whole buffer, then slicing, is much faster than decoding row by row
+        text = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [text[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+class ListColumn(StringColumn):
+    """A StringColumn of lists of strings, joined with LIST_SEPARATOR."""
+
+    @staticmethod
+    def write(directory, name, values):
+        StringColumn.write(directory, name, [LIST_SEPARATOR.join(value) for value in values])
+
+    def __getitem__(self, row):
+        value = super().__getitem__(row)
+        return value.split(LIST_SEPARATOR) if value else []
+
+    def tolist(self):
+        return [value.split(LIST_SEPARATOR) if value else [] for value in super().tolist()]
+
+
+class ColumnarCatalog:
+    """The book catalog as a directory of per-column files, memory-mapped.
+
+    manifest.json lists the columns and the row count. The directory belongs to one data
+    generation and is never rewritten in place: DataGenerations commits catalog, embeddings
+    and indexes together. All columns are opened when the catalog is, so an open catalog keeps
+    reading its files after a later generation has deleted them.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory, mmap=True):
+        self.directory = directory
+        self.mmap = mmap
+        with open(os.path.join(directory, self.MANIFEST), 'r') as f:
+            manifest = json.load(f)
+        self.num_rows = manifest["num_rows"]
+        self.columns = tuple(manifest["columns"])
+        # Catalogs written before data generations kept their columns in a nested generation directory
+        self.columns_dir = os.path.join(directory, manifest["generation"]) if "generation" in manifest else directory
+        # Opening memory-maps the files without reading them
+        self._columns = {
+            name: (ListColumn if name in LIST_COLUMNS else StringColumn).open(self.columns_dir, name, mmap=mmap)
+            for name in self.columns
+        }
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.MANIFEST))
+
+    def __len__(self):
+        return self.num_rows
+
+    def column(self, name):
+        if name not in self._columns:
+            raise KeyError(f"Catalog has no column {name!r}")
+        return self._columns[name]
+
+    def to_dataframe(self, columns=None):
+        columns = columns or self.columns
+        return pd.DataFrame({name: self.column(name).tolist() for name in columns}, columns=list(columns))
+
+    @classmethod
+    def write(cls, df, directory):
+        """Write the catalog columns of `df` to `directory`, replacing what it held."""
+        # In a new data generation the old files are hard links shared with the current one:
+        # they are unlinked, never overwritten
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        columns = [name for name in STRING_COLUMNS + LIST_COLUMNS if name in df.columns]
+        for name in columns:
+            if name in LIST_COLUMNS:
+                ListColumn.write(directory, name, [list(value) for value in df[name]])
+            else:
+                StringColumn.write(directory, name, [str(value) for value in df[name]])
+        # Written last, so a catalog whose write was interrupted is never opened
+        tmp_path = os.path.join(directory, f"{cls.MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"num_rows": len(df), "columns": columns}, f)
+        os.replace(tmp_path, os.path.join(directory, cls.MANIFEST))
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+
+
+class ExecutorSaturatedError(RuntimeError):
+    pass
+
+
+class ComputeExecutor:
+    """Runs blocking recommendation work (text cleaning, embedding calls, similarity search)
+    on a bounded thread pool so it never blocks the event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait for a worker;
+    anything beyond that is rejected with ExecutorSaturatedError. Jobs submitted with the same
+    key while one is still running share its result instead of being computed again.
+    All bookkeeping happens on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._inflight = {}
+        self.pending = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        future = self._inflight.get(key) if key is not None else None
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._submit(key, functools.partial(func, *args, **kwargs))
+        # shield: a cancelled (disconnected) caller must not cancel work other callers are awaiting
+        return await asyncio.shield(future)
+
+    def _submit(self, key, job):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturatedError("Server is busy, please retry later")
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compute")
+        self.pending += 1
+        # Run in a copy of the caller's context (like asyncio.to_thread), so per-request state such
+        # as Server-Timing stages is visible in the worker thread
+        future = asyncio.get_running_loop().run_in_executor(self._executor, contextvars.copy_context().run, job)
+        if key is not None:
+            self._inflight[key] = future
+        future.add_done_callback(functools.partial(self._on_done, key))
+        return future
+
+    def _on_done(self, key, future):
+        self.pending -= 1
+        if key is not None and self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception as retrieved when every waiter went away
+            future.exception()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+compute_executor = ComputeExecutor(max_workers=settings.COMPUTE_MAX_WORKERS, max_queue=settings.COMPUTE_MAX_QUEUE)
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+
+
+class CosineSearchEngine:
+    """Exact cosine-similarity top-k search over an in-memory embedding matrix.
+
+    The corpus is L2-normalized once at load time into a contiguous float32 (or float16)
+    array, so a query is a single matrix-vector product followed by an O(N) argpartition.
+    With normalized=True the matrix is used as given, which keeps a memory-mapped matrix
+    (see load_normalized_matrix) shared with other processes instead of copying it.
+    `positions` maps matrix rows to result positions, -1 marking rows that are never returned.
+    """
+
+    # float16 has no BLAS kernels, so half-precision rows are upcast in blocks of this size
+    _BLOCK_ROWS = 65536
+
+    def __init__(self, embeddings, dtype="float32", positions=None, normalized=False):
+        if normalized:
+            matrix = np.asarray(embeddings)
+            if matrix.dtype != np.dtype(dtype) or not matrix.flags["C_CONTIGUOUS"]:
+                raise ValueError(f"A normalized matrix must be a contiguous {dtype} array")
+        else:
+            matrix = np.array(embeddings, dtype=np.float32)
+            if matrix.ndim == 2:
+                _normalize_rows(matrix)
+            matrix = np.ascontiguousarray(matrix, dtype=np.dtype(dtype))
+        if matrix.ndim != 2:
+            raise ValueError("Embeddings must be a 2-dimensional matrix")
+        self.matrix = matrix
+        self.positions = None if positions is None else np.asarray(positions, dtype=np.int64)
+        self.dead_rows = np.empty(0, dtype=np.int64) if positions is None else np.flatnonzero(self.positions < 0)
+
+    def __len__(self):
+        return self.matrix.shape[0] - len(self.dead_rows)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def shard(self, start, stop):
+        """Engine over rows [start, stop) of this one, sharing its matrix (a view, not a copy)."""
+        positions = np.arange(start, stop) if self.positions is None else self.positions[start:stop]
+        return CosineSearchEngine(self.matrix[start:stop], dtype=self.matrix.dtype, positions=positions, normalized=True)
+
+    def search(self, query, k):
+        """Return (indices, scores) of the k rows most similar to `query`, best first."""
+        indices, scores = self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k)
+        return indices[0], scores[0]
+
+    def search_batch(self, queries, k):
+        """Search several queries with one matrix-matrix product. Returns (m, k) arrays."""
+        queries = self._normalize_queries(queries)
+        scores = self._scores(queries)
+        if len(self.dead_rows):
+            scores[:, self.dead_rows] = -np.inf
+        indices = top_k(scores, min(k, len(self)))
+        scores = np.take_along_axis(scores, indices, axis=1)
+        return (indices if self.positions is None else self.positions[indices]), scores
+
+    def search_subset(self, query, rows, k):
+        """Exact top-k among the matrix `rows` only; just those rows are read and scored."""
+        query = self._normalize_queries(query)[0]
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.empty(len(rows), dtype=np.float32)
+        # Gathered in blocks, so a large subset never needs a full copy of its rows
+        for start in range(0, len(rows), self._BLOCK_ROWS):
+            block = self.matrix[rows[start:start + self._BLOCK_ROWS]]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        if len(self.dead_rows):
+            scores[self.positions[rows] < 0] = -np.inf
+        best = top_k(scores, min(k, len(rows)))[0]
+        best = best[np.isfinite(scores[best])]
+        indices = rows[best]
+        return (indices if self.positions is None else self.positions[indices]), scores[best]
+
+    def _normalize_queries(self, queries):
+        queries = np.array(queries, dtype=np.float32, ndmin=2)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.dim}")
+        return _normalize_rows(queries)
+
+    def _scores(self, queries):
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        rows = self.matrix.shape[0]
+        scores = np.empty((queries.shape[0], rows), dtype=np.float32)
+        for start in range(0, rows, self._BLOCK_ROWS):
+            block = self.matrix[start:start + self._BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+
+def top_k(scores, k):
+    """Indices of the k largest values in each row of `scores`, sorted best first."""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def load_normalized_matrix(source_path, path, dtype="float32", block_rows=65536):
+    """Open an L2-normalized copy of the .npy matrix at `source_path`, memory-mapped read-only.
+
+    The copy is written to `path` when it is missing, older than the source, or has a different
+    number of rows, in blocks so memory stays bounded. Every process that opens it shares the
+    same page-cache pages.
+    """
+    source = np.load(source_path, mmap_mode='r')
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        matrix = np.load(path, mmap_mode='r')
+        if matrix.shape == source.shape and matrix.dtype == np.dtype(dtype):
+            return matrix
+
+    # Per-process temporary name: several workers starting at once may all find the copy stale
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.dtype(dtype), shape=source.shape)
+    for start in range(0, source.shape[0], block_rows):
+        block = np.array(source[start:start + block_rows], dtype=np.float32)
+        matrix[start:start + len(block)] = _normalize_rows(block)
+    matrix.flush()
+    del matrix
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import numpy as np
+from app.core.logger import service_logger
+
+MANIFEST_FILE = "generation.json"
+GENERATIONS_DIR = "generations"
+# What a generation holds; everything else in DATA_DIR (raw volumes, caches, checkpoints) is shared
+SERVING_FILE_PREFIXES = ("embeddings", "tombstones", "faiss", "neighbor", "dedup", "tfidf_svd")
+SERVING_DIRS = ("catalog",)
+
+
+class InconsistentDataError(RuntimeError):
+    pass
+
+
+def check_row_counts(**counts):
+    """Raise InconsistentDataError unless the given row counts (None = not stored) are all equal."""
+    known = {name: count for name, count in counts.items() if count is not None}
+    if len(set(known.values())) > 1:
+        details = ", ".join(f"{name}: {count}" for name, count in known.items())
+        raise InconsistentDataError(f"Stored data is inconsistent ({details} rows); rebuild it with scripts/populate_data.py")
+
+
+def save_npy(path, array):
+    """np.save through a per-process temporary file and a rename, so `path` is never rewritten in place."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # File systems without hard links
+        shutil.copyfile(source, target)
+
+
+class DataGenerations:
+    """The serving data of DATA_DIR (catalog, embeddings.npy, tombstones.npy, FAISS indexes,
+    neighbor graph, deduplication signatures, fitted embedding model) as numbered generation directories, one of them current.
+
+    generation.json names the current generation and its row count. An update builds the next
+    generation from hard links to the current one's files, changes it, and commits it by
+    atomically replacing generation.json: readers see all of the old files or all of the new
+    ones, and a crash before the commit leaves the current generation as it was. Linked files
+    are shared, so writers only ever replace files (write then rename), never modify them in
+    place. Without generation.json (data written before generations),
+    DATA_DIR itself is the current generation, and the first commit moves off it.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+        self.generations_dir = os.path.join(data_dir, GENERATIONS_DIR)
+
+    def _manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def current(self):
+        """(directory, row count) of the current generation; the row count is None for DATA_DIR itself."""
+        manifest = self._manifest()
+        if manifest is None:
+            return self.data_dir, None
+        return os.path.join(self.generations_dir, manifest["generation"]), manifest["num_rows"]
+
+    def current_dir(self):
+        return self.current()[0]
+
+    def begin(self, link=True):
+        """Directory of a new, uncommitted generation holding links to the current generation's
+        data, or nothing without `link` (full rebuilds)."""
+        manifest = self._manifest()
+        number = int(manifest["generation"][1:]) + 1 if manifest else 0
+        directory = os.path.join(self.generations_dir, f"g{number:06d}")
+        # A leftover from an update that crashed before committing is never referenced; start over
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        source = self.current_dir()
+        for name in os.listdir(source) if link else ():
+            path = os.path.join(source, name)
+            if name in SERVING_DIRS and os.path.isdir(path):
+                shutil.copytree(path, os.path.join(directory, name), copy_function=_link_or_copy)
+            elif name.startswith(SERVING_FILE_PREFIXES) and not name.endswith(".tmp") and os.path.isfile(path):
+                _link_or_copy(path, os.path.join(directory, name))
+        return directory
+
+    def commit(self, directory, num_rows):
+        """Make `directory` (from begin()) the current generation."""
+        previous = self._manifest()
+        generation = os.path.basename(directory)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"generation": generation, "num_rows": num_rows}, f)
+        os.replace(tmp_path, self.manifest_path)
+        if previous is None:
+            service_logger.info(f"Serving data moved to {self.generations_dir}; its files in {self.data_dir} are no longer read")
+        # Readers that read the previous manifest may still be opening its files; older generations
+        # (and leftovers of crashed updates) are no longer referenced
+        keep = {generation, previous["generation"] if previous else None}
+        for entry in os.listdir(self.generations_dir):
+            if entry not in keep:
+                shutil.rmtree(os.path.join(self.generations_dir, entry), ignore_errors=True)
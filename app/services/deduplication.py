@@ -0,0 +1,357 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from dataclasses import dataclass, field
+import os
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.services.data_generations import save_npy
+from app.core.logger import service_logger
+
+# Title parts: the main title, then subtitles (after ":" or clean_book's " - ") and bracketed notes
+_TITLE_PARTS = re.compile(r"[:()\[\]]|\s[-\u2013\u2014]\s")
+# Words of edition and format notes: "40th Anniversary Edition", "Revised and Updated", "Paperback",
+# "Collector's Edition" (split at the apostrophe)
+_EDITION_WORDS = re.compile(
+    r"\d+(?:st|nd|rd|th)?|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|new|edition|editions|ed|"
+    r"reprint|reissue|printing|revised|updated|expanded|complete|unabridged|abridged|annotated|illustrated|deluxe|"
+    r"special|anniversary|collectors?|s|paperback|hardcover|hardback|mass|market|large|print|ebook|kindle|"
+    r"international|the|a|an|and|with|novel"
+)
+_NON_WORD = re.compile(r"[\W_]+")
+
+DIGESTS_FILE = "dedup_digests.npy"
+SIGNATURES_FILE = "dedup_signatures.npy"
+# Signature row of a text without words; never a near-duplicate of anything
+NO_SIGNATURE = np.iinfo(np.uint32).max
+
+
+def content_hash(text):
+    """Hash of a processed description, insensitive to whitespace and case."""
+    return hashlib.sha1(" ".join(text.split()).casefold().encode("utf-8")).hexdigest()
+
+
+def _normalized_title(title):
+    # "Dune (40th Anniversary Edition)", "Dune: Deluxe Edition" and "DUNE [Paperback]" are all "dune",
+    # but "The Art of Computer Programming - Volume 1" and "... - Volume 3" are different works
+    parts = [_NON_WORD.sub(" ", part).split() for part in _TITLE_PARTS.split(unicodedata.normalize("NFKC", str(title)).casefold())]
+    parts = [words for words in parts if words]
+    if not parts:
+        return ""
+    notes = [words for words in parts[1:] if not all(_EDITION_WORDS.fullmatch(word) for word in words)]
+    return " ".join(word for words in [parts[0]] + notes for word in words)
+
+
+def _normalized_author(author):
+    # "J.K. Rowling" and "J. K. Rowling" are the same author
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", str(author)).casefold())
+
+
+def work_key(title, authors):
+    """Books with the same title and authors are editions of one work, whatever their description.
+
+    Titles are compared without edition and format notes (subtitles or bracketed parts made
+    only of words such as "2nd Edition" or "Paperback"), punctuation and case, and authors
+    without punctuation, spacing, case and order.
+    """
+    return _normalized_title(title), tuple(sorted({_normalized_author(a) for a in authors} - {""}))
+
+
+class MinHasher:
+    """MinHash signatures of the word shingles of a text.
+
+    The share of equal components of two signatures estimates the Jaccard similarity of
+    their shingle sets. Signatures are split into `bands` bands for locality-sensitive
+    hashing: texts whose Jaccard similarity is above about (1 / bands) ** (1 / rows) share a
+    band with high probability, so only those pairs are ever compared.
+    Shingles are hashed with CRC-32 rather than Python's per-process salted hash(), so a
+    text has the same signature in every process and rebuilds drop the same books.
+    """
+
+    def __init__(self, num_perm=128, shingle_size=3, threshold=0.8, seed=0):
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd multipliers, products wrap modulo 2^64, the high 32 bits are kept
+        self.a = (rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        # Combine the components of a band into one 64-bit key
+        self.band_multipliers = (rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # The band count whose S-curve threshold is closest to ours without exceeding it: pairs
+        # above the S-curve threshold are still missed now and then, so it must sit below ours
+        # (candidates are compared on their full signatures anyway)
+        divisors = [d for d in range(1, num_perm + 1) if num_perm % d == 0]
+        below = [d for d in divisors if (1 / d) ** (d / num_perm) <= threshold] or [num_perm]
+        self.bands = max(below, key=lambda b: (1 / b) ** (b / num_perm))
+
+    def signature(self, text):
+        """uint32 signature of `text`, or None when it has no words."""
+        tokens = text.split()
+        if not tokens:
+            return None
+        size = min(self.shingle_size, len(tokens))
+        shingles = {zlib.crc32(" ".join(shingle).encode("utf-8")) for shingle in zip(*(tokens[i:] for i in range(size)))}
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        products = self.a[:, None] * hashes + self.b[:, None]
+        return (products >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts):
+        """(len(texts), num_perm) signatures, NO_SIGNATURE rows for texts without words."""
+        rows = np.full((len(texts), self.num_perm), NO_SIGNATURE, dtype=np.uint32)
+        for i, text in enumerate(texts):
+            signature = self.signature(text)
+            if signature is not None:
+                rows[i] = signature
+        return rows
+
+    def band_hashes(self, signatures):
+        """(n, bands) uint64 keys of the bands of (n, num_perm) signatures; equal bands have equal keys."""
+        signatures = np.asarray(signatures, dtype=np.uint64).reshape(len(signatures), self.bands, -1)
+        multipliers = self.band_multipliers[:signatures.shape[2]]
+        return (signatures * multipliers).sum(axis=2, dtype=np.uint64)
+
+
+@dataclass
+class SignedBooks:
+    """Content hashes (bytes) and MinHash signatures of books, row for row with `ids`.
+
+    `signatures` is None when near-duplicates are not looked for.
+    """
+    ids: List[str]
+    digests: np.ndarray
+    signatures: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        return SignedBooks([self.ids[row] for row in rows], self.digests[rows],
+                           None if self.signatures is None else self.signatures[rows])
+
+    def select(self, ids):
+        """The rows of `ids`, in that order."""
+        rows = {book_id: row for row, book_id in enumerate(self.ids)}
+        return self.take([rows[book_id] for book_id in ids])
+
+    @staticmethod
+    def concat(parts):
+        # Empty parts may lack signatures without making the result lack them
+        parts = [part for part in parts if len(part)] or list(parts)[:1]
+        signatures = [part.signatures for part in parts]
+        return SignedBooks(
+            [book_id for part in parts for book_id in part.ids],
+            np.concatenate([part.digests for part in parts]),
+            None if any(rows is None for rows in signatures) else np.concatenate(signatures)
+        )
+
+
+class SignatureFiles:
+    """Content hashes and MinHash signatures of every stored catalog row, kept in a data
+    generation next to embeddings.npy (row i for row i), so incremental updates sign only
+    the incoming books instead of the whole catalog.
+    """
+
+    def __init__(self, data_dir, num_perm):
+        self.digests_path = os.path.join(data_dir, DIGESTS_FILE)
+        self.signatures_path = os.path.join(data_dir, SIGNATURES_FILE)
+        self.num_perm = num_perm
+
+    @classmethod
+    def from_settings(cls, data_dir):
+        return cls(data_dir, settings.DEDUP_NUM_PERM)
+
+    def load(self, ids, with_signatures=True):
+        """SignedBooks of the rows of `ids`, or None if the stored files do not cover exactly those rows."""
+        if not os.path.exists(self.digests_path):
+            return None
+        digests = np.load(self.digests_path)
+        signatures = None
+        if with_signatures:
+            if not os.path.exists(self.signatures_path):
+                return None
+            signatures = np.load(self.signatures_path, mmap_mode='r')
+            if signatures.shape != (len(ids), self.num_perm):
+                return None
+        if len(digests) != len(ids):
+            return None
+        return SignedBooks(list(ids), digests, signatures)
+
+    def save(self, signed):
+        save_npy(self.digests_path, signed.digests)
+        if signed.signatures is not None:
+            save_npy(self.signatures_path, signed.signatures)
+        elif os.path.exists(self.signatures_path):
+            os.remove(self.signatures_path)
+
+    def remove(self):
+        for path in (self.digests_path, self.signatures_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@dataclass
+class DedupReport:
+    duplicate_ids: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    # Dropped book id -> id of the book kept in its place
+    duplicates: Dict[str, str] = field(default_factory=dict)
+    # Content hashes and signatures of the kept books
+    kept: Optional[SignedBooks] = None
+
+    @property
+    def dropped(self):
+        return self.duplicate_ids + self.exact_duplicates + self.near_duplicates
+
+
+class Deduplicator:
+    """Drops duplicate books from cleaned catalog rows before they are embedded.
+
+    In order: repeated ids (the volume harvested again; its latest version is kept),
+    identical processed descriptions (content hash), and, with a threshold, near-identical
+    ones (MinHash/LSH estimated Jaccard similarity of word shingles at least `threshold`).
+    The first book of each group is kept, and the genres of the dropped ones are merged into it.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=3):
+        self.threshold = threshold
+        self.minhasher = MinHasher(num_perm, shingle_size, threshold) if threshold else None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(threshold=settings.DEDUP_NEAR_THRESHOLD, num_perm=settings.DEDUP_NUM_PERM)
+
+    def sign(self, ids, texts):
+        """SignedBooks of processed descriptions `texts`."""
+        texts = list(texts)
+        digests = np.array([content_hash(text) for text in texts], dtype="S40")
+        return SignedBooks(list(ids), digests, None if self.minhasher is None else self.minhasher.signatures(texts))
+
+    def deduplicate(self, books, existing=None):
+        """(kept books, DedupReport) for `books`.
+
+        `existing` are the SignedBooks of books already in the catalog; new books duplicating
+        one of them are dropped too, and the existing ones are left as they are.
+        """
+        report = DedupReport()
+        by_id = {}
+        for book in books:
+            previous = by_id.get(book['id'])
+            if previous is not None:
+                report.duplicate_ids += 1
+                book = {**book, 'genres': _merged(previous.get('genres', []), book.get('genres', []))}
+            # A copy: merging the genres of duplicates must not change the caller's dicts
+            by_id[book['id']] = dict(book)
+
+        index = _ExistingIndex(existing, self.minhasher) if existing is not None and len(existing) else None
+        hashes = {}
+        buckets = {}
+        signatures = {}
+        kept, kept_digests, kept_signatures = [], [], []
+        for book in by_id.values():
+            text = book['processed_description']
+            digest, signature = content_hash(text), None
+            original = index.exact_duplicate_of(digest) if index is not None else None
+            original = original or hashes.get(digest)
+            if original is not None:
+                report.exact_duplicates += 1
+            else:
+                signature = self._signature(text)
+                original = self._near_duplicate_of(signature, buckets, signatures, index)
+                if original is not None:
+                    report.near_duplicates += 1
+            if original is None:
+                self._remember(book['id'], digest, signature, hashes, buckets, signatures)
+                kept.append(book)
+                kept_digests.append(digest)
+                kept_signatures.append(signature)
+                continue
+            report.duplicates[book['id']] = original
+            if original in by_id and by_id[original] is not book:
+                by_id[original]['genres'] = _merged(by_id[original].get('genres', []), book.get('genres', []))
+
+        report.kept = SignedBooks([book['id'] for book in kept], np.array(kept_digests, dtype="S40"))
+        if self.minhasher is not None:
+            report.kept.signatures = np.full((len(kept), self.minhasher.num_perm), NO_SIGNATURE, dtype=np.uint32)
+            for row, signature in enumerate(kept_signatures):
+                if signature is not None:
+                    report.kept.signatures[row] = signature
+        if report.dropped:
+            service_logger.info(f"Deduplication dropped {report.duplicate_ids} repeated ids, {report.exact_duplicates} "
+                                f"identical and {report.near_duplicates} near-identical descriptions")
+        return kept, report
+
+    def _signature(self, text):
+        return None if self.minhasher is None else self.minhasher.signature(text)
+
+    def _remember(self, book_id, digest, signature, hashes, buckets, signatures):
+        hashes.setdefault(digest, book_id)
+        if signature is None:
+            return
+        signatures[book_id] = signature
+        for band, key in enumerate(self.minhasher.band_hashes(signature[None])[0].tolist()):
+            buckets.setdefault((band, key), []).append(book_id)
+
+    def _near_duplicate_of(self, signature, buckets, signatures, index):
+        if signature is None:
+            return None
+        # Existing books first, then the new ones in the order they were remembered, so ties go
+        # to the same book in every process
+        best, best_similarity = index.near_duplicate_of(signature, self.threshold) if index is not None else (None, 0.0)
+        keys = self.minhasher.band_hashes(signature[None])[0].tolist()
+        candidates = dict.fromkeys(book_id for band, key in enumerate(keys) for book_id in buckets.get((band, key), ()))
+        # Band collisions are only candidates; the full signatures confirm the similarity
+        for book_id in candidates:
+            similarity = float(np.mean(signatures[book_id] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = book_id, similarity
+        return best
+
+
+class _ExistingIndex:
+    """Lookups of content hashes and LSH bands of SignedBooks, through sorted arrays rather
+    than per-book Python objects."""
+
+    def __init__(self, existing, minhasher):
+        self.existing = existing
+        self.minhasher = minhasher
+        # Stable sorts, so the first of equal keys is the earliest row
+        self.digest_order = np.argsort(existing.digests, kind='stable')
+        self.sorted_digests = existing.digests[self.digest_order]
+        if minhasher is not None and existing.signatures is not None:
+            bands = minhasher.band_hashes(existing.signatures)
+            self.band_orders = np.argsort(bands, axis=0, kind='stable')
+            self.sorted_bands = np.take_along_axis(bands, self.band_orders, axis=0)
+
+    def exact_duplicate_of(self, digest):
+        digest = digest.encode("ascii")
+        i = np.searchsorted(self.sorted_digests, digest)
+        if i < len(self.sorted_digests) and self.sorted_digests[i] == digest:
+            return self.existing.ids[self.digest_order[i]]
+        return None
+
+    def near_duplicate_of(self, signature, threshold):
+        """(id, similarity) of the most similar existing book at or above `threshold`, or (None, 0.0)."""
+        if self.minhasher is None or self.existing.signatures is None:
+            return None, 0.0
+        keys = self.minhasher.band_hashes(signature[None])[0]
+        rows = []
+        for band, key in enumerate(keys):
+            column = self.sorted_bands[:, band]
+            start, stop = np.searchsorted(column, key, side='left'), np.searchsorted(column, key, side='right')
+            rows.append(self.band_orders[start:stop, band])
+        rows = np.unique(np.concatenate(rows))
+        if len(rows) == 0:
+            return None, 0.0
+        similarities = (np.asarray(self.existing.signatures[rows]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None, 0.0
+        return self.existing.ids[rows[best]], float(similarities[best])
+
+
+def _merged(genres, other):
+    return list(dict.fromkeys(list(genres) + list(other)))
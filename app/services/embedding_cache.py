@@ -0,0 +1,179 @@
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+
+
+class EmbeddingCache:
+    """Process-wide cache of query embeddings keyed on (model, normalized text).
+
+    A size-bounded in-memory LRU with an optional TTL, backed by an optional SQLite file
+    so warm embeddings survive restarts. Entries are independent of k and of any service
+    instance, so every request and every reloaded service shares them.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open_db(path) if path else None
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(unicodedata.normalize('NFC', text).split())
+
+    def get(self, model, text):
+        key = (model, self.normalize(text))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            entry = self._get_from_db(key, now)
+            if entry is not None:
+                self._store(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, model, text, vector):
+        key = (model, self.normalize(text))
+        vector = np.asarray(vector, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self._store(key, created, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text, created, vector) VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], created, vector.tobytes())
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
+
+    def _store(self, key, created, vector):
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _open_db(self, path):
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text))"
+        )
+        db.commit()
+        return db
+
+    def _get_from_db(self, key, now):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT created, vector FROM embeddings WHERE model = ? AND text = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        created, blob = row
+        if self._expired(created, now):
+            self._db.execute("DELETE FROM embeddings WHERE model = ? AND text = ?", key)
+            self._db.commit()
+            return None
+        return created, np.frombuffer(blob, dtype=np.float32)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model so embed_query goes through an EmbeddingCache.
+
+    embed_documents (corpus builds) is passed straight through so bulk indexing
+    does not evict the query working set.
+    """
+
+    def __init__(self, embeddings, cache, model_name=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_name, text, vector)
+            return list(vector)
+        return vector.tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries through the cache; all misses go out in one embed_documents call."""
+        vectors = [self.cache.get(self.model_name, text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for text, vector in embedded.items():
+                self.cache.put(self.model_name, text, vector)
+            vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in vectors]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                max_size=settings.EMBEDDING_CACHE_SIZE,
+                ttl=settings.EMBEDDING_CACHE_TTL,
+                path=settings.EMBEDDING_CACHE_PATH
+            )
+        return _embedding_cache
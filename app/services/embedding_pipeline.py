@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from app.core.logger import service_logger
+
+
+class EmbeddingPipeline:
+    """Embeds a corpus in fixed-size batches with bounded concurrency.
+
+    With a checkpoint directory, every finished batch is written to disk, so a crashed run
+    resumes from the batches that are missing. Checkpoints are tied to a fingerprint of the
+    texts, batch size and model, and are discarded when any of those change.
+    """
+
+    def __init__(self, embeddings, batch_size=256, max_concurrency=4, checkpoint_dir=None):
+        if batch_size <= 0 or max_concurrency <= 0:
+            raise ValueError("batch_size and max_concurrency must be greater than 0")
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.checkpoint_dir = checkpoint_dir
+
+    def run(self, texts):
+        """Return a (len(texts), dim) float32 matrix; each text is embedded exactly once."""
+        texts = list(texts)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+
+        results = [None] * len(batches)
+        if self.checkpoint_dir:
+            self._prepare_checkpoints(texts, len(batches))
+            for i in range(len(batches)):
+                path = self._batch_path(i)
+                if os.path.exists(path):
+                    results[i] = np.load(path)
+            resumed = sum(result is not None for result in results)
+            if resumed:
+                service_logger.info(f"Resuming embedding build: {resumed}/{len(batches)} batches already done")
+
+        todo = [i for i, result in enumerate(results) if result is None]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {executor.submit(self._embed_batch, batches[i]): i for i in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                results[i] = future.result()
+                if self.checkpoint_dir:
+                    self._save_batch(i, results[i])
+                service_logger.info(f"Embedded batch {i + 1}/{len(batches)} ({done}/{len(todo)} this run)")
+
+        return np.concatenate(results)
+
+    def clear_checkpoints(self):
+        if self.checkpoint_dir and os.path.exists(self.checkpoint_dir):
+            shutil.rmtree(self.checkpoint_dir)
+
+    def _embed_batch(self, texts):
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        if vectors.shape[0] != len(texts):
+            raise ValueError(f"Embedder returned {vectors.shape[0]} vectors for {len(texts)} texts")
+        return vectors
+
+    def _fingerprint(self, texts):
+        model = getattr(self.embeddings, "model_name", None) or getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+        digest = hashlib.sha256(f"{model}\0{self.batch_size}\0".encode())
+        for text in texts:
+            digest.update(text.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _prepare_checkpoints(self, texts, num_batches):
+        manifest = {"fingerprint": self._fingerprint(texts), "num_batches": num_batches}
+        manifest_path = os.path.join(self.checkpoint_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                if json.load(f) == manifest:
+                    return
+            service_logger.info("Embedding checkpoints belong to a different corpus, discarding them")
+            self.clear_checkpoints()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+
+    def _batch_path(self, i):
+        return os.path.join(self.checkpoint_dir, f"batch_{i:06d}.npy")
+
+    def _save_batch(self, i, vectors):
+        # Write then rename, so a crash never leaves a truncated batch behind
+        tmp_path = self._batch_path(i) + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, self._batch_path(i))
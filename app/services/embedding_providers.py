@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from typing import List
+import joblib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from app.core.config import settings
+from app.core.logger import service_logger
+from app.services.data_generations import DataGenerations
+from app.services.fake_embeddings import HashingEmbeddings
+
+# "openai": text-embedding-3-large over the network. "tfidf_svd": TF-IDF over word unigrams and
+# bigrams projected to EMBEDDING_DIM dimensions by truncated SVD (LSA), fitted on the catalog and
+# run in-process. "hashing": signed feature hashing, no fitting at all.
+EMBEDDING_PROVIDERS = ("openai", "tfidf_svd", "hashing")
+TFIDF_SVD_MODEL_FILE = "tfidf_svd.joblib"
+
+
+class TfidfSvdEmbeddings(Embeddings):
+    """Local embeddings: TF-IDF weights projected onto the top singular vectors of the corpus.
+
+    The projection is stored as a (vocabulary, dim) float32 matrix, so embedding a text is a
+    sparse TF-IDF row times that matrix: only the rows of the text's own terms are read. The
+    fitted model is saved with joblib, uncompressed, so it can be loaded memory-mapped.
+    """
+
+    def __init__(self, dim=256, max_features=50_000, vectorizer=None, projection=None, model=None):
+        self.dim = dim
+        self.max_features = max_features
+        self.vectorizer = vectorizer
+        self.projection = projection
+        self.model = model or "tfidf-svd-unfitted"
+
+    @property
+    def is_fitted(self):
+        return self.projection is not None
+
+    def fit(self, texts):
+        texts = list(texts)
+        vectorizer = TfidfVectorizer(
+            ngram_range=(1, 2), min_df=2 if len(texts) > 100 else 1, max_features=self.max_features,
+            sublinear_tf=True, dtype=np.float32
+        )
+        tfidf = vectorizer.fit_transform(texts)
+        # SVD needs fewer components than terms; tiny corpora get a smaller dimension
+        n_components = max(1, min(self.dim, tfidf.shape[1] - 1, tfidf.shape[0] - 1))
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=0)
+        svd.fit(tfidf)
+        self.vectorizer = vectorizer
+        self.projection = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+        # Tied to the fitted weights, so cached query vectors and stored embeddings of an
+        # earlier fit are never mixed with this one
+        self.model = f"tfidf-svd-{n_components}-{hashlib.sha256(self.projection.tobytes()).hexdigest()[:12]}"
+        service_logger.info(f"Fitted {self.model} on {len(texts)} texts ({tfidf.shape[1]} terms)")
+        return self
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({"vectorizer": self.vectorizer, "projection": self.projection, "model": self.model,
+                     "dim": self.dim, "max_features": self.max_features}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        state = joblib.load(path, mmap_mode='r' if mmap else None)
+        return cls(**state)
+
+    def embed_matrix(self, texts):
+        """Embed texts into an L2-normalized (len(texts), dim) float32 matrix."""
+        if not self.is_fitted:
+            raise ValueError("The tfidf_svd embeddings are not fitted; build the data with scripts/populate_data.py")
+        vectors = np.asarray(self.vectorizer.transform(texts) @ self.projection, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+
+def create_embeddings(provider=None, data_dir=None):
+    """The base Embeddings model of `provider` (default: EMBEDDING_PROVIDER)."""
+    provider = provider or settings.EMBEDDING_PROVIDER
+    # The fitted tfidf_svd model belongs to the generation whose embeddings it built
+    data_dir = data_dir or DataGenerations(settings.DATA_DIR).current_dir()
+    if provider == "openai":
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("EMBEDDING_PROVIDER=openai needs OPENAI_API_KEY")
+        return OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY, model="text-embedding-3-large")
+    if provider == "tfidf_svd":
+        path = os.path.join(data_dir, TFIDF_SVD_MODEL_FILE)
+        if os.path.exists(path):
+            return TfidfSvdEmbeddings.load(path, mmap=settings.USE_MMAP)
+        # Fitted on the catalog by ProcessingChain.fit_embeddings before the corpus is embedded
+        return TfidfSvdEmbeddings(dim=settings.EMBEDDING_DIM)
+    if provider == "hashing":
+        return HashingEmbeddings(dim=settings.EMBEDDING_DIM)
+    raise ValueError(f"Unknown embedding provider {provider!r}, expected one of {EMBEDDING_PROVIDERS}")
+
+
+def model_name(embeddings):
+    """The name cached and stored vectors are tagged with (same rule as CachedEmbeddings)."""
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def embeddings_info_path(data_dir):
+    return os.path.join(data_dir, "embeddings.json")
+
+
+def read_embeddings_model(data_dir):
+    """Model that embeddings.npy was built with, or None for data built before it was recorded."""
+    path = embeddings_info_path(data_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f).get("model")
+
+
+def write_embeddings_model(data_dir, model):
+    path = embeddings_info_path(data_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"model": model}, f)
+    os.replace(tmp_path, path)
+
+
+def check_embeddings_model(data_dir, embeddings):
+    """Raise if embeddings.npy was built by another model than `embeddings`: their vectors are not comparable."""
+    stored = read_embeddings_model(data_dir)
+    current = model_name(embeddings)
+    if stored is not None and stored != current:
+        raise ValueError(
+            f"embeddings.npy was built with {stored} but the configured model is {current}; "
+            "rebuild it with scripts/populate_data.py or switch EMBEDDING_PROVIDER back"
+        )
@@ -0,0 +1,343 @@
+import json
+import os
+import faiss
+import numpy as np
+from app.core.config import settings
+from app.core.logger import service_logger
+from app.services.sharded_engine import shard_ranges
+
+INDEX_TYPES = ("flat_ip", "ivf_flat", "hnsw", "ivf_pq", "sq8", "pq")
+# Index types that keep lossy codes instead of the vectors, so their scores are approximate
+COMPRESSED_INDEX_TYPES = ("ivf_pq", "sq8", "pq")
+# IO_FLAG_MMAP_IFC (not in faiss 1.8) also maps flat and HNSW vector storage; plain IO_FLAG_MMAP only
+# covers IVF lists, so with older faiss those indexes are read onto the heap of every worker
+HAS_MMAP_IFC = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAGS = (faiss.IO_FLAG_MMAP_IFC if HAS_MMAP_IFC else faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def normalized(vectors):
+    """float32 copy of `vectors` with unit-length rows, so inner product is cosine similarity."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def truncated(vectors, dim=0):
+    """normalized() prefix of the first `dim` components of each vector (all of them when 0).
+
+    text-embedding-3 models are trained so that a prefix of the vector is an embedding on its
+    own (Matryoshka representation), and SVD components come sorted by variance, so a prefix
+    keeps most of the ranking at a fraction of the size once re-normalized.
+    """
+    vectors = np.asarray(vectors)
+    if dim:
+        vectors = vectors[..., :dim]
+    return normalized(vectors)
+
+
+def index_spec(index_type, num_vectors, dim, nlist=0, hnsw_m=32, pq_m=0, pq_nbits=8):
+    """faiss.index_factory string for `index_type`; 0 picks a size-dependent default."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {INDEX_TYPES}")
+    if index_type == "flat_ip":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    if index_type == "sq8":
+        # One byte per component, scaled by per-dimension ranges trained on the corpus
+        return "SQ8"
+    if index_type == "pq":
+        return _pq_spec(num_vectors, dim, pq_m, pq_nbits)
+    # ~4 * sqrt(N) lists, but keep at least 39 training points per centroid as FAISS recommends
+    nlist = nlist or int(4 * np.sqrt(num_vectors))
+    nlist = max(1, min(nlist, num_vectors // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    return f"IVF{nlist},{_pq_spec(num_vectors, dim, pq_m, pq_nbits)}"
+
+
+def _pq_spec(num_vectors, dim, pq_m, pq_nbits):
+    pq_m = pq_m or _largest_divisor(dim, max(1, dim // 16))
+    # Same 39 points per centroid for the 2**nbits codewords of each sub-quantizer;
+    # "np" skips polysemous training, which we never search with and which dominates build time
+    pq_nbits = max(1, min(pq_nbits, int(np.log2(max(num_vectors / 39, 2)))))
+    return f"PQ{pq_m}x{pq_nbits}np"
+
+
+def _largest_divisor(n, at_most):
+    return next(d for d in range(at_most, 0, -1) if n % d == 0)
+
+
+def build_index(vectors, index_type="flat_ip", nlist=0, hnsw_m=32, ef_construction=200, pq_m=0, pq_nbits=8,
+                truncate_dim=0, max_train_size=256 * 1024):
+    """Build an inner-product FAISS index over the normalized `vectors` (their first `truncate_dim`
+    components when set); row i of the index is row i of `vectors`."""
+    vectors = truncated(vectors, truncate_dim)
+    num_vectors, dim = vectors.shape
+    spec = index_spec(index_type, num_vectors, dim, nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m, pq_nbits=pq_nbits)
+    index = faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        sample = vectors
+        if num_vectors > max_train_size:
+            sample = vectors[np.random.default_rng(0).choice(num_vectors, max_train_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+class FaissIndexFile:
+    """A FAISS index on disk kept in step with embeddings.npy, row for row.
+
+    A JSON sidecar records the build parameters; when they no longer match the config the
+    index is rebuilt. Rows appended to embeddings.npy (incremental updates) are added to the
+    existing index instead of rebuilding it. With mmap, the index is served memory-mapped
+    read-only, so processes loading the same file share its pages through the page cache.
+    """
+
+    def __init__(self, path, index_type="flat_ip", mmap=False, **build_params):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {INDEX_TYPES}")
+        self.path = path
+        self.meta_path = path + ".json"
+        self.mmap = mmap
+        self.params = {"index_type": index_type, **build_params}
+
+    @classmethod
+    def from_settings(cls, data_dir, name="faiss.index"):
+        # Only recorded when set, so indexes built before truncation existed stay valid
+        truncation = {"truncate_dim": settings.FAISS_TRUNCATE_DIM} if settings.FAISS_TRUNCATE_DIM else {}
+        return cls(
+            os.path.join(data_dir, name),
+            index_type=settings.FAISS_INDEX_TYPE,
+            mmap=settings.USE_MMAP,
+            nlist=settings.FAISS_NLIST,
+            hnsw_m=settings.FAISS_HNSW_M,
+            ef_construction=settings.FAISS_EF_CONSTRUCTION,
+            pq_m=settings.FAISS_PQ_M,
+            pq_nbits=settings.FAISS_PQ_NBITS,
+            **truncation
+        )
+
+    @property
+    def compressed(self):
+        """Whether the index holds lossy codes (quantized or truncated vectors) rather than the vectors."""
+        return self.params["index_type"] in COMPRESSED_INDEX_TYPES or bool(self.params.get("truncate_dim"))
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.exists(self.meta_path)
+
+    def read(self):
+        if not self.mmap:
+            return faiss.read_index(self.path)
+        if not HAS_MMAP_IFC:
+            service_logger.warning(f"faiss {faiss.__version__} has no IO_FLAG_MMAP_IFC: only IVF lists of {self.path} are "
+                                   "memory-mapped, other indexes are loaded onto the heap; upgrade faiss-cpu")
+        return faiss.read_index(self.path, MMAP_FLAGS)
+
+    def stored_ntotal(self):
+        """Rows of the stored index, or None when there is none built with the configured parameters."""
+        if not self.exists():
+            return None
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        return meta.get("ntotal") if meta.get("params") == self.params else None
+
+    def load_or_build(self, embeddings):
+        """Return an index with exactly one row per row of `embeddings`, saving it when it changed."""
+        ntotal = self.stored_ntotal()
+        if ntotal == len(embeddings):
+            return self.read()
+        if ntotal is not None and ntotal < len(embeddings):
+            service_logger.info(f"Adding {len(embeddings) - ntotal} new vectors to the FAISS index")
+            # A memory-mapped index is read-only, so appending goes through a heap copy
+            index = faiss.read_index(self.path)
+            index.add(truncated(embeddings[ntotal:], self.params.get("truncate_dim", 0)))
+            self.save(index)
+            return self.read() if self.mmap else index
+        if self.exists():
+            service_logger.info("FAISS index is out of date with the config or embeddings, rebuilding it")
+        return self.rebuild(embeddings)
+
+    def rebuild(self, embeddings):
+        service_logger.info(f"Building {self.params['index_type']} FAISS index over {len(embeddings)} vectors")
+        index = build_index(embeddings, **self.params)
+        self.save(index)
+        return self.read() if self.mmap else index
+
+    def save(self, index):
+        # Write then rename, so a crash never leaves a truncated index behind and processes
+        # that have the old file memory-mapped keep reading it; per-process names let several
+        # workers rebuild at once
+        suffix = f".{os.getpid()}.tmp"
+        faiss.write_index(index, self.path + suffix)
+        with open(self.meta_path + suffix, 'w') as f:
+            json.dump({"params": self.params, "ntotal": index.ntotal}, f)
+        os.replace(self.path + suffix, self.path)
+        os.replace(self.meta_path + suffix, self.meta_path)
+
+    def remove(self):
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class FaissShardFiles:
+    """One FaissIndexFile per shard (row range) of embeddings.npy; a single shard is faiss.index.
+
+    The shard start rows are kept in faiss.shards.json. The last shard is open-ended, so rows
+    appended by incremental updates only grow its index. The layout is recomputed, and every
+    shard rebuilt, when the shard count changes or on rebuild() (compaction renumbers rows).
+    A shard's row range and index file are all another process needs to serve it.
+    """
+
+    def __init__(self, data_dir, index_files):
+        self.layout_path = os.path.join(data_dir, "faiss.shards.json")
+        self.files = index_files
+
+    @classmethod
+    def from_settings(cls, data_dir, num_shards=None):
+        num_shards = num_shards or settings.SEARCH_SHARDS
+        if num_shards == 1:
+            return cls(data_dir, [FaissIndexFile.from_settings(data_dir)])
+        return cls(data_dir, [FaissIndexFile.from_settings(data_dir, f"faiss.shard{i}.index") for i in range(num_shards)])
+
+    @property
+    def compressed(self):
+        return self.files[0].compressed
+
+    def exists(self):
+        layout = len(self.files) == 1 or os.path.exists(self.layout_path)
+        return layout and all(index_file.exists() for index_file in self.files)
+
+    def stored_ntotal(self):
+        """Rows of the stored shard indexes, or None unless every shard is stored with the configured parameters."""
+        if not self.exists():
+            return None
+        counts = [index_file.stored_ntotal() for index_file in self.files]
+        return None if None in counts else sum(counts)
+
+    def load_or_build(self, embeddings):
+        """[(start row, index)] per shard, each index with one row per row of its range of `embeddings`."""
+        starts = self._stored_starts(len(embeddings))
+        if starts is None:
+            return self.rebuild(embeddings)
+        return [(start, index_file.load_or_build(embeddings[start:stop]))
+                for index_file, (start, stop) in zip(self.files, self._ranges(starts, len(embeddings)))]
+
+    def rebuild(self, embeddings):
+        starts = [start for start, _ in shard_ranges(len(embeddings), len(self.files))]
+        shards = [(start, index_file.rebuild(embeddings[start:stop]))
+                  for index_file, (start, stop) in zip(self.files, self._ranges(starts, len(embeddings)))]
+        if len(self.files) > 1:
+            tmp_path = f"{self.layout_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"starts": starts}, f)
+            os.replace(tmp_path, self.layout_path)
+        return shards
+
+    def _stored_starts(self, num_rows):
+        if len(self.files) == 1:
+            return [0]
+        if not os.path.exists(self.layout_path):
+            return None
+        with open(self.layout_path, 'r') as f:
+            starts = json.load(f).get("starts")
+        if not starts or len(starts) != len(self.files) or starts[-1] > num_rows:
+            return None
+        return starts
+
+    @staticmethod
+    def _ranges(starts, num_rows):
+        return list(zip(starts, starts[1:] + [num_rows]))
+
+
+class FaissSearchEngine:
+    """Searches a native FAISS inner-product index and maps rows to BookMetadataStore positions.
+
+    `positions[row]` is the metadata position of index row `row`, or -1 for rows that were
+    deleted or superseded (tombstoned) and must not be returned. Scores are cosine similarities
+    (approximate for compressed indexes).
+
+    With `rerank`, a CosineSearchEngine over the full-precision vectors (row for row with the
+    index), search is two-stage: the index shortlists `rerank_candidates` rows from its codes,
+    and only those rows are read from the (memory-mapped) matrix and scored exactly. Queries are
+    then full-dimension vectors even when the index is over a truncated prefix.
+    """
+
+    def __init__(self, index, positions, nprobe=None, ef_search=None, rerank=None, rerank_candidates=100):
+        if index.ntotal != len(positions):
+            raise ValueError(f"FAISS index has {index.ntotal} rows but {len(positions)} positions; rebuild the index")
+        self.index = index
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.num_dead = int((self.positions < 0).sum())
+        self.is_ivf = faiss.try_extract_index_ivf(index) is not None
+        self.is_hnsw = hasattr(index, "hnsw")
+        # IndexPQ ("pq") rejects search parameters, so it cannot take an ID selector
+        self.takes_selector = not isinstance(faiss.downcast_index(index), faiss.IndexPQ)
+        parameters = faiss.ParameterSpace()
+        if nprobe and self.is_ivf:
+            parameters.set_index_parameter(index, "nprobe", nprobe)
+        if ef_search and self.is_hnsw:
+            parameters.set_index_parameter(index, "efSearch", ef_search)
+        # Per-search parameters (used with an ID selector) replace the index's own settings
+        self.nprobe = nprobe or (faiss.extract_index_ivf(index).nprobe if self.is_ivf else None)
+        self.ef_search = ef_search or (index.hnsw.efSearch if self.is_hnsw else None)
+        self.rerank = rerank
+        self.rerank_candidates = rerank_candidates
+
+    def __len__(self):
+        return self.index.ntotal - self.num_dead
+
+    def search(self, query_embedding, k):
+        """Return (positions, cosine scores) of the k nearest books, best first."""
+        return self.search_batch([query_embedding], k)[0]
+
+    def search_batch(self, query_embeddings, k):
+        """Search several queries with one index.search call. Returns a (positions, scores) pair per query."""
+        queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        # Over-fetch by the number of tombstoned rows so filtering them out still leaves k results
+        fetch = min(self._candidates(k) + self.num_dead, self.index.ntotal)
+        scores, rows = self.index.search(truncated(queries, self.index.d), fetch)
+        if self.rerank is not None:
+            return [self.rerank.search_subset(query, row_ids[row_ids >= 0], k) for query, row_ids in zip(queries, rows)]
+        results = []
+        for row_scores, row_ids in zip(scores, rows):
+            positions = np.where(row_ids >= 0, self.positions[row_ids], -1)
+            found = positions >= 0
+            results.append((positions[found][:k], row_scores[found][:k]))
+        return results
+
+    def search_subset(self, query_embedding, rows, k):
+        """Search among the index rows `rows` only, through a FAISS bitmap ID selector.
+
+        A bitmap makes the membership test one bit lookup per candidate (IDSelectorBatch
+        hashes each one, about twice as slow on large subsets). Approximate indexes can return
+        fewer than k hits when few of `rows` lie in the probed lists or graph neighbourhood;
+        callers fall back to exact search then. Without selector support no hits are returned,
+        which leaves the whole subset to that fallback.
+        """
+        if not self.takes_selector:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        mask = np.zeros(self.index.ntotal, dtype=bool)
+        mask[rows] = True
+        # FAISS reads bit i of the bitmap as (bitmap[i >> 3] >> (i & 7)) & 1; kept referenced until the search returns
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(self.index.ntotal, faiss.swig_ptr(bitmap))
+        if self.is_ivf:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        elif self.is_hnsw:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        query = np.array(query_embedding, dtype=np.float32, ndmin=2)
+        scores, row_ids = self.index.search(truncated(query, self.index.d), min(self._candidates(k), len(rows)), params=params)
+        if self.rerank is not None:
+            return self.rerank.search_subset(query[0], row_ids[0][row_ids[0] >= 0], k)
+        positions = np.where(row_ids[0] >= 0, self.positions[row_ids[0]], -1)
+        found = positions >= 0
+        return positions[found], scores[0][found]
+
+    def _candidates(self, k):
+        return k if self.rerank is None else max(k, self.rerank_candidates)
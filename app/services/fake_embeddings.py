@@ -0,0 +1,63 @@
+import random
+import time
+import zlib
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic local stand-in for OpenAIEmbeddings, for load tests and offline runs.
+
+    Each token adds +-1 at a few hashed dimensions (signed feature hashing), so texts that
+    share words get a high cosine similarity, the same text always gets the same vector and
+    nothing leaves the process. `latency` (seconds, plus up to `jitter` more) is slept once per
+    call to mimic the embeddings API round trip; the sleep releases the GIL like real network I/O.
+    """
+
+    def __init__(self, dim=3072, latency=0.0, jitter=0.0, hashes_per_token=4, seed=0):
+        self.model = f"hashing-{dim}"
+        self.dim = dim
+        self.latency = latency
+        self.jitter = jitter
+        self.hashes_per_token = hashes_per_token
+        self.seed = seed
+        self._token_cache = {}
+        self._random = random.Random(seed)
+
+    def _token_features(self, token):
+        features = self._token_cache.get(token)
+        if features is None:
+            data = token.encode()
+            hashes = [zlib.crc32(data, self.seed + i) for i in range(self.hashes_per_token)]
+            features = (np.array([h % self.dim for h in hashes]), np.array([1.0 if h & 1 << 31 else -1.0 for h in hashes], dtype=np.float32))
+            if len(self._token_cache) < 200_000:
+                self._token_cache[token] = features
+        return features
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            indices, signs = self._token_features(token)
+            np.add.at(vector, indices, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _wait(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.random() * self.jitter)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._wait()
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._wait()
+        return self._embed(text).tolist()
+
+    def embed_matrix(self, texts):
+        """Embed a corpus straight into a float32 matrix, without the per-call latency."""
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self._embed(text)
+        return matrix
@@ -0,0 +1,81 @@
+import numpy as np
+
+# Request filter fields and the catalog list column each one matches against
+FILTER_FIELDS = ("authors", "genres")
+
+
+def normalize_value(value):
+    return " ".join(str(value).split()).casefold()
+
+
+class InvertedIndex:
+    """Value -> sorted positions of the books carrying it, for one list column of the catalog.
+
+    Postings are kept in CSR form (one int32 array sorted by value, plus offsets), a
+    compressed bitmap per value: authors are nearly unique per book, so one dense N-bit
+    bitmap per author would take N^2/8 bytes. A lookup costs the size of its postings.
+    """
+
+    def __init__(self, values_per_position):
+        keys = {}
+        key_ids, positions = [], []
+        for position, values in enumerate(values_per_position):
+            for value in set(map(normalize_value, values)):
+                key_ids.append(keys.setdefault(value, len(keys)))
+                positions.append(position)
+        key_ids = np.asarray(key_ids, dtype=np.int64)
+        order = np.argsort(key_ids, kind="stable")
+        self.keys = keys
+        self.postings = np.asarray(positions, dtype=np.int32)[order]
+        self.offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(key_ids, minlength=len(keys)), out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, values):
+        """Sorted positions of the books carrying any of `values`."""
+        lists = []
+        for value in values:
+            key = self.keys.get(normalize_value(value))
+            if key is not None:
+                lists.append(self.postings[self.offsets[key]:self.offsets[key + 1]])
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        return lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+
+
+class FilterIndex:
+    """Inverted indexes over the filterable catalog columns, addressed by BookMetadataStore position.
+
+    Built once when the service loads. `select` ORs the values given for a field and ANDs
+    the fields, e.g. {"authors": ["A", "B"], "genres": ["fantasy"]} is (A or B) and fantasy.
+    """
+
+    def __init__(self, indexes, size):
+        self.indexes = indexes
+        self.size = size
+
+    @classmethod
+    def from_catalog(cls, catalog, rows):
+        indexes = {}
+        for field in FILTER_FIELDS:
+            if field in catalog.columns:
+                values = catalog.column(field).tolist()
+                indexes[field] = InvertedIndex(values[row] for row in rows)
+            else:
+                # Catalogs built before the column existed match nothing on it
+                indexes[field] = InvertedIndex([])
+        return cls(indexes, len(rows))
+
+    def select(self, filters):
+        """Sorted positions matching `filters` ({field: [values]}), or None when nothing is filtered."""
+        selected = None
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            if field not in self.indexes:
+                raise ValueError(f"Unknown filter {field!r}, expected one of {FILTER_FIELDS}")
+            positions = self.indexes[field].lookup(values)
+            selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+        return selected
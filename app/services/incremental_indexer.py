@@ -0,0 +1,273 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import List
+import numpy as np
+import pandas as pd
+from app.services.book_service import BookService
+from app.services.processing_chain import ProcessingChain
+from app.services.embedding_providers import check_embeddings_model
+from app.services.faiss_engine import FaissShardFiles
+from app.services.neighbor_graph import NeighborGraph
+from app.services.deduplication import Deduplicator, SignatureFiles, SignedBooks
+from app.services.data_generations import DataGenerations, check_row_counts, save_npy
+from app.core.config import settings
+from app.core.logger import service_logger
+
+EMBEDDINGS_FILE = "embeddings.npy"
+TOMBSTONES_FILE = "tombstones.npy"
+# Share of tombstoned rows above which compaction is worth its full rewrite
+COMPACTION_MIN_RATIO = 0.1
+
+
+@dataclass
+class ChangeSet:
+    added: List[str] = field(default_factory=list)
+    reembedded: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # New books dropped as duplicates of a book in the catalog or earlier in the same batch
+    duplicates: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self):
+        return not (self.added or self.reembedded or self.updated or self.removed)
+
+
+def load_tombstones(data_dir):
+    path = os.path.join(data_dir, TOMBSTONES_FILE)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.int64)
+    return np.load(path)
+
+def drop_tombstoned_rows(df, embeddings, data_dir):
+    """Remove rows deleted or superseded by incremental updates that were not compacted yet."""
+    tombstones = load_tombstones(data_dir)
+    if len(tombstones) == 0:
+        return df, embeddings
+    alive = np.ones(len(df), dtype=bool)
+    alive[tombstones] = False
+    return df[alive].reset_index(drop=True), np.asarray(embeddings)[alive]
+
+def live_positions(num_rows, data_dir):
+    """Map each stored row to its position after drop_tombstoned_rows, or -1 if it is tombstoned."""
+    alive = np.ones(num_rows, dtype=bool)
+    alive[load_tombstones(data_dir)] = False
+    positions = np.full(num_rows, -1, dtype=np.int64)
+    positions[alive] = np.arange(alive.sum())
+    return positions
+
+class IncrementalIndexer:
+    """Applies catalog changes to the stored dataframe, embeddings and FAISS index
+    without rebuilding them.
+
+    Books are keyed on their Google Books volume id. New books are embedded and appended.
+    Books whose description changed are re-embedded; books with only metadata changes reuse
+    their stored vector. Superseded and removed rows are tombstoned in tombstones.npy (and
+    skipped at search time) and physically dropped later by compact(). Every change is written
+    to a new data generation that is committed at once (DataGenerations), so a crash part-way
+    leaves the previous catalog, embeddings and indexes in place.
+    """
+
+    def __init__(self, book_service=None, processing_chain=None, data_dir=None):
+        self.book_service = book_service or BookService()
+        self.processing_chain = processing_chain or ProcessingChain()
+        self.data_dir = data_dir or settings.DATA_DIR
+        self.generations = DataGenerations(self.data_dir)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """(generation directory, dataframe) of the current generation, checked to line up with its embeddings and index."""
+        directory, num_rows = self.generations.current()
+        df = self.book_service.load_dataframe(os.path.join(directory, "catalog"))
+        embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+        check_row_counts(
+            generation=num_rows,
+            catalog=len(df),
+            embeddings=len(np.load(embeddings_path, mmap_mode='r')) if os.path.exists(embeddings_path) else None,
+            faiss=FaissShardFiles.from_settings(directory).stored_ntotal()
+        )
+        return directory, df
+
+    def apply(self, items, remove_missing=False):
+        """Ingest raw Google Books volumes. With remove_missing, `items` is treated as the
+        full catalog and live books that are not in it are removed."""
+        with self._lock:
+            directory, df = self._load()
+            if 'genres' not in df.columns:
+                # Catalogs built before genres were recorded
+                df['genres'] = [[] for _ in range(len(df))]
+            tombstones = set(load_tombstones(directory).tolist())
+            live_rows = self._live_rows(df, tombstones)
+
+            incoming = {}
+            for book in self.book_service.clean_data({'items': items}):
+                incoming[book['id']] = book
+
+            changes = ChangeSet()
+            deduplicator = Deduplicator.from_settings()
+            # Content hashes and signatures of the stored rows, loaded once new rows need them
+            signed = None
+            # Books new to the catalog are only embedded when they do not duplicate a live book
+            new_books = [book for book_id, book in incoming.items() if book_id not in live_rows]
+            added = SignedBooks([], np.empty(0, dtype="S40"))
+            if new_books:
+                signed = self._signed_rows(directory, df, deduplicator)
+                _, report = deduplicator.deduplicate(new_books, existing=signed.take(sorted(live_rows.values())))
+                changes.duplicates = list(report.duplicates)
+                for book_id in changes.duplicates:
+                    del incoming[book_id]
+                added = report.kept
+            to_embed, to_copy = [], []
+            for book_id, book in incoming.items():
+                row = live_rows.get(book_id)
+                if row is None:
+                    changes.added.append(book_id)
+                    to_embed.append(book)
+                    continue
+                # A harvest only knows the genres it searched; keep the ones found earlier
+                book['genres'] = list(dict.fromkeys(list(df.at[row, 'genres']) + list(book['genres'])))
+                if df.at[row, 'description'] != book['description']:
+                    changes.reembedded.append(book_id)
+                    to_embed.append(book)
+                elif (df.at[row, 'title'] != book['title'] or list(df.at[row, 'authors']) != list(book['authors'])
+                      or list(df.at[row, 'genres']) != book['genres']):
+                    changes.updated.append(book_id)
+                    to_copy.append((book, row))
+
+            if remove_missing:
+                changes.removed = [book_id for book_id in live_rows if book_id not in incoming]
+
+            if to_embed or to_copy:
+                # Only incoming books are signed; the stored rows keep the signatures they were stored with
+                if signed is None:
+                    signed = self._signed_rows(directory, df, deduplicator)
+                reembedded = [incoming[book_id] for book_id in changes.reembedded]
+                new_rows = SignedBooks.concat([
+                    added,
+                    deduplicator.sign([book['id'] for book in reembedded], [book['processed_description'] for book in reembedded]),
+                    signed.take([row for _, row in to_copy]),
+                ]).select([book['id'] for book in to_embed + [book for book, _ in to_copy]])
+                signed = SignedBooks.concat([signed, new_rows])
+            self._write(directory, df, tombstones, live_rows, changes, to_embed, to_copy, signed)
+            return changes
+
+    def delete(self, book_ids):
+        with self._lock:
+            directory, df = self._load()
+            tombstones = set(load_tombstones(directory).tolist())
+            live_rows = self._live_rows(df, tombstones)
+            changes = ChangeSet(removed=[book_id for book_id in dict.fromkeys(book_ids) if book_id in live_rows])
+            self._write(directory, df, tombstones, live_rows, changes, [], [], None)
+            return changes
+
+    def tombstone_ratio(self):
+        directory, num_rows = self.generations.current()
+        tombstones = load_tombstones(directory)
+        total = num_rows if num_rows is not None else len(self.book_service.load_dataframe(os.path.join(directory, "catalog")))
+        return len(tombstones) / total if total else 0.0
+
+    def compact(self):
+        """Rewrite the dataframe and embeddings without tombstoned rows, as a new generation."""
+        with self._lock:
+            directory, df = self._load()
+            tombstones = load_tombstones(directory)
+            if len(tombstones) == 0:
+                return 0
+            embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+            with_signatures = Deduplicator.from_settings().minhasher is not None
+            signed = SignatureFiles.from_settings(directory).load(df['id'], with_signatures=with_signatures)
+            live = live_positions(len(df), directory) >= 0
+            df, embeddings = drop_tombstoned_rows(df, embeddings, directory)
+
+            target = self.generations.begin()
+            embeddings_path = os.path.join(target, EMBEDDINGS_FILE)
+            save_npy(embeddings_path, embeddings)
+            self.book_service.save_dataframe(df, os.path.join(target, "catalog"))
+            if signed is not None:
+                SignatureFiles.from_settings(target).save(signed.take(np.flatnonzero(live)))
+            else:
+                # Rows are renumbered; signatures of the old rows would be misaligned
+                SignatureFiles.from_settings(target).remove()
+            os.remove(os.path.join(target, TOMBSTONES_FILE))
+            # Compaction renumbers rows, so the FAISS index and the neighbor graph are rebuilt
+            # before the generation is committed
+            embeddings = np.load(embeddings_path, mmap_mode='r')
+            faiss_index, neighbor_graph = FaissShardFiles.from_settings(target), NeighborGraph.from_settings(target)
+            if faiss_index.exists():
+                faiss_index.rebuild(embeddings)
+            if neighbor_graph.exists():
+                neighbor_graph.rebuild(embeddings)
+            self.generations.commit(target, len(embeddings))
+            service_logger.info(f"Compacted catalog: dropped {len(tombstones)} tombstoned rows")
+            return len(tombstones)
+
+    def compact_in_background(self, min_ratio=COMPACTION_MIN_RATIO):
+        """Start compaction on a background thread when enough rows are tombstoned."""
+        if self.tombstone_ratio() < min_ratio:
+            return None
+        thread = threading.Thread(target=self.compact, name="catalog-compaction")
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _live_rows(df, tombstones):
+        live_rows = {}
+        for row, book_id in enumerate(df['id']):
+            if row not in tombstones:
+                live_rows.setdefault(book_id, row)
+        return live_rows
+
+    @staticmethod
+    def _signed_rows(directory, df, deduplicator):
+        """SignedBooks of every stored row, from the generation's signature files if it has them."""
+        signed = SignatureFiles.from_settings(directory).load(df['id'], with_signatures=deduplicator.minhasher is not None)
+        if signed is None:
+            # Data stored before signatures were, or with another DEDUP_NUM_PERM: the whole
+            # catalog is signed once, and the signatures are stored with this update
+            signed = deduplicator.sign(df['id'], df['processed_description'])
+        return signed
+
+    def _write(self, directory, df, tombstones, live_rows, changes, to_embed, to_copy, signed):
+        if changes.empty:
+            service_logger.info("Incremental update: catalog is up to date")
+            return
+
+        vectors = []
+        if to_embed:
+            # New rows must come from the model the stored rows were built with
+            check_embeddings_model(directory, self.processing_chain.embeddings)
+            vectors.append(np.asarray(self.processing_chain.create_embeddings([book['processed_description'] for book in to_embed]), dtype=np.float32))
+        if to_copy:
+            stored = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+            vectors.append(np.asarray(stored[[row for _, row in to_copy]], dtype=np.float32))
+        new_books = to_embed + [book for book, _ in to_copy]
+
+        superseded = changes.reembedded + changes.updated + changes.removed
+        tombstones.update(live_rows[book_id] for book_id in superseded)
+
+        # Embedding is done; the stored data is only touched from here on, in a new generation
+        target = self.generations.begin()
+        embeddings_path = os.path.join(target, EMBEDDINGS_FILE)
+        if new_books:
+            # A complete new embeddings.npy: the linked one is shared with the current generation.
+            # This copies O(N) bytes, as do the FAISS index and neighbor graph written below
+            stored = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+            save_npy(embeddings_path, np.concatenate([stored, *vectors]))
+            df = pd.concat([df, pd.DataFrame(new_books)[df.columns]], ignore_index=True)
+            self.book_service.save_dataframe(df, os.path.join(target, "catalog"))
+            # `signed` already holds the stored rows followed by the new ones
+            SignatureFiles.from_settings(target).save(signed)
+        save_npy(os.path.join(target, TOMBSTONES_FILE), np.array(sorted(tombstones), dtype=np.int64))
+
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+        faiss_index, neighbor_graph = FaissShardFiles.from_settings(target), NeighborGraph.from_settings(target)
+        if new_books and faiss_index.exists():
+            faiss_index.load_or_build(embeddings)
+        if new_books and neighbor_graph.exists():
+            neighbor_graph.update(embeddings, sorted(tombstones))
+        self.generations.commit(target, len(embeddings))
+        service_logger.info(
+            f"Incremental update: {len(changes.added)} added, {len(changes.reembedded)} re-embedded, "
+            f"{len(changes.updated)} updated, {len(changes.removed)} removed"
+        )
@@ -0,0 +1,129 @@
+import os
+import numpy as np
+from app.core.config import settings
+from app.core.logger import service_logger
+from app.services.cosine_engine import top_k
+
+NEIGHBORS_FILE = "neighbors.npy"
+NEIGHBOR_SCORES_FILE = "neighbor_scores.npy"
+
+
+def neighbor_lists(embeddings, query_range, candidate_range, m, dead=None, query_block=1024, candidate_block=16384):
+    """Top-m most similar candidate rows of each query row, by cosine similarity of `embeddings` rows.
+
+    Queries and candidates are row ranges (start, stop) of `embeddings`. A row is never its
+    own neighbor, and rows flagged in the `dead` mask are never neighbors. Both ranges are
+    walked in blocks, so at most query_block x candidate_block scores exist at once and each
+    block is one matrix-matrix product. Returns (ids, scores) of shape (queries, m), best
+    first, padded with -1 / -inf when there are fewer than m candidates.
+    """
+    q_start, q_stop = query_range
+    c_start, c_stop = candidate_range
+    ids = np.full((q_stop - q_start, m), -1, dtype=np.int64)
+    scores = np.full((q_stop - q_start, m), -np.inf, dtype=np.float32)
+    for qs in range(q_start, q_stop, query_block):
+        qe = min(qs + query_block, q_stop)
+        queries = _normalized_rows(embeddings, qs, qe)
+        best_ids, best_scores = ids[qs - q_start:qe - q_start], scores[qs - q_start:qe - q_start]
+        for cs in range(c_start, c_stop, candidate_block):
+            ce = min(cs + candidate_block, c_stop)
+            block = queries @ _normalized_rows(embeddings, cs, ce).T
+            if dead is not None:
+                block[:, dead[cs:ce]] = -np.inf
+            overlap = np.arange(max(qs, cs), min(qe, ce))
+            block[overlap - qs, overlap - cs] = -np.inf
+            keep = top_k(block, m)
+            merged = merge_neighbors(best_ids, best_scores, keep + cs, np.take_along_axis(block, keep, axis=1), m)
+            best_ids[:], best_scores[:] = merged
+    return ids, scores
+
+
+def merge_neighbors(ids, scores, other_ids, other_scores, m):
+    """Row-wise top-m of two (ids, scores) neighbor lists."""
+    all_ids = np.concatenate([ids, other_ids], axis=1)
+    all_scores = np.concatenate([np.asarray(scores, dtype=np.float32), other_scores], axis=1)
+    keep = top_k(all_scores, m)
+    ids, scores = np.take_along_axis(all_ids, keep, axis=1), np.take_along_axis(all_scores, keep, axis=1)
+    ids[~np.isfinite(scores)] = -1
+    return ids, scores
+
+
+def _normalized_rows(embeddings, start, stop):
+    rows = np.array(embeddings[start:stop], dtype=np.float32)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return rows / norms
+
+
+class NeighborGraph:
+    """The top-M most similar books of every row of embeddings.npy, precomputed offline.
+
+    neighbors.npy holds the neighbors' row ids as int32 (-1 = none) best first, and
+    neighbor_scores.npy their cosine similarities as float16: 6 bytes per neighbor, so
+    "more like this book" is a row lookup instead of an embedding call and a full scan.
+    Rows are those of embeddings.npy: update() extends the graph with appended rows (and
+    adds them to the lists of existing rows they beat), rebuild() is needed after compaction
+    renumbers rows. Lists can name rows tombstoned since; readers skip those.
+    """
+
+    def __init__(self, data_dir, m):
+        self.path = os.path.join(data_dir, NEIGHBORS_FILE)
+        self.scores_path = os.path.join(data_dir, NEIGHBOR_SCORES_FILE)
+        self.m = m
+
+    @classmethod
+    def from_settings(cls, data_dir):
+        return cls(data_dir, settings.NEIGHBORS_M)
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.exists(self.scores_path)
+
+    def load(self, num_rows, mmap=False):
+        """(neighbor ids, scores) if the stored graph covers exactly `num_rows` rows with M neighbors, else None."""
+        if not self.exists():
+            return None
+        mmap_mode = 'r' if mmap else None
+        ids, scores = np.load(self.path, mmap_mode=mmap_mode), np.load(self.scores_path, mmap_mode=mmap_mode)
+        if ids.shape != scores.shape or ids.shape != (num_rows, self.m):
+            service_logger.warning(f"Neighbor graph of shape {ids.shape} does not match {num_rows} rows x {self.m} "
+                                   "neighbors; rebuild it with scripts/populate_data.py")
+            return None
+        return ids, scores
+
+    def rebuild(self, embeddings, tombstones=(), **block_sizes):
+        service_logger.info(f"Building the {self.m}-neighbor graph of {len(embeddings)} books")
+        dead = self._dead_mask(len(embeddings), tombstones)
+        ids, scores = neighbor_lists(embeddings, (0, len(embeddings)), (0, len(embeddings)), self.m, dead, **block_sizes)
+        self._save(ids, scores)
+
+    def update(self, embeddings, tombstones=(), **block_sizes):
+        """Add the rows appended to `embeddings` since the graph was built, in time proportional to their number."""
+        if not self.exists():
+            return self.rebuild(embeddings, tombstones, **block_sizes)
+        ids, scores = np.load(self.path), np.load(self.scores_path)
+        if ids.shape != scores.shape or ids.shape[1] != self.m or len(ids) > len(embeddings):
+            return self.rebuild(embeddings, tombstones, **block_sizes)
+        num_old, num_rows = len(ids), len(embeddings)
+        if num_old == num_rows:
+            return
+        dead = self._dead_mask(num_rows, tombstones)
+        old_ids, old_scores = merge_neighbors(
+            ids, scores, *neighbor_lists(embeddings, (0, num_old), (num_old, num_rows), self.m, dead, **block_sizes), self.m)
+        new_ids, new_scores = neighbor_lists(embeddings, (num_old, num_rows), (0, num_rows), self.m, dead, **block_sizes)
+        self._save(np.concatenate([old_ids, new_ids]), np.concatenate([old_scores, new_scores]))
+
+    @staticmethod
+    def _dead_mask(num_rows, tombstones):
+        dead = np.zeros(num_rows, dtype=bool)
+        dead[np.asarray(tombstones, dtype=np.int64)] = True
+        return dead
+
+    def _save(self, ids, scores):
+        # Write then rename, so processes with the graph memory-mapped keep reading the old one;
+        # scores first, since a reader that finds mismatched shapes ignores the graph
+        suffix = f".{os.getpid()}.tmp"
+        for path, array in ((self.scores_path, np.asarray(scores, dtype=np.float16)),
+                            (self.path, np.asarray(ids, dtype=np.int32))):
+            with open(path + suffix, 'wb') as f:
+                np.save(f, array)
+            os.replace(path + suffix, path)
@@ -1,29 +1,53 @@
+import os
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
-from langchain_openai import OpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAI
+from app.services.embedding_cache import CachedEmbeddings, get_embedding_cache
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.embedding_providers import create_embeddings, TFIDF_SVD_MODEL_FILE
+from app.services.data_generations import DataGenerations
 from app.core.config import settings
 
 class ProcessingChain:
-    def __init__(self):
-        self.llm = OpenAI(openai_api_key=settings.OPENAI_API_KEY)
-        self.embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY, model="text-embedding-3-large")
+    def __init__(self, provider=None, data_dir=None):
+        # Only used to rephrase queries, which needs OpenAI whatever the embedding provider
+        self.llm = OpenAI(openai_api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+        # A fitted model (tfidf_svd) is loaded from `data_dir`, by default the current data generation
+        self.base_embeddings = create_embeddings(provider, data_dir)
+        self.embeddings = CachedEmbeddings(self.base_embeddings, get_embedding_cache())
 
-    def create_embeddings(self, texts):
-        embeddings = self.embeddings.embed_documents(texts)
+    def fit_embeddings(self, texts, refit=True, data_dir=None):
+        """Fit a provider that learns from the corpus (tfidf_svd) on `texts` and save it in `data_dir`
+        (default: the current data generation); a no-op for the others.
 
-        return embeddings
+        A rebuild passes the generation it is building, so the model the committed embeddings
+        were built with is never overwritten before the new ones are committed.
+        """
+        embeddings = self.base_embeddings
+        if not hasattr(embeddings, "fit") or (embeddings.is_fitted and not refit):
+            return
+        embeddings.fit(texts)
+        data_dir = data_dir or DataGenerations(settings.DATA_DIR).current_dir()
+        embeddings.save(os.path.join(data_dir, TFIDF_SVD_MODEL_FILE))
+        # The model name changed with the fit, and the cache is keyed on it
+        self.embeddings = CachedEmbeddings(embeddings, get_embedding_cache())
 
-    def create_faiss_index(self, df):
-        if 'embeddings' not in df.columns:
-            faiss_index = FAISS.from_texts(df['processed_description'].tolist(), self.embeddings, metadatas=df.to_dict('records'))
-        else:
-            faiss_index = FAISS.from_embeddings(zip(df['processed_description'], df['embeddings']), self.embeddings, metadatas=df.drop(columns=['embeddings'], axis=1).to_dict('records'))
-        
-        return faiss_index
+    def create_embeddings(self, texts, checkpoint_dir=None):
+        pipeline = EmbeddingPipeline(
+            self.embeddings,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+            checkpoint_dir=checkpoint_dir
+        )
+        embeddings = pipeline.run(texts)
+        pipeline.clear_checkpoints()
+
+        return embeddings
 
     # if we want to rephrase user query / description
     def process_query(self, query):
+        if self.llm is None:
+            raise ValueError("Rephrasing queries needs OPENAI_API_KEY")
         prompt_template = """
         Given the following user query,
         rephrase it to capture the essence of the book the user is looking for:
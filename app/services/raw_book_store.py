@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+from app.services.text_cleaning import iter_json_array
+
+
+class RawBookStore:
+    """Raw Google Books volumes as append-only, gzip-compressed JSON Lines shards.
+
+    manifest.json lists the shards in ingestion order with their item counts. Appending
+    writes new shards and then atomically replaces the manifest, so existing shards are
+    never rewritten and a crashed append leaves no partial data visible.
+    Reading streams one line at a time, so memory does not grow with the history.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory, shard_size=10_000):
+        if shard_size <= 0:
+            raise ValueError("shard_size must be greater than 0")
+        self.directory = directory
+        self.shard_size = shard_size
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, self.MANIFEST))
+
+    def shards(self):
+        if not self.exists():
+            return []
+        with open(os.path.join(self.directory, self.MANIFEST), 'r') as f:
+            return json.load(f)["shards"]
+
+    def __len__(self):
+        return sum(shard["count"] for shard in self.shards())
+
+    def iter_items(self):
+        """Yield every stored volume, shard by shard, in ingestion order."""
+        for shard in self.shards():
+            with gzip.open(os.path.join(self.directory, shard["name"]), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def append(self, items):
+        """Store `items` (any iterable) in new shards of at most shard_size volumes. Returns how many were stored."""
+        os.makedirs(self.directory, exist_ok=True)
+        shards = self.shards()
+        # Shards are never removed, so numbering continues from the count; a shard left by a
+        # crashed append has the next number and is simply overwritten
+        number = len(shards)
+        added = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == self.shard_size:
+                number += 1
+                shards.append(self._write_shard(number, batch))
+                added += len(batch)
+                batch = []
+        if batch:
+            number += 1
+            shards.append(self._write_shard(number, batch))
+            added += len(batch)
+        if added:
+            self._write_manifest(shards)
+        return added
+
+    def import_books_json(self, path):
+        """One-shot migration of a legacy books.json ({"items": [...]}), streamed without loading it whole."""
+        return self.append(iter_json_array(path, 'items'))
+
+    def _write_shard(self, number, items):
+        name = f"shard-{number:06d}.jsonl.gz"
+        tmp_path = os.path.join(self.directory, f"{name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write('\n')
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        return {"name": name, "count": len(items)}
+
+    def _write_manifest(self, shards):
+        tmp_path = os.path.join(self.directory, f"{self.MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"shards": shards}, f)
+        os.replace(tmp_path, os.path.join(self.directory, self.MANIFEST))
@@ -1,101 +1,332 @@
+import math
 import os
 import numpy as np
 from pathlib import Path
-from functools import lru_cache
-from sklearn.metrics.pairwise import cosine_similarity
-from langchain_community.vectorstores import FAISS
 from app.services.book_service import BookService
 from app.services.processing_chain import ProcessingChain
+from app.services.book_store import BookMetadataStore
+from app.services.cosine_engine import CosineSearchEngine, load_normalized_matrix
+from app.services.faiss_engine import FaissSearchEngine, FaissShardFiles
+from app.services.sharded_engine import ShardedSearchEngine
+from app.services.filter_index import FilterIndex
+from app.services.neighbor_graph import NeighborGraph
+from app.services.incremental_indexer import live_positions
+from app.services.data_generations import DataGenerations, check_row_counts
+from app.services.embedding_providers import check_embeddings_model, model_name, write_embeddings_model
+from app.services.text_cleaning import create_query_normalizer
 from app.core.config import settings
 from app.core.logger import service_logger
-from app.models import RecommendedBook
+from app.core.metrics import metrics
+
+class BookNotFoundError(LookupError):
+    pass
 
 class RecommendationService:
-    def __init__(self):
-        self.book_service = BookService()
-        self.processing_chain = ProcessingChain()
-        self.data_dir = Path(settings.DATA_DIR)
-        self.df = self.book_service.load_dataframe()
-        self.faiss_index = self._load_or_create_faiss_index()
-        self.embeddings = self._load_or_create_embeddings()
-
-    def _load_or_create_faiss_index(self):
-        faiss_index_path = os.path.join(settings.DATA_DIR, "faiss_index")
+    def __init__(self, book_service=None, processing_chain=None, query_normalizer=None):
+        # Every file is read from the generation current now, even if an update commits meanwhile
+        data_dir, num_rows = DataGenerations(settings.DATA_DIR).current()
+        self.data_dir = Path(data_dir)
+        self.book_service = book_service or BookService()
+        self.processing_chain = processing_chain or ProcessingChain(data_dir=data_dir)
+        # Loaded and warmed up here so the first request does not pay for NLTK's lazy loading
+        self.query_normalizer = query_normalizer or create_query_normalizer()
+        # Only the serving columns of the catalog are opened, memory-mapped
+        catalog = self.book_service.load_catalog(os.path.join(data_dir, "catalog"))
+        stored_embeddings = self._load_or_create_embeddings(catalog)
+        index_files = FaissShardFiles.from_settings(data_dir)
+        # Rows are matched up by number, so data that does not line up would serve the wrong books
+        check_row_counts(generation=num_rows, catalog=len(catalog), embeddings=len(stored_embeddings),
+                         faiss=index_files.stored_ntotal())
+        # Tombstoned rows stay in the stored matrices, so they can be memory-mapped as they are
+        # on disk, and are skipped at search time (they map to -1)
+        positions = live_positions(len(stored_embeddings), data_dir)
+        self.live_rows = np.flatnonzero(positions >= 0)
+        self.row_positions = positions
+        self.stored_embeddings = stored_embeddings
+        self.book_store = BookMetadataStore.from_catalog(catalog, rows=self.live_rows)
+        self.filter_index = FilterIndex.from_catalog(catalog, self.live_rows)
+        cosine_engine = self._load_cosine_engine(stored_embeddings, positions)
+        # A compressed index only shortlists candidates; they are re-scored on the cosine matrix
+        rerank = index_files.compressed and settings.FAISS_RERANK_CANDIDATES > 0
+        shards = []
+        faiss_shards = self._load_or_create_faiss_index(index_files, stored_embeddings)
+        stops = [start for start, _ in faiss_shards[1:]] + [len(positions)]
+        for (start, index), stop in zip(faiss_shards, stops):
+            # Shard engines share the cosine matrix (row-range views) and the full positions
+            cosine_shard = cosine_engine if len(faiss_shards) == 1 else cosine_engine.shard(start, stop)
+            faiss_shard = FaissSearchEngine(
+                index,
+                positions[start:stop],
+                nprobe=settings.FAISS_NPROBE,
+                ef_search=settings.FAISS_EF_SEARCH,
+                rerank=cosine_shard if rerank else None,
+                rerank_candidates=settings.FAISS_RERANK_CANDIDATES
+            )
+            shards.append((start, cosine_shard, faiss_shard))
+        if len(shards) == 1:
+            self.cosine_engine, self.faiss_engine = cosine_engine, shards[0][2]
+        else:
+            self.cosine_engine = ShardedSearchEngine([(start, engine) for start, engine, _ in shards])
+            self.faiss_engine = ShardedSearchEngine([(start, engine) for start, _, engine in shards])
+        self.neighbor_graph = NeighborGraph.from_settings(data_dir).load(len(stored_embeddings), mmap=settings.USE_MMAP)
+
+    @property
+    def num_books(self):
+        return len(self.book_store)
+
+    def _load_or_create_faiss_index(self, index_files, embeddings):
         try:
-            if os.path.exists(faiss_index_path):
-                service_logger.info("Loading existing FAISS index")
-                return FAISS.load_local(faiss_index_path, self.processing_chain.embeddings, allow_dangerous_deserialization=True)
-            else:
-                service_logger.info("Creating new FAISS index")
-                faiss_index = self.processing_chain.create_faiss_index(self.df)
-                faiss_index.save_local(faiss_index_path)
-                return faiss_index
+            return index_files.load_or_build(embeddings)
         except Exception as e:
             service_logger.error(f"Error in _load_or_create_faiss_index: {str(e)}", exc_info=True)
             raise
 
-    def _load_or_create_embeddings(self):
-        embeddings_path = os.path.join(settings.DATA_DIR, "embeddings.npy")
+    def _load_or_create_embeddings(self, catalog):
+        embeddings_path = os.path.join(self.data_dir, "embeddings.npy")
+        mmap_mode = 'r' if settings.USE_MMAP else None
         try:
             if os.path.exists(embeddings_path):
                 service_logger.info("Loading existing embeddings")
-                return np.load(embeddings_path)
+                # Queries are embedded by the configured model, so the corpus must have been too
+                check_embeddings_model(self.data_dir, self.processing_chain.embeddings)
+                return np.load(embeddings_path, mmap_mode=mmap_mode)
             else:
                 service_logger.info("Creating new embeddings")
-                texts = self.df['processed_description'].tolist()
+                texts = catalog.column('processed_description').tolist()
+                self.processing_chain.fit_embeddings(texts, refit=False, data_dir=self.data_dir)
                 embeddings = self.processing_chain.create_embeddings(texts)
                 np.save(embeddings_path, embeddings)
-                return embeddings
+                write_embeddings_model(self.data_dir, model_name(self.processing_chain.embeddings))
+                return np.load(embeddings_path, mmap_mode=mmap_mode)
         except Exception as e:
             service_logger.error(f"Error in _load_or_create_embeddings: {str(e)}", exc_info=True)
             raise
 
-    @lru_cache(maxsize=100)
-    def recommend_books_faiss(self, description, k=5):
+    def _load_cosine_engine(self, embeddings, positions):
+        if not settings.USE_MMAP:
+            return CosineSearchEngine(embeddings, dtype=settings.COSINE_DTYPE, positions=positions)
+        # The normalized matrix is kept on disk too, so it is mapped rather than computed per process
+        matrix = load_normalized_matrix(
+            os.path.join(self.data_dir, "embeddings.npy"),
+            os.path.join(self.data_dir, f"embeddings_normalized_{settings.COSINE_DTYPE}.npy"),
+            dtype=settings.COSINE_DTYPE
+        )
+        return CosineSearchEngine(matrix, dtype=settings.COSINE_DTYPE, positions=positions, normalized=True)
+
+    def recommend_books_faiss(self, description, k=5, filters=None, collapse=False):
         if k == 0:
             return []
         if k <= 0:
             raise ValueError("Number of recommendations must be greater than 0")
         try:
+            subset = None
+            if filters:
+                with metrics.stage("faiss", "filter"):
+                    subset = self.filter_index.select(filters)
+                if subset is not None and not len(subset):
+                    return []
             # processed_query = self.processing_chain.process_query(description)
-            clean_description = self.book_service._clean_text(description)
-            similar_docs = self.faiss_index.similarity_search_with_relevance_scores(clean_description, k=k)
-
-            return [
-                RecommendedBook(
-                    id=doc.metadata['id'], 
-                    title=doc.metadata['title'], 
-                    authors=doc.metadata['authors'], 
-                    description=doc.metadata['description'],
-                    similarity=score
-                    ) for doc, score in similar_docs
-                ]
-        
+            with metrics.stage("faiss", "normalize"):
+                clean_description = self.query_normalizer(description)
+            with metrics.stage("faiss", "embed"):
+                query_embedding = self.processing_chain.embeddings.embed_query(clean_description)
+            with metrics.stage("faiss", "search"):
+                positions, scores = self._search("faiss", query_embedding, k, subset, collapse)
+            with metrics.stage("faiss", "build"):
+                return self.book_store.to_recommended_books(positions, scores)
+
         except Exception as e:
             service_logger.error(f"Error in recommend_books_faiss: {str(e)}", exc_info=True)
             raise
 
-    @lru_cache(maxsize=100)
-    def recommend_books_cosine(self, description, k=5):
+    def recommend_books_cosine(self, description, k=5, filters=None, collapse=False):
         if k == 0:
             return []
         if k <= 0:
             raise ValueError("Number of recommendations must be greater than 0")
         try:
+            subset = None
+            if filters:
+                with metrics.stage("cosine", "filter"):
+                    subset = self.filter_index.select(filters)
+                if subset is not None and not len(subset):
+                    return []
             # processed_query = self.processing_chain.process_query(description)
-            query_embedding = self.processing_chain.embeddings.embed_query(description)
-            cosine_similarities = cosine_similarity([query_embedding], self.embeddings).flatten()
-            similar_indices = cosine_similarities.argsort()[-k:][::-1]
-
-            return [
-                RecommendedBook(
-                    id=self.df.iloc[idx]['id'],
-                    title=self.df.iloc[idx]['title'],
-                    authors=self.df.iloc[idx]['authors'],
-                    description=self.df.iloc[idx]['description'],
-                    similarity=cosine_similarities[idx]
-                ) for idx in similar_indices
-            ]
+            with metrics.stage("cosine", "embed"):
+                query_embedding = self.processing_chain.embeddings.embed_query(description)
+            with metrics.stage("cosine", "search"):
+                positions, scores = self._search("cosine", query_embedding, k, subset, collapse)
+            with metrics.stage("cosine", "build"):
+                return self.book_store.to_recommended_books(positions, scores)
         except Exception as e:
             service_logger.error(f"Error in recommend_books_cosine: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    def recommend_books_by_id(self, book_id, k=5):
+        """Books most similar to the stored book `book_id`, from its precomputed neighbors.
+
+        Its stored vector is used as is, so nothing is embedded. When the neighbor graph is
+        missing or holds fewer than k live neighbors, the vector is searched exactly instead.
+        """
+        if k == 0:
+            return []
+        if k <= 0:
+            raise ValueError("Number of recommendations must be greater than 0")
+        try:
+            with metrics.stage("by_id", "lookup"):
+                position = self.book_store.position_of(book_id)
+                if position is None:
+                    raise BookNotFoundError(f"Book {book_id!r} not found")
+                row = self.live_rows[position]
+                positions = scores = None
+                if self.neighbor_graph is not None:
+                    neighbor_rows, neighbor_scores = self.neighbor_graph[0][row], self.neighbor_graph[1][row]
+                    found = self.row_positions[neighbor_rows]
+                    # -1 padding maps to the last row's position, so it is dropped by the row test
+                    live = (neighbor_rows >= 0) & (found >= 0)
+                    positions, scores = found[live][:k], neighbor_scores[live][:k]
+                    if len(positions) < min(k, self.num_books - 1):
+                        positions = None
+            if positions is None:
+                with metrics.stage("by_id", "search"):
+                    # One extra hit, since the book itself (or an identical copy of its text) comes back
+                    positions, scores = self.cosine_engine.search(np.asarray(self.stored_embeddings[row], dtype=np.float32), k + 1)
+                    keep = positions != position
+                    positions, scores = positions[keep][:k], scores[keep][:k]
+            with metrics.stage("by_id", "build"):
+                return self.book_store.to_recommended_books(positions, scores)
+        except BookNotFoundError:
+            raise
+        except Exception as e:
+            service_logger.error(f"Error in recommend_books_by_id: {str(e)}", exc_info=True)
+            raise
+
+    def _search(self, method, query_embedding, k, subset=None, collapse=False):
+        """Top-k (positions, scores) of one query, over the filtered books if `subset` is given.
+
+        With `collapse`, at most one edition of each work (same title and authors) is returned:
+        the search is repeated with more hits, sized by the share of duplicates seen so far,
+        until k distinct works are found or the books run out.
+        """
+        if subset is None:
+            engine = self.faiss_engine if method == "faiss" else self.cosine_engine
+            search = lambda n: engine.search(query_embedding, n)
+        elif method == "faiss":
+            search = lambda n: self._search_subset_faiss(query_embedding, subset, n)
+        else:
+            rows = self.live_rows[subset]
+            search = lambda n: self.cosine_engine.search_subset(query_embedding, rows, n)
+        if not collapse:
+            return search(k)
+        available = self.num_books if subset is None else len(subset)
+        fetch = k
+        while True:
+            positions, scores = search(fetch)
+            keep = self.book_store.distinct_works(positions)
+            if len(keep) >= k or len(positions) < fetch or fetch >= available:
+                return positions[keep][:k], scores[keep][:k]
+            # Distinct works per hit so far predict how many more hits the missing ones take
+            fetch = min(available, fetch + math.ceil((k - len(keep)) * len(positions) / max(len(keep), 1)))
+
+    def _search_subset_faiss(self, query_embedding, subset, k):
+        """FAISS search restricted to the filtered books (`subset` positions), always min(k, len(subset)) hits."""
+        rows = self.live_rows[subset]
+        if len(rows) <= settings.FILTER_EXACT_MAX_ROWS:
+            # Scoring a small subset directly beats any index, which still visits every row
+            # (flat) or may miss most of the subset (IVF, HNSW)
+            return self.cosine_engine.search_subset(query_embedding, rows, k)
+        positions, scores = self.faiss_engine.search_subset(query_embedding, rows, k)
+        if len(positions) < min(k, len(rows)):
+            # The approximate index missed some of the filtered books
+            positions, scores = self.cosine_engine.search_subset(query_embedding, rows, k)
+        return positions, scores
+
+    def recommend_books_batch(self, requests, method="faiss"):
+        """Recommend books for many (description, k), (description, k, filters) or
+        (description, k, filters, collapse) requests with one embedding call and one search.
+
+        Returns one entry per request, in input order: the list of recommended books, or the
+        exception raised for that item, so a bad item does not fail the rest of the batch.
+        Filtered and collapsed items share the embedding call but are searched one by one.
+        """
+        if method not in ("faiss", "cosine"):
+            raise ValueError(f"Unknown search method {method!r}")
+        backend = f"{method}_batch"
+        results = [None] * len(requests)
+        ks = [request[1] for request in requests]
+        subsets = {}
+        collapsed = set()
+        queries = {}
+        with metrics.stage(backend, "normalize"):
+            for i, (description, k, *options) in enumerate(requests):
+                if k < 0:
+                    results[i] = ValueError("Number of recommendations must be greater than 0")
+                elif k == 0:
+                    results[i] = []
+                else:
+                    try:
+                        subset = self.filter_index.select(options[0] if options else None)
+                        if subset is not None and not len(subset):
+                            results[i] = []
+                            continue
+                        if subset is not None:
+                            subsets[i] = subset
+                        if len(options) > 1 and options[1]:
+                            collapsed.add(i)
+                        queries[i] = self.query_normalizer(description) if method == "faiss" else description
+                    except Exception as e:
+                        results[i] = e
+        if not queries:
+            return results
+
+        with metrics.stage(backend, "embed"):
+            vectors = self._embed_queries(list(queries.values()))
+        items = []
+        for i, vector in zip(queries, vectors):
+            if isinstance(vector, Exception):
+                results[i] = vector
+            else:
+                items.append((i, vector))
+        if not items:
+            return results
+
+        try:
+            unfiltered = [(i, vector) for i, vector in items if i not in subsets and i not in collapsed]
+            hits = {}
+            with metrics.stage(backend, "search"):
+                if unfiltered:
+                    matrix = np.array([vector for _, vector in unfiltered], dtype=np.float32)
+                    k_max = max(ks[i] for i, _ in unfiltered)
+                    if method == "faiss":
+                        found = self.faiss_engine.search_batch(matrix, k_max)
+                    else:
+                        found = list(zip(*self.cosine_engine.search_batch(matrix, k_max)))
+                    hits.update(zip((i for i, _ in unfiltered), found))
+                for i, vector in items:
+                    if i in subsets or i in collapsed:
+                        hits[i] = self._search(method, vector, ks[i], subsets.get(i), i in collapsed)
+            with metrics.stage(backend, "build"):
+                for i, _ in items:
+                    positions, scores = hits[i]
+                    results[i] = self.book_store.to_recommended_books(positions[:ks[i]], scores[:ks[i]])
+        except Exception as e:
+            service_logger.error(f"Error in recommend_books_batch: {str(e)}", exc_info=True)
+            for i, _ in items:
+                results[i] = e
+        return results
+
+    def _embed_queries(self, texts):
+        embeddings = self.processing_chain.embeddings
+        # CachedEmbeddings serves repeated queries from the cache; other models embed everything
+        embed_queries = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+        try:
+            return embed_queries(texts)
+        except Exception as e:
+            service_logger.warning(f"Batched query embedding failed ({str(e)}), embedding items one by one")
+        vectors = []
+        for text in texts:
+            try:
+                vectors.append(embeddings.embed_query(text))
+            except Exception as e:
+                vectors.append(e)
+        return vectors
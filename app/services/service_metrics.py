@@ -0,0 +1,64 @@
+from app.core.logger import log_pipeline
+from app.core.metrics import metrics
+from app.services.compute_executor import compute_executor
+from app.services.embedding_cache import get_embedding_cache
+from app.services.service_provider import service_provider
+
+# Gauges and counters read at scrape time from the objects that already keep them,
+# so the request path does no extra bookkeeping for them
+
+
+def _service():
+    return service_provider.get() if service_provider.ready else None
+
+
+def _index_sizes():
+    service = _service()
+    if service is None:
+        return None
+    return {("faiss",): len(service.faiss_engine), ("cosine",): len(service.cosine_engine)}
+
+
+def _lemma_cache(field):
+    def collect():
+        service = _service()
+        # Only TextCleaner memoizes lemmas; other normalizers have no cache to report
+        lemmatize = getattr(getattr(service, "query_normalizer", None), "lemmatize", None)
+        if not hasattr(lemmatize, "cache_info"):
+            return None
+        info = lemmatize.cache_info()
+        if field == "hit_ratio":
+            lookups = info.hits + info.misses
+            return info.hits / lookups if lookups else 0.0
+        return getattr(info, field)
+    return collect
+
+
+def _num_books():
+    service = _service()
+    return None if service is None else service.num_books
+
+
+metrics.gauge("recommendation_books", "Books served by the live recommendation service", collect=_num_books)
+metrics.gauge("recommendation_index_vectors", "Live vectors in each search index", ["backend"], collect=_index_sizes)
+metrics.gauge("recommendation_service_generation", "Number of times the service was (re)loaded",
+              collect=lambda: service_provider.generation)
+
+metrics.counter("embedding_cache_hits_total", "Query embeddings served from the cache", collect=lambda: get_embedding_cache().hits)
+metrics.counter("embedding_cache_misses_total", "Query embeddings that had to be computed", collect=lambda: get_embedding_cache().misses)
+metrics.gauge("embedding_cache_hit_ratio", "Query embedding cache hits / lookups since start", collect=lambda: get_embedding_cache().hit_ratio)
+metrics.gauge("embedding_cache_entries", "Query embeddings held in memory", collect=lambda: len(get_embedding_cache()))
+
+metrics.counter("query_lemma_cache_hits_total", "Lemmatizer cache hits of the query normalizer", collect=_lemma_cache("hits"))
+metrics.counter("query_lemma_cache_misses_total", "Lemmatizer cache misses of the query normalizer", collect=_lemma_cache("misses"))
+metrics.gauge("query_lemma_cache_hit_ratio", "Lemmatizer cache hits / lookups of the query normalizer", collect=_lemma_cache("hit_ratio"))
+
+metrics.gauge("compute_jobs_in_flight", "Recommendation jobs running or queued on the compute pool",
+              collect=lambda: compute_executor.pending)
+metrics.counter("compute_jobs_coalesced_total", "Requests that shared an identical in-flight job",
+                collect=lambda: compute_executor.coalesced)
+metrics.counter("compute_jobs_rejected_total", "Requests rejected because the compute pool was full",
+                collect=lambda: compute_executor.rejected)
+
+metrics.counter("log_records_dropped_total", "Log records dropped because the log queue was full",
+                collect=lambda: log_pipeline.dropped)
@@ -0,0 +1,71 @@
+import threading
+import time
+from app.services.recommendation_service import RecommendationService
+from app.core.logger import service_logger
+
+
+class ServiceNotReadyError(RuntimeError):
+    pass
+
+
+class RecommendationServiceProvider:
+    """Holds the process-wide RecommendationService.
+
+    The service is built once (at startup) and treated as immutable afterwards.
+    A rebuilt service replaces the live one with a single reference swap, so
+    requests that already hold the old instance finish against it untouched.
+    """
+
+    def __init__(self, factory=RecommendationService):
+        self._factory = factory
+        self._service = None
+        self._build_lock = threading.Lock()
+        self.generation = 0
+        self.loaded_at = None
+        self.reloading = False
+
+    @property
+    def ready(self):
+        return self._service is not None
+
+    def get(self):
+        service = self._service
+        if service is None:
+            raise ServiceNotReadyError("Recommendation service is not loaded yet")
+        return service
+
+    def load(self):
+        # Only build once, even if several callers race on startup
+        with self._build_lock:
+            if self._service is not None:
+                return self._service
+            return self._build_and_swap()
+
+    def reload(self):
+        with self._build_lock:
+            return self._build_and_swap()
+
+    def swap(self, service):
+        previous = self._service
+        self._service = service
+        self.generation += 1
+        self.loaded_at = time.time()
+        service_logger.info(f"Recommendation service swapped in (generation {self.generation})")
+        return previous
+
+    def _build_and_swap(self):
+        self.reloading = True
+        try:
+            start = time.perf_counter()
+            service = self._factory()
+            service_logger.info(f"Recommendation service built in {time.perf_counter() - start:.2f}s")
+            self.swap(service)
+            return service
+        except Exception as e:
+            service_logger.error(f"Error building recommendation service: {str(e)}", exc_info=True)
+            raise
+        finally:
+            self.reloading = False
+
+
+service_provider = RecommendationServiceProvider()
@@ -0,0 +1,84 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from app.core.config import settings
+
+
+def shard_ranges(num_rows, num_shards):
+    """(start, stop) row ranges splitting `num_rows` rows into `num_shards` contiguous shards of near-equal size."""
+    bounds = np.linspace(0, num_rows, num_shards + 1).astype(np.int64)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def merge_top_k(results, k):
+    """Merge (positions, scores) lists that are each sorted best first into the overall top k.
+
+    A k-way heap merge: O(k log shards), and only the heads of the lists are ever compared.
+    Shard results carry global positions, so the same merge serves results gathered from
+    other processes or hosts.
+    """
+    streams = [zip(scores.tolist(), positions.tolist()) for positions, scores in results]
+    merged = list(islice(heapq.merge(*streams, key=lambda hit: hit[0], reverse=True), k))
+    return (np.array([position for _, position in merged], dtype=np.int64),
+            np.array([score for score, _ in merged], dtype=np.float32))
+
+
+_search_pool = None
+_search_pool_lock = threading.Lock()
+
+
+def get_search_pool():
+    """Threads shared by every sharded engine: SEARCH_THREADS, or one per shard."""
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=settings.SEARCH_THREADS or settings.SEARCH_SHARDS,
+                                              thread_name_prefix="shard-search")
+        return _search_pool
+
+
+class ShardedSearchEngine:
+    """Searches engines that each hold one row range of the corpus concurrently and merges their top-k.
+
+    `shards` is a list of (start row, engine) in row order; each engine (CosineSearchEngine or
+    FaissSearchEngine) numbers its own rows from 0 and returns global BookMetadataStore
+    positions. BLAS and FAISS release the GIL, so shards searched on `executor` threads run on
+    separate cores. Results have the format of the shard engines: (positions, scores)
+    matrices for cosine engines, a list of pairs per query for FAISS.
+    """
+
+    def __init__(self, shards, executor=None):
+        self.shards = shards
+        self.starts = np.array([start for start, _ in shards], dtype=np.int64)
+        self.executor = executor or get_search_pool()
+
+    def __len__(self):
+        return sum(len(engine) for _, engine in self.shards)
+
+    def search(self, query_embedding, k):
+        result = self.search_batch([query_embedding], k)
+        if isinstance(result, tuple):
+            return result[0][0], result[1][0]
+        return result[0]
+
+    def search_batch(self, query_embeddings, k):
+        futures = [self.executor.submit(engine.search_batch, query_embeddings, k) for _, engine in self.shards]
+        results = [future.result() for future in futures]
+        if isinstance(results[0], tuple):
+            # Every query gets min(k, live rows) hits, so the merged rows stack into matrices
+            merged = [merge_top_k(hits, k) for hits in zip(*(list(zip(*result)) for result in results))]
+            return np.array([positions for positions, _ in merged]), np.array([scores for _, scores in merged])
+        return [merge_top_k(hits, k) for hits in zip(*results)]
+
+    def search_subset(self, query_embedding, rows, k):
+        """Top-k among the global `rows`, searched on the shards that hold any of them."""
+        rows = np.asarray(rows, dtype=np.int64)
+        shard_of_row = np.searchsorted(self.starts, rows, side="right") - 1
+        futures = []
+        for shard, (start, engine) in enumerate(self.shards):
+            local_rows = rows[shard_of_row == shard] - start
+            if len(local_rows):
+                futures.append(self.executor.submit(engine.search_subset, query_embedding, local_rows, k))
+        return merge_top_k([future.result() for future in futures], k)
@@ -0,0 +1,183 @@
+import json
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+from app.core.config import settings
+
+
+# Characters NLTKWordTokenizer always pads with spaces, plus '' quotes, ellipses, double dashes
+# and ':' / ',' not followed by a digit
+_SPLIT = re.compile(r"(''|[«“‘„»”’\"`;@#$%&?!*\[\](){}<>\u2012-\u2015]|\.{2,}|--|[:,](?!\d))")
+# A leading quote that does not start a clitic ('s, 're, n't...) is split from its word
+_STARTING_QUOTE = re.compile(r"(?i)(?<!\w)(')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+_CLITIC = re.compile(r"(?i)^(.*[^'])('s|'m|'d|'ll|'re|'ve|n't|')$")
+_CONTRACTIONS = re.compile(r"(?i)\b(?:(can)(not)|(d)('ye)|(gim)(me)|(gon)(na)|(got)(ta)|(lem)(me)|(more)('n))\b|\b(wan)(na)(?=\s)")
+_CLOSERS = "\"'”’»)]}>"
+_OPENERS = "\"'“‘«([{<`"
+
+# Lowercase abbreviations after which punkt does not end a sentence
+ABBREVIATIONS = frozenset("""
+    mr mrs ms dr prof sr jr st mt ft vs etc inc ltd co corp bros dept univ assn ave blvd rd
+    jan feb mar apr jun jul aug sep sept oct nov dec mon tue wed thu fri sat sun
+    gen col lt sgt capt cmdr adm gov sen rep rev hon pres vol vols ed eds no nos pp fig al
+    approx est ca cf viz e.g i.e u.s u.k ph.d a.m p.m
+""".split())
+
+
+def _split_sentence_period(chunk, last):
+    # punkt ends a sentence at "word." followed by whitespace, unless the word is an
+    # abbreviation or an initial; the tokenizer then splits that final period off
+    stripped = chunk.rstrip(_CLOSERS)
+    if not stripped.endswith('.') or stripped.endswith('..'):
+        return chunk
+    word = stripped[:-1].lstrip(_OPENERS)
+    if last or (len(word) > 1 and word not in ABBREVIATIONS):
+        return stripped[:-1] + ' ' + chunk[len(stripped) - 1:]
+    return chunk
+
+
+def regex_tokenize(text):
+    """Fast approximation of nltk.word_tokenize for the alphabetic tokens we keep.
+
+    Applies NLTKWordTokenizer's splitting rules in a few regex passes and replaces punkt
+    sentence splitting with a per-word rule (see _split_sentence_period).
+    Only alphabetic tokens are meant to match NLTK; other tokens may differ.
+    """
+    chunks = text.split()
+    chunks = [_split_sentence_period(chunk, i == len(chunks) - 1) for i, chunk in enumerate(chunks)]
+    text = _STARTING_QUOTE.sub(r"\1 ", ' '.join(chunks))
+    text = _SPLIT.sub(r" \1 ", text)
+    text = _CONTRACTIONS.sub(lambda m: ' '.join(group for group in m.groups() if group), text)
+    tokens = []
+    for token in text.split():
+        clitic = None if token.isalpha() else _CLITIC.match(token)
+        if clitic:
+            tokens.extend(clitic.groups())
+        else:
+            tokens.append(token)
+    return tokens
+
+
+TOKENIZERS = {
+    "nltk": word_tokenize,
+    "regex": regex_tokenize,
+}
+
+
+class TextCleaner:
+    """Tokenize, drop stopwords and non-alphabetic tokens, lemmatize.
+
+    Lemmatization is memoized per unique token: book descriptions reuse a small
+    vocabulary, so most WordNet lookups are served from the cache. The tokenizer
+    is pluggable (see TOKENIZERS).
+    """
+
+    def __init__(self, tokenizer="nltk", lemma_cache_size=100_000):
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {sorted(TOKENIZERS)}")
+        self.tokenizer = tokenizer
+        self.tokenize = TOKENIZERS[tokenizer]
+        self.stop_words = set(stopwords.words('english'))
+        self.lemmatizer = WordNetLemmatizer()
+        self.lemmatize = lru_cache(maxsize=lemma_cache_size)(self.lemmatizer.lemmatize)
+
+    def __call__(self, text):
+        tokens = self.tokenize(text.lower())
+        tokens = [token for token in tokens if token.isalpha() and token not in self.stop_words]
+        return ' '.join(self.lemmatize(token) for token in tokens)
+
+    def warm_up(self):
+        # NLTK loads punkt and WordNet lazily on first use; pay that at startup, not on a request
+        self.tokenize("Warm up the tokenizer. Then the lemmatizer.")
+        self.lemmatizer.lemmatize("books")
+        return self
+
+
+def create_query_normalizer():
+    return TextCleaner(tokenizer=settings.QUERY_TOKENIZER, lemma_cache_size=settings.QUERY_LEMMA_CACHE_SIZE).warm_up()
+
+
+def clean_book(book, clean_text):
+    """Turn a raw Google Books volume into a catalog row, or None when it has no description."""
+    info = book['volumeInfo']
+    if 'description' not in info:
+        return None
+    return {
+        'id': book['id'],
+        'title': info.get('title', '') + (' - ' + info.get('subtitle', '') if info.get('subtitle') else ''),
+        'authors': info.get('authors', []),
+        'processed_description': clean_text(info.get('description', '')),
+        'description': info.get('description', ''),
+        # Harvest queries (genres) that returned the volume; empty for volumes collected before they were recorded
+        'genres': book.get('harvestQueries', [])
+    }
+
+
+# One cleaner per worker process, built on first use so NLTK data is loaded once per process
+_worker_cleaner = None
+
+def clean_book_chunk(books):
+    global _worker_cleaner
+    if _worker_cleaner is None:
+        _worker_cleaner = TextCleaner()
+    return [clean_book(book, _worker_cleaner) for book in books]
+
+
+def map_chunks_in_order(func, items, workers, chunksize):
+    """Apply `func` to chunks of `items` on a process pool and yield the results in input order.
+
+    `items` is consumed lazily: at most 2 * workers chunks are in flight at once, so memory
+    stays bounded however long the input stream is.
+    """
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+def iter_json_array(path, key='items', chunk_size=1 << 20):
+    """Stream the elements of the top-level `key` array of a JSON file one at a time."""
+    decoder = json.JSONDecoder()
+    marker = f'"{key}"'
+    with open(path, 'r') as f:
+        buffer = ''
+        while True:
+            start = buffer.find(marker)
+            bracket = buffer.find('[', start + len(marker)) if start != -1 else -1
+            if bracket != -1:
+                break
+            more = f.read(chunk_size)
+            if not more:
+                return
+            buffer += more
+
+        position = bracket + 1
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ',':
+                position = _WHITESPACE.match(buffer, position + 1).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                yield item
+            except json.JSONDecodeError:
+                # The element is split across reads: drop what was consumed and read more
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
@@ -0,0 +1,87 @@
+import sys
+import os
+import gc
+import time
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.book_store import BookMetadataStore
+from app.services.columnar_catalog import ColumnarCatalog
+from app.core.config import settings
+
+# Startup time and memory of loading the serving metadata from the pickled DataFrame vs the
+# columnar catalog, at multiples of the current catalog. Each load runs in a fresh process.
+
+def read_memory():
+    status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+    return {key: int(status[key].split()[0]) / 1024 for key in ("RssAnon", "RssFile", "VmHWM")}
+
+def load(kind, path):
+    """Runs in the child process: load the metadata store, serve a few lookups, print stats."""
+    baseline = read_memory()
+    start = time.perf_counter()
+    if kind == "pickle":
+        df = pd.read_pickle(path)
+        store = BookMetadataStore.from_dataframe(df)
+        del df
+    else:
+        store = BookMetadataStore.from_catalog(ColumnarCatalog(path))
+    gc.collect()
+    load_time = time.perf_counter() - start
+    positions = np.random.default_rng(0).integers(0, len(store), 100)
+    start = time.perf_counter()
+    store.to_recommended_books(positions, np.ones(len(positions)))
+    lookup_time = (time.perf_counter() - start) / len(positions)
+    # RssFile is clean page cache shared with every process mapping the catalog; only RssAnon is private.
+    # VmHWM, not ru_maxrss: the latter survives exec and would report the parent's peak
+    memory = {key: value - baseline[key] for key, value in read_memory().items()}
+    print(json.dumps({"load": load_time, "lookup_us": lookup_time * 1e6, **memory}))
+
+def scaled_catalog(df, scale):
+    copies = []
+    for i in range(scale):
+        # Distinct strings per copy: pickle would store repeated objects only once
+        copy = df.copy()
+        for column in ('id', 'title', 'description', 'processed_description'):
+            copy[column] = copy[column] + f" {i}"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalog loading: pickle vs columnar")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return load(*args.child)
+
+    df = pd.read_pickle(os.path.join(settings.DATA_DIR, "books_df.pkl"))
+    print(f"{'scale':>6} {'rows':>8} {'format':>9} {'disk MB':>8} {'load s':>8} {'anon MB':>8} {'file MB':>8} {'peak MB':>8} {'us/book':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            catalog = scaled_catalog(df, scale)
+            paths = {"pickle": os.path.join(tmp, f"books_{scale}.pkl"), "columnar": os.path.join(tmp, f"catalog_{scale}")}
+            catalog.to_pickle(paths["pickle"])
+            ColumnarCatalog.write(catalog, paths["columnar"])
+            rows = len(catalog)
+            del catalog
+            for kind, path in paths.items():
+                # Both files were just written, so both loads read from a warm page cache
+                result = subprocess.run([sys.executable, __file__, "--child", kind, path], capture_output=True, text=True, check=True)
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{scale:>6} {rows:>8} {kind:>9} {directory_size(path) / 2**20:>8.1f} {stats['load']:>8.3f} "
+                      f"{stats['RssAnon']:>8.1f} {stats['RssFile']:>8.1f} {stats['VmHWM']:>8.1f} {stats['lookup_us']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
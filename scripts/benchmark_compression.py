@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import argparse
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.faiss_engine import FaissSearchEngine, build_index, normalized
+
+# Memory of compressed FAISS indexes (int8 "sq8", product quantization "pq", truncated prefixes)
+# against a full float32 copy, and their recall@k against the exact cosine path with and
+# without re-ranking the candidates on the full vectors. Synthetic clustered vectors get a
+# decaying variance per component, as Matryoshka-trained embeddings have; --embeddings runs
+# on a stored embeddings.npy instead (its last --queries rows are the queries).
+
+def synthetic_vectors(rows, dim, rng, clusters=1000, spread=2.0, chunk=50000):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    spectrum = 1 / np.sqrt(1 + np.arange(dim, dtype=np.float32))
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, chunk):
+        stop = min(start + chunk, rows)
+        vectors[start:stop] = centers[rng.integers(0, clusters, stop - start)]
+        vectors[start:stop] += spread * rng.standard_normal((stop - start, dim), dtype=np.float32)
+        vectors[start:stop] *= spectrum
+    return normalized(vectors)
+
+def measure(engine, queries, truth, k):
+    start = time.perf_counter()
+    found = [positions for positions, _ in (engine.search(query, k) for query in queries)]
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return recall, elapsed / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed FAISS indexes with exact re-ranking")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--embeddings", help="Stored embeddings.npy to use instead of synthetic vectors")
+    parser.add_argument("--types", nargs="+", default=["flat_ip", "sq8", "pq"])
+    parser.add_argument("--truncate-dims", type=int, nargs="+", default=[0, 128], help="0 = all components")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[0, 100], help="Re-ranked candidates (0 = none)")
+    parser.add_argument("--pq-m", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = normalized(np.load(args.embeddings, mmap_mode='r'))
+    else:
+        vectors = synthetic_vectors(args.rows + args.queries, args.dim, np.random.default_rng(42))
+    queries, vectors = vectors[-args.queries:], vectors[:-args.queries]
+    rows, dim = vectors.shape
+    exact = CosineSearchEngine(vectors, positions=np.arange(rows), normalized=True)
+    truth = [exact.search(query, args.k)[0] for query in queries]
+    _, exact_ms = measure(exact, queries, truth, args.k)
+    full_mb = vectors.nbytes / 2**20
+    print(f"{rows} x {dim}, k={args.k}; float32 copy {full_mb:.1f} MB, exact cosine {exact_ms:.2f} ms/query")
+    print(f"{'index':>8} {'dim':>5} {'MB':>8} {'saved':>7} {'B/vec':>6} {'rerank':>7} {'recall@k':>9} {'ms/query':>9}")
+    for index_type in args.types:
+        for truncate_dim in args.truncate_dims:
+            if index_type == "flat_ip" and not truncate_dim:
+                continue
+            index = build_index(vectors, index_type, pq_m=args.pq_m, truncate_dim=truncate_dim)
+            memory = faiss.serialize_index(index).nbytes / 2**20
+            for candidates in args.candidates:
+                engine = FaissSearchEngine(index, np.arange(rows), rerank=exact if candidates else None,
+                                           rerank_candidates=candidates)
+                recall, ms = measure(engine, queries, truth, args.k)
+                print(f"{index_type:>8} {truncate_dim or dim:>5} {memory:>8.1f} {1 - memory / full_mb:>7.1%} "
+                      f"{memory * 2**20 / rows:>6.0f} {candidates or '-':>7} {recall:>9.3f} {ms:>9.2f}")
+            del index
+
+if __name__ == "__main__":
+    main()
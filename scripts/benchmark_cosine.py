@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.cosine_engine import CosineSearchEngine
+
+# Per-query latency of exact cosine top-k search: the previous sklearn cosine_similarity + full argsort
+# path against CosineSearchEngine (pre-normalized matrix, matvec + argpartition), single and batched.
+# Memory needed is roughly 2 x rows x dim x 4 bytes (1M x 3072 float32 is ~12 GB per copy),
+# so use --dim to scale the largest sizes down on small machines.
+
+def sklearn_search(embeddings, query, k):
+    similarities = cosine_similarity([query], embeddings).flatten()
+    return similarities.argsort()[-k:][::-1]
+
+def time_per_query(fn, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            fn(query)
+        timings.append((time.perf_counter() - start) / len(queries))
+    return min(timings)
+
+def random_matrix(rows, dim, rng, chunk=50000):
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, chunk):
+        stop = min(start + chunk, rows)
+        matrix[start:stop] = rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return matrix
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exact cosine top-k search")
+    parser.add_argument("--rows", type=int, nargs="+", default=[2400, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-sklearn-above", type=int, default=100_000,
+                        help="Skip the slow sklearn baseline for larger corpora")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"dim={args.dim} k={args.k} queries={args.queries} batch={args.batch}")
+    print(f"{'rows':>10} {'sklearn ms/q':>14} {'f32 ms/q':>10} {'f16 ms/q':>10} {'f32 batch ms/q':>16}")
+    for rows in args.rows:
+        embeddings = random_matrix(rows, args.dim, rng)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        batch = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+
+        baseline = float("nan")
+        if rows <= args.skip_sklearn_above:
+            baseline = time_per_query(lambda q: sklearn_search(embeddings, q, args.k), queries, args.repeat)
+
+        engine = CosineSearchEngine(embeddings)
+        del embeddings
+        single = time_per_query(lambda q: engine.search(q, args.k), queries, args.repeat)
+        batched = time_per_query(lambda b: engine.search_batch(b, args.k), [batch], args.repeat) / args.batch
+
+        half_engine = CosineSearchEngine(engine.matrix, dtype="float16")
+        del engine
+        half = time_per_query(lambda q: half_engine.search(q, args.k), queries, args.repeat)
+        del half_engine
+
+        print(f"{rows:>10} {baseline * 1e3:>14.2f} {single * 1e3:>10.2f} {half * 1e3:>10.2f} {batched * 1e3:>16.3f}")
+
+if __name__ == "__main__":
+    main()
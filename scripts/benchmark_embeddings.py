@@ -0,0 +1,122 @@
+import sys
+import os
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.services.columnar_catalog import ColumnarCatalog
+from app.services.data_generations import DataGenerations
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.embedding_providers import TfidfSvdEmbeddings, create_embeddings, read_embeddings_model, EMBEDDING_PROVIDERS
+from app.services.fake_embeddings import HashingEmbeddings
+
+# Latency and quality of the embedding providers on the catalog in DATA_DIR:
+# - fit and corpus encoding time, and single-query embed latency (p50/p99);
+# - self hit@k: a window of 5-30 words of a book's raw description is the query, a hit when
+#   that book is among the k nearest (what a user pasting a blurb expects);
+# - agreement@k with the OpenAI embeddings: overlap of each sampled book's k nearest neighbours
+#   (itself excluded) under the provider and under text-embedding-3-large. It needs an OpenAI
+#   embeddings.npy (--reference, default DATA_DIR's when it was built with OpenAI) but no API
+#   calls. "openai" itself is only timed with OPENAI_API_KEY and network access.
+
+def load_catalog(data_dir):
+    catalog_dir = os.path.join(data_dir, "catalog")
+    if ColumnarCatalog.exists(catalog_dir):
+        return ColumnarCatalog(catalog_dir).to_dataframe(['description', 'processed_description'])
+    return pd.read_pickle(os.path.join(data_dir, "books_df.pkl"))
+
+def sample_queries(descriptions, count, rng):
+    books = rng.sample(range(len(descriptions)), min(count, len(descriptions)))
+    queries = []
+    for book in books:
+        words = descriptions[book].split()
+        length = rng.randint(5, 30)
+        start = rng.randint(0, max(0, len(words) - length))
+        queries.append(' '.join(words[start:start + length]) or "book")
+    return np.array(books), queries
+
+def encode(embeddings, texts, batch=256):
+    if hasattr(embeddings, "embed_matrix"):
+        return embeddings.embed_matrix(texts)
+    return np.concatenate([np.asarray(embeddings.embed_documents(texts[i:i + batch]), dtype=np.float32)
+                           for i in range(0, len(texts), batch)])
+
+def neighbours(matrix, rows, k):
+    """k nearest books of each of `rows`, the book itself excluded."""
+    positions, _ = CosineSearchEngine(matrix).search_batch(matrix[rows], k + 1)
+    return [[p for p in found if p != row][:k] for row, found in zip(rows, positions)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding providers")
+    parser.add_argument("--providers", default="tfidf_svd,hashing", help=f"Comma-separated, out of {', '.join(EMBEDDING_PROVIDERS)}")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM, help="Dimension of the local providers")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--reference", help="embeddings.npy built with OpenAI, row for row with the catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data_dir = DataGenerations(settings.DATA_DIR).current_dir()
+    df = load_catalog(data_dir)
+    descriptions = df['description'].fillna('').tolist()
+    processed = df['processed_description'].fillna('').tolist()
+    rng = random.Random(args.seed)
+    query_books, queries = sample_queries(descriptions, args.queries, rng)
+
+    reference = args.reference
+    stored_path = os.path.join(data_dir, "embeddings.npy")
+    if reference is None and os.path.exists(stored_path) and read_embeddings_model(data_dir) in (None, "text-embedding-3-large"):
+        reference = stored_path
+    reference_neighbours = None
+    if reference:
+        reference_matrix = np.load(reference, mmap_mode='r')
+        if len(reference_matrix) != len(df):
+            raise ValueError(f"{reference} has {len(reference_matrix)} rows for {len(df)} books")
+        reference_neighbours = neighbours(reference_matrix, query_books, args.k)
+
+    print(f"{len(df)} books, {len(queries)} queries, k={args.k}, reference: {reference or 'none'}")
+    print(f"{'provider':>10} {'dim':>5} {'fit s':>7} {'docs/s':>9} {'query p50 ms':>13} {'query p99 ms':>13} {'hit@k':>7} {'agree@k':>8}")
+    for provider in args.providers.split(","):
+        fit_seconds = 0.0
+        if provider == "tfidf_svd":
+            embeddings = TfidfSvdEmbeddings(dim=args.dim)
+            start = time.perf_counter()
+            embeddings.fit(processed)
+            fit_seconds = time.perf_counter() - start
+        elif provider == "hashing":
+            embeddings = HashingEmbeddings(dim=args.dim)
+        elif not (reference and settings.OPENAI_API_KEY):
+            print(f"{provider:>10}  skipped: needs OPENAI_API_KEY and an OpenAI reference")
+            continue
+        else:
+            embeddings = create_embeddings(provider)
+
+        if provider == "openai":
+            # Embedding the corpus again would be thousands of paid calls; the reference is that corpus
+            matrix, docs_per_second = np.asarray(reference_matrix, dtype=np.float32), float('nan')
+        else:
+            start = time.perf_counter()
+            matrix = encode(embeddings, processed)
+            docs_per_second = len(processed) / (time.perf_counter() - start)
+
+        latencies, vectors = [], []
+        for query in queries:
+            start = time.perf_counter()
+            vectors.append(embeddings.embed_query(query))
+            latencies.append(time.perf_counter() - start)
+        found, _ = CosineSearchEngine(matrix).search_batch(np.array(vectors, dtype=np.float32), args.k)
+        hit_rate = np.mean([book in row for book, row in zip(query_books, found)])
+        agreement = float('nan')
+        if reference_neighbours is not None:
+            agreement = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(neighbours(matrix, query_books, args.k), reference_neighbours)])
+        latencies = np.array(latencies) * 1000
+        print(f"{provider:>10} {matrix.shape[1]:>5} {fit_seconds:>7.2f} {docs_per_second:>9.0f} {np.percentile(latencies, 50):>13.3f} "
+              f"{np.percentile(latencies, 99):>13.3f} {hit_rate:>7.3f} {agreement:>8.3f}")
+
+if __name__ == "__main__":
+    main()
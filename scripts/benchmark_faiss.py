@@ -0,0 +1,88 @@
+import sys
+import os
+import time
+import argparse
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.faiss_engine import FaissSearchEngine, build_index, index_spec, normalized, INDEX_TYPES
+
+# recall@k against exact cosine search, queries/sec and index memory for each FAISS index type,
+# on synthetic clustered vectors (real embeddings are clustered; uniform noise is a worst case for ANN).
+# 1M x 3072 float32 is ~12 GB per copy, so the default --dim is reduced; use --dim 3072 on a large machine.
+
+def synthetic_vectors(rows, dim, rng, clusters=1000, spread=2.0, chunk=50000):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, chunk):
+        stop = min(start + chunk, rows)
+        vectors[start:stop] = centers[rng.integers(0, clusters, stop - start)]
+        vectors[start:stop] += spread * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return normalized(vectors)
+
+def exact_neighbors(vectors, queries, k):
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    return index.search(queries, k)[1]
+
+def measure(engine, queries, truth, k, batch):
+    start = time.perf_counter()
+    found = []
+    for begin in range(0, len(queries), batch):
+        found.extend(positions for positions, _ in engine.search_batch(queries[begin:begin + batch], k))
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return recall, len(queries) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1, help="Queries per search call (1 = one request at a time)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=2.0, help="Within-cluster noise; higher makes neighbors harder to find")
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = FAISS default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(42)
+    print(f"dim={args.dim} k={args.k} queries={args.queries} batch={args.batch} threads={faiss.omp_get_max_threads()}")
+    print(f"{'rows':>9} {'index':>22} {'param':>12} {'build s':>8} {'MB':>8} {'recall@k':>9} {'QPS':>9}")
+    for rows in args.rows:
+        # Queries come from the same distribution as the corpus but are not indexed themselves
+        vectors = synthetic_vectors(rows + args.queries, args.dim, rng, spread=args.spread)
+        queries, vectors = vectors[rows:], vectors[:rows]
+        truth = exact_neighbors(vectors, queries, args.k)
+
+        for index_type in args.types:
+            start = time.perf_counter()
+            index = build_index(vectors, index_type, hnsw_m=args.hnsw_m, ef_construction=args.ef_construction)
+            build_time = time.perf_counter() - start
+            memory = faiss.serialize_index(index).nbytes / 2**20
+            spec = index_spec(index_type, rows, args.dim, hnsw_m=args.hnsw_m)
+
+            if index_type in ("ivf_flat", "ivf_pq"):
+                sweep = [("nprobe", nprobe, dict(nprobe=nprobe)) for nprobe in args.nprobe]
+            elif index_type == "hnsw":
+                sweep = [("efSearch", ef, dict(ef_search=ef)) for ef in args.ef_search]
+            else:
+                sweep = [("-", "", {})]
+            for name, value, params in sweep:
+                engine = FaissSearchEngine(index, np.arange(rows), **params)
+                recall, qps = measure(engine, queries, truth, args.k, args.batch)
+                param = f"{name}={value}" if value != "" else name
+                print(f"{rows:>9} {spec:>22} {param:>12} {build_time:>8.1f} {memory:>8.1f} {recall:>9.3f} {qps:>9.0f}")
+            del index
+        del vectors
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.main import app
+from app.core.config import settings
+from app.services.columnar_catalog import ColumnarCatalog
+from app.services.data_generations import DataGenerations
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.fake_embeddings import HashingEmbeddings
+from app.services.recommendation_service import RecommendationService
+from app.services.service_provider import service_provider
+from app.services.text_cleaning import create_query_normalizer
+
+# Offline load test: boots the FastAPI app in-process (httpx ASGI transport, no sockets) on a copy
+# of the catalog embedded with HashingEmbeddings, so no OpenAI call is made. Requests are replayed
+# from a JSONL log ({"endpoint": "faiss"|"cosine", "description": ..., "num_recommendations": ...}
+# per line) or generated from the catalog, either at a fixed arrival rate (--rate, latency counted
+# from the scheduled send time, so a slow server cannot hide its queueing) or with a fixed number
+# of requests in flight (--concurrency). The JSON report can be compared across commits (--baseline).
+
+ENDPOINTS = ("faiss", "cosine")
+PERCENTILES = (50, 90, 95, 99)
+
+
+class CatalogBookService:
+    """The one BookService method RecommendationService needs, over a prepared catalog."""
+
+    def __init__(self, catalog_dir):
+        self.catalog_dir = catalog_dir
+
+    def load_catalog(self, catalog_dir=None):
+        return ColumnarCatalog(catalog_dir or self.catalog_dir, mmap=settings.USE_MMAP)
+
+
+class OfflineProcessingChain:
+    def __init__(self, embeddings, cache_size):
+        self.embeddings = CachedEmbeddings(embeddings, EmbeddingCache(max_size=cache_size)) if cache_size else embeddings
+
+
+def simple_normalize(text):
+    return ' '.join(token for token in text.lower().split() if token.isalpha())
+
+
+def source_catalog(data_dir):
+    """The project's catalog when there is one, otherwise a small synthetic one."""
+    catalog_dir = os.path.join(DataGenerations(data_dir).current_dir(), "catalog")
+    if ColumnarCatalog.exists(catalog_dir):
+        return ColumnarCatalog(catalog_dir).to_dataframe()
+    pickle_path = os.path.join(data_dir, "books_df.pkl")
+    if os.path.exists(pickle_path):
+        return pd.read_pickle(pickle_path)
+    rng = random.Random(0)
+    words = ["space", "dragon", "murder", "python", "history", "love", "war", "magic", "data", "ocean", "empire", "detective"]
+    rows = []
+    for i in range(2000):
+        description = ' '.join(rng.choice(words) for _ in range(40))
+        rows.append({'id': f"synthetic-{i}", 'title': f"Book {i}", 'authors': [f"Author {i % 50}"],
+                     'description': description, 'processed_description': description})
+    return pd.DataFrame(rows)
+
+
+def prepare_data(data_dir, df, books, embedder):
+    if books and books != len(df):
+        # Repeat the catalog (with distinct ids) to reach the requested size
+        copies = [df.assign(id=df['id'] + f"-{i}") for i in range(-(-books // len(df)))]
+        df = pd.concat(copies, ignore_index=True).iloc[:books]
+    ColumnarCatalog.write(df, os.path.join(data_dir, "catalog"))
+    np.save(os.path.join(data_dir, "embeddings.npy"), embedder.embed_matrix(df['processed_description'].tolist()))
+    return df
+
+
+def load_request_log(path):
+    requests = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                requests.append({
+                    "endpoint": entry.get("endpoint", "faiss"),
+                    "description": entry["description"],
+                    "num_recommendations": entry.get("num_recommendations", 5),
+                })
+    return requests
+
+
+def synthetic_requests(df, count, mix, repeat, k, seed):
+    """Queries cut from catalog descriptions; a `repeat` fraction re-sends an earlier query (cache hits)."""
+    rng = random.Random(seed)
+    descriptions = [text for text in df['description'].tolist() if text]
+    endpoints, weights = zip(*mix.items())
+    requests = []
+    for _ in range(count):
+        if requests and rng.random() < repeat:
+            requests.append(dict(rng.choice(requests)))
+            continue
+        words = rng.choice(descriptions).split()
+        length = rng.randint(3, 30)
+        start = rng.randint(0, max(0, len(words) - length))
+        requests.append({
+            "endpoint": rng.choices(endpoints, weights)[0],
+            "description": ' '.join(words[start:start + length]) or "book",
+            "num_recommendations": k,
+        })
+    return requests
+
+
+async def send(client, request):
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"{settings.V1_STR}/recommend/{request['endpoint']}", json={
+            "description": request["description"], "num_recommendations": request["num_recommendations"]})
+        status = response.status_code
+    except Exception:
+        status = None
+    return request["endpoint"], status, time.perf_counter() - start
+
+
+async def run_closed_loop(client, requests, concurrency):
+    """Keep `concurrency` requests in flight until all are sent."""
+    results = []
+    pending = iter(requests)
+
+    async def worker():
+        for request in pending:
+            results.append(await send(client, request))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def run_open_loop(client, requests, rate):
+    """Send request i at start + i / rate, whatever the server's speed."""
+    start = time.perf_counter()
+
+    async def scheduled(i, request):
+        due = start + i / rate
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        endpoint, status, _ = await send(client, request)
+        return endpoint, status, time.perf_counter() - due
+
+    return await asyncio.gather(*(scheduled(i, request) for i, request in enumerate(requests)))
+
+
+def summarize(results, elapsed):
+    latencies = np.array([latency for _, _, latency in results]) * 1000
+    statuses = [status for _, status, _ in results]
+    errors = sum(status != 200 for status in statuses)
+    status_codes = {}
+    for status in statuses:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    ok = latencies[[status == 200 for status in statuses]] if len(results) else latencies
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "status_codes": status_codes,
+        "qps": (len(results) - errors) / elapsed if elapsed else 0.0,
+        # Latencies of successful requests; fast failures (e.g. 503s) would flatter them
+        "latency_ms": {
+            "mean": float(ok.mean()) if len(ok) else None,
+            **{f"p{p}": float(np.percentile(ok, p)) if len(ok) else None for p in PERCENTILES},
+            "max": float(ok.max()) if len(ok) else None,
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline):
+    lines = [f"{'scope':>8} {'metric':>8} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for scope in ["overall", *sorted(report["endpoints"])]:
+        current = report["overall"] if scope == "overall" else report["endpoints"][scope]
+        previous = baseline["overall"] if scope == "overall" else baseline.get("endpoints", {}).get(scope)
+        if previous is None:
+            continue
+        for metric, get in (("qps", lambda r: r["qps"]), ("p50 ms", lambda r: r["latency_ms"]["p50"]),
+                            ("p99 ms", lambda r: r["latency_ms"]["p99"]), ("errors", lambda r: r["error_rate"])):
+            old, new = get(previous), get(current)
+            change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "-"
+            lines.append(f"{scope:>8} {metric:>8} {old if old is not None else float('nan'):>10.3f} "
+                         f"{new if new is not None else float('nan'):>10.3f} {change:>8}")
+    return "\n".join(lines)
+
+
+async def run(args, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        # Warm up both paths (first-call allocations, lazy imports) outside the measurement
+        for endpoint in args.mix:
+            await send(client, {"endpoint": endpoint, "description": "warm up", "num_recommendations": 1})
+        start = time.perf_counter()
+        if args.rate:
+            results = await run_open_loop(client, requests, args.rate)
+        else:
+            results = await run_closed_loop(client, requests, args.concurrency)
+        return results, time.perf_counter() - start
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {endpoint!r}, expected one of {ENDPOINTS}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the recommendation API")
+    parser.add_argument("--log", help="JSONL request log to replay (default: synthetic requests)")
+    parser.add_argument("--requests", type=int, default=2000, help="Synthetic requests to send, or log entries to replay (0 = all)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("faiss=1,cosine=1"), help="Synthetic endpoint weights, e.g. faiss=3,cosine=1")
+    parser.add_argument("--repeat", type=float, default=0.2, help="Fraction of synthetic requests repeating an earlier one")
+    parser.add_argument("--k", type=int, default=5)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, help="Open loop: requests per second")
+    mode.add_argument("--concurrency", type=int, default=16, help="Closed loop: requests in flight")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Injected embedding API latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Extra random latency, up to this much")
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--books", type=int, default=0, help="Catalog size (0 = the project's catalog as is)")
+    parser.add_argument("--cache-size", type=int, default=settings.EMBEDDING_CACHE_SIZE, help="Query embedding cache entries (0 = no cache)")
+    parser.add_argument("--normalizer", choices=["default", "simple"], default="default",
+                        help="FAISS query normalizer: the configured TextCleaner (needs NLTK data) or lowercase alphabetic tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against (printed to stderr)")
+    args = parser.parse_args()
+
+    source = source_catalog(settings.DATA_DIR)
+    embedder = HashingEmbeddings(dim=args.dim, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed)
+    with tempfile.TemporaryDirectory() as data_dir:
+        settings.DATA_DIR = data_dir
+        df = prepare_data(data_dir, source, args.books, embedder)
+        normalizer = create_query_normalizer() if args.normalizer == "default" else simple_normalize
+        service = RecommendationService(
+            book_service=CatalogBookService(os.path.join(data_dir, "catalog")),
+            processing_chain=OfflineProcessingChain(embedder, args.cache_size),
+            query_normalizer=normalizer
+        )
+        # Served through the real dependency, exactly as after startup
+        service_provider.swap(service)
+
+        if args.log:
+            requests = load_request_log(args.log)
+            requests = requests[:args.requests] if args.requests else requests
+        else:
+            requests = synthetic_requests(df, args.requests, args.mix, args.repeat, args.k, args.seed)
+        results, elapsed = asyncio.run(run(args, requests))
+
+    report = {
+        "schema": 1,
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "source": args.log or "synthetic", "requests": len(requests),
+            "mode": "open" if args.rate else "closed", "rate": args.rate, "concurrency": None if args.rate else args.concurrency,
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "dim": args.dim, "books": len(df),
+            "cache_size": args.cache_size, "repeat": None if args.log else args.repeat, "k": args.k,
+            "index_type": settings.FAISS_INDEX_TYPE, "use_mmap": settings.USE_MMAP,
+            "compute_workers": settings.COMPUTE_MAX_WORKERS, "cpus": os.cpu_count(),
+        },
+        "elapsed_s": elapsed,
+        "overall": summarize(results, elapsed),
+        "endpoints": {endpoint: summarize([r for r in results if r[0] == endpoint], elapsed)
+                      for endpoint in sorted({r[0] for r in results})},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import sys
+import os
+import time
+import logging
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# app.core.logger turns off record fields we never write; the old setup ran with the defaults
+LOGGING_DEFAULTS = {name: getattr(logging, name) for name in ("_srcfile", "logThreads", "logProcesses", "logMultiprocessing")}
+
+from app.core.logger import LogPipeline, request_id
+
+LOGGING_OPTIMIZED = {name: getattr(logging, name) for name in LOGGING_DEFAULTS}
+
+# Logging cost paid by the request thread per request (two INFO lines from the endpoint plus
+# one access line), with the previous setup (synchronous FileHandler, f-string messages) and
+# with the queue-backed JSON pipeline, at INFO, with INFO disabled, and with sampling.
+# --stall-every/--stall-ms simulate the disk occasionally blocking a write (writeback, a busy
+# volume); the old setup pays it on the request thread, the pipeline on its writer thread.
+
+DESCRIPTION = "A young wizard discovers a hidden world of magic and must face an ancient evil " * 2
+
+def old_request(logger, i):
+    logger.info(f"Received FAISS recommendation request for description: {DESCRIPTION[:50]}...")
+    logger.info(f"Successfully generated {5} FAISS recommendations")
+    logger.info(f"POST /api/v1/recommend/faiss 200 {1.234:.3f}ms")
+
+def new_request(logger, i):
+    logger.info("Received FAISS recommendation request for description: %.50s...", DESCRIPTION)
+    logger.info("Successfully generated %d FAISS recommendations", 5)
+    logger.info("%s %s %s", "POST", "/api/v1/recommend/faiss", 200, extra={
+        "method": "POST", "route": "/recommend/faiss", "path": "/api/v1/recommend/faiss", "status": 200,
+        "duration_ms": 1.234, "stages_ms": {"normalize": 0.1, "embed": 1.0, "search": 0.1, "build": 0.03}})
+
+class StallingStream:
+    """File stream wrapper whose every n-th write blocks for `stall` seconds."""
+
+    def __init__(self, stream, every, stall):
+        self.stream, self.every, self.stall, self.writes = stream, every, stall, 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.every and self.writes % self.every == 0:
+            time.sleep(self.stall)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def add_stalls(handlers, every, stall_ms):
+    for handler in handlers:
+        handler.stream = StallingStream(handler.stream, every, stall_ms / 1000)
+
+def old_logger(log_dir, level, stall_every=0, stall_ms=0):
+    vars(logging).update(LOGGING_DEFAULTS)
+    logger = logging.getLogger(f"benchmark_old_{level}_{stall_every}")
+    handler = logging.FileHandler(os.path.join(log_dir, f"old_{level}_{stall_every}.log"))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    add_stalls([handler], stall_every, stall_ms)
+    return logger, None
+
+def new_logger(log_dir, level, sample_rate=1.0, stall_every=0, stall_ms=0):
+    vars(logging).update(LOGGING_OPTIMIZED)
+    pipeline = LogPipeline(log_dir=log_dir, sample_rate=sample_rate, queue_size=100_000)
+    logger = pipeline.add_logger(f"benchmark_new_{level}_{sample_rate}_{stall_every}", f"new_{level}_{sample_rate}_{stall_every}.log", level)
+    add_stalls(pipeline.file_handlers, stall_every, stall_ms)
+    pipeline.start()
+    return logger, pipeline
+
+def measure(logger, request, requests):
+    timings = np.empty(requests)
+    for i in range(requests):
+        token = request_id.set(f"{i:032x}")
+        start = time.perf_counter()
+        request(logger, i)
+        timings[i] = time.perf_counter() - start
+        request_id.reset(token)
+    return timings * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request logging cost")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--stall-every", type=int, default=1000, help="Writes between simulated disk stalls (0 = none)")
+    parser.add_argument("--stall-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"{'setup':>34} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'p99.9 us':>9} {'drain s':>8}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        cases = [
+            ("FileHandler, f-strings, INFO", lambda: old_logger(log_dir, logging.INFO), old_request),
+            ("queue + JSON, INFO", lambda: new_logger(log_dir, logging.INFO), new_request),
+            ("queue + JSON, 10% sampled", lambda: new_logger(log_dir, logging.INFO, 0.1), new_request),
+            ("FileHandler, f-strings, WARNING", lambda: old_logger(log_dir, logging.WARNING), old_request),
+            ("queue + JSON, WARNING", lambda: new_logger(log_dir, logging.WARNING), new_request),
+        ]
+        if args.stall_every:
+            stall = dict(stall_every=args.stall_every, stall_ms=args.stall_ms)
+            cases += [
+                ("FileHandler, INFO, disk stalls", lambda: old_logger(log_dir, logging.INFO, **stall), old_request),
+                ("queue + JSON, INFO, disk stalls", lambda: new_logger(log_dir, logging.INFO, **stall), new_request),
+            ]
+        for name, make, request in cases:
+            logger, pipeline = make()
+            timings = measure(logger, request, args.requests)
+            # Time for the background writer to catch up after the last request
+            start = time.perf_counter()
+            if pipeline is not None:
+                pipeline.stop()
+            drain = time.perf_counter() - start
+            print(f"{name:>34} {timings.mean():>8.1f} {np.percentile(timings, 50):>8.1f} "
+                  f"{np.percentile(timings, 99):>8.1f} {np.percentile(timings, 99.9):>9.1f} {drain:>8.2f}")
+
+if __name__ == "__main__":
+    main()
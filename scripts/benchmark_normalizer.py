@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.text_cleaning import TextCleaner, TOKENIZERS
+from app.core.config import settings
+
+# p50/p99 latency of query normalization alone, per tokenizer backend.
+# Queries are sampled from the catalog descriptions (truncated to query-like lengths).
+
+def load_queries(num_queries, max_words, seed):
+    descriptions = pd.read_pickle(os.path.join(settings.DATA_DIR, "books_df.pkl"))["description"].tolist()
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.integers(0, len(descriptions), num_queries):
+        words = descriptions[i].split()
+        queries.append(' '.join(words[:rng.integers(3, max_words + 1)]))
+    return queries
+
+def measure(func, queries):
+    timings = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        func(query)
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query normalization latency")
+    parser.add_argument("--backends", nargs="+", default=sorted(TOKENIZERS), choices=sorted(TOKENIZERS))
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--max-words", type=int, default=40)
+    parser.add_argument("--tokenizer-only", action="store_true", help="Time tokenization alone (no stopwords or lemmatization)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries, args.max_words, args.seed)
+    print(f"{len(queries)} queries of up to {args.max_words} words")
+    print(f"{'backend':>8} {'p50 (us)':>10} {'p99 (us)':>10} {'mean (us)':>10}")
+    for backend in args.backends:
+        if args.tokenizer_only:
+            tokenize = TOKENIZERS[backend]
+            func = lambda query: tokenize(query.lower())
+        else:
+            func = TextCleaner(tokenizer=backend, lemma_cache_size=settings.QUERY_LEMMA_CACHE_SIZE).warm_up()
+        # One untimed pass so every backend is measured with warm caches
+        measure(func, queries[:200])
+        timings = measure(func, queries)
+        print(f"{backend:>8} {np.percentile(timings, 50):>10.1f} {np.percentile(timings, 99):>10.1f} {timings.mean():>10.1f}")
+
+if __name__ == "__main__":
+    main()
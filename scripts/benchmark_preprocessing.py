@@ -0,0 +1,44 @@
+import sys
+import os
+import time
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.book_service import BookService
+from app.core.config import settings
+
+# Books/sec of catalog text preprocessing (tokenize, stopwords, lemmatize) at different worker counts.
+# Uses data/books.json when present, otherwise rebuilds raw volumes from the descriptions in books_df.pkl.
+
+def load_items(book_service, scale):
+    if os.path.exists(book_service.books_file):
+        items = list(book_service.iter_books())
+    else:
+        df = pd.read_pickle(os.path.join(settings.DATA_DIR, "books_df.pkl"))
+        items = [
+            {'id': row['id'], 'volumeInfo': {'title': row['title'], 'authors': list(row['authors']), 'description': row['description']}}
+            for row in df.to_dict('records')
+        ]
+    return items * scale
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalog text preprocessing")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 4, os.cpu_count()}))
+    parser.add_argument("--chunksize", type=int, default=settings.PREPROCESSING_CHUNK_SIZE)
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the catalog this many times")
+    args = parser.parse_args()
+
+    book_service = BookService()
+    items = load_items(book_service, args.scale)
+    print(f"{len(items)} books, chunksize={args.chunksize}")
+    print(f"{'workers':>8} {'seconds':>10} {'books/sec':>12}")
+    for workers in args.workers:
+        start = time.perf_counter()
+        cleaned = sum(1 for _ in book_service.iter_cleaned_books(items, workers=workers, chunksize=args.chunksize))
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8} {elapsed:>10.2f} {cleaned / elapsed:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.faiss_engine import FaissSearchEngine, build_index, normalized
+from app.services.sharded_engine import ShardedSearchEngine, shard_ranges
+
+# Single-query latency and batch throughput of sharded search for each shard count and thread
+# pool size, on the cosine matrix and on flat FAISS indexes (one per shard). FAISS's own OpenMP
+# threads are pinned to --omp-threads so the pool is the only source of parallelism. Speedups
+# are bounded by the cores of the host (os.cpu_count() is printed) and by memory bandwidth.
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharded parallel search")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20, help="Single queries timed one after the other")
+    parser.add_argument("--batch", type=int, default=256, help="Queries per batched search")
+    parser.add_argument("--omp-threads", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.omp_threads)
+    rng = np.random.default_rng(0)
+    vectors = normalized(rng.standard_normal((args.rows, args.dim), dtype=np.float32))
+    queries = normalized(rng.standard_normal((max(args.queries, args.batch), args.dim), dtype=np.float32))
+    cosine = CosineSearchEngine(vectors, normalized=True)
+    print(f"{args.rows} x {args.dim}, k={args.k}, batch={args.batch}, cpus={os.cpu_count()}, faiss omp threads={args.omp_threads}")
+    print(f"{'engine':>7} {'shards':>7} {'threads':>8} {'ms/query':>9} {'speedup':>8} {'batch qps':>10} {'speedup':>8}")
+    for name in ("cosine", "faiss"):
+        baseline = None
+        for num_shards in args.shards:
+            ranges = shard_ranges(args.rows, num_shards)
+            if name == "cosine":
+                engines = [(start, cosine.shard(start, stop)) for start, stop in ranges]
+            else:
+                engines = [(start, FaissSearchEngine(build_index(vectors[start:stop]), np.arange(start, stop))) for start, stop in ranges]
+            for threads in args.threads:
+                if num_shards == 1 and threads > 1:
+                    continue
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    engine = ShardedSearchEngine(engines, executor=executor)
+                    single = timed(lambda: [engine.search(query, args.k) for query in queries[:args.queries]], args.repeat) / args.queries
+                    batch = timed(lambda: engine.search_batch(queries[:args.batch], args.k), args.repeat)
+                if baseline is None:
+                    baseline = (single, batch)
+                print(f"{name:>7} {num_shards:>7} {threads:>8} {single * 1000:>9.2f} {baseline[0] / single:>7.2f}x "
+                      f"{args.batch / batch:>10.0f} {baseline[1] / batch:>7.2f}x")
+            del engines
+
+if __name__ == "__main__":
+    main()
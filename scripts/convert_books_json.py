@@ -0,0 +1,32 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.raw_book_store import RawBookStore
+from app.core.config import settings
+
+# One-shot migration of a legacy data/books.json into the sharded raw book store (data/raw_books).
+# BookService also does this on first use; this script makes it explicit and reports the result.
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert books.json into append-only JSONL shards")
+    parser.add_argument("--source", default=os.path.join(settings.DATA_DIR, "books.json"))
+    parser.add_argument("--target", default=os.path.join(settings.DATA_DIR, "raw_books"))
+    parser.add_argument("--shard-size", type=int, default=10_000)
+    parser.add_argument("--remove-source", action="store_true", help="Delete books.json once converted")
+    args = parser.parse_args()
+
+    store = RawBookStore(args.target, shard_size=args.shard_size)
+    if store.exists():
+        sys.exit(f"{args.target} already holds {len(store)} volumes; not converting again")
+    count = store.import_books_json(args.source)
+    size = sum(os.path.getsize(os.path.join(args.target, shard["name"])) for shard in store.shards())
+    print(f"Converted {count} volumes into {len(store.shards())} shards "
+          f"({os.path.getsize(args.source) / 2**20:.1f} MB -> {size / 2**20:.1f} MB)")
+    if args.remove_source:
+        os.remove(args.source)
+
+if __name__ == "__main__":
+    main()
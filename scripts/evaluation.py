@@ -1,8 +1,10 @@
 import sys
 import os
+import json
+import time
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.model_selection import train_test_split
 from tqdm import tqdm
 
@@ -11,8 +13,18 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.services.recommendation_service import RecommendationService
 from app.models.book import BookRecommendationRequest
 from app.services.book_service import BookService
+from app.services.columnar_catalog import ColumnarCatalog
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.faiss_engine import FaissIndexFile, FaissSearchEngine, build_index, COMPRESSED_INDEX_TYPES, INDEX_TYPES
+from app.services.incremental_indexer import live_positions
+from app.services.data_generations import DataGenerations
 from app.core.config import settings
 
+# The default (online) evaluation embeds every test description through the API. --offline
+# instead uses each test book's stored vector in embeddings.npy as its query, searches all
+# of them in batches per backend and computes the metrics on arrays: no network access, and
+# k and FAISS index parameters can be swept in one run. Run with DATA_DIR pointing at the data.
+
 def calculate_diversity(recommendations):
     """Calculate diversity of recommendations based on unique titles."""
     return len(set(rec.title for rec in recommendations)) / len(recommendations)
@@ -109,7 +121,136 @@ def calculate_mrr(predicted_titles, true_titles):
     return 0
     
 
-def main():
+def load_offline_data(data_dir):
+    """Stored embeddings, live-row positions and the title of each live book, without NLTK or the network."""
+    data_dir = DataGenerations(data_dir).current_dir()
+    embeddings = np.load(os.path.join(data_dir, "embeddings.npy"), mmap_mode='r')
+    catalog_dir = os.path.join(data_dir, "catalog")
+    if ColumnarCatalog.exists(catalog_dir):
+        titles = ColumnarCatalog(catalog_dir).column('title').tolist()
+    else:
+        titles = pd.read_pickle(os.path.join(data_dir, "books_df.pkl"))['title'].tolist()
+    if len(titles) != len(embeddings):
+        raise ValueError(f"Catalog has {len(titles)} rows but embeddings.npy has {len(embeddings)}")
+    positions = live_positions(len(embeddings), data_dir)
+    titles = np.asarray(titles, dtype=object)[positions >= 0]
+    return embeddings, positions, titles
+
+def search_all(engine, queries, k, batch_size):
+    """(m, k) result positions and scores, -1 / -inf where a search returned fewer than k, and queries/sec."""
+    found = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    start = time.perf_counter()
+    for begin in range(0, len(queries), batch_size):
+        batch = np.asarray(queries[begin:begin + batch_size], dtype=np.float32)
+        if isinstance(engine, CosineSearchEngine):
+            positions, batch_scores = engine.search_batch(batch, k)
+            found[begin:begin + len(positions), :positions.shape[1]] = positions
+            scores[begin:begin + len(positions), :positions.shape[1]] = batch_scores
+        else:
+            for i, (positions, row_scores) in enumerate(engine.search_batch(batch, k)):
+                found[begin + i, :len(positions)] = positions
+                scores[begin + i, :len(positions)] = row_scores
+    return found, scores, len(queries) / (time.perf_counter() - start)
+
+def offline_metrics(found, title_codes, actual_codes, scores=None, exact_scores=None):
+    """Hit rate, diversity and serendipity as in evaluate_recommendations_first, over (m, k) result arrays.
+
+    With the scores of these and of the exact search's results, also recall@k: the share of
+    results scoring at least the exact k-th score. Counting by score rather than by position
+    keeps books with identical descriptions (tied scores) from reading as misses.
+    """
+    returned = found >= 0
+    codes = np.where(returned, title_codes[np.maximum(found, 0)], -1)
+    hits = (codes == actual_codes[:, None]).any(axis=1)
+    # Distinct titles per row: count the first element of each run in the sorted codes
+    ordered = np.sort(codes, axis=1)
+    first = np.ones_like(ordered, dtype=bool)
+    first[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    distinct = (first & (ordered >= 0)).sum(axis=1)
+    count = returned.sum(axis=1)
+    result = {
+        'hit_rate': hits.mean(),
+        'diversity': np.divide(distinct, count, out=np.zeros(len(count)), where=count > 0).mean(),
+        'serendipity': np.divide(distinct - hits, distinct, out=np.zeros(len(count)), where=distinct > 0).mean(),
+    }
+    if exact_scores is not None:
+        # Small tolerance: FAISS and numpy round inner products differently
+        threshold = exact_scores[:, -1:] - 1e-4
+        result['recall_vs_exact'] = ((scores >= threshold) & returned).sum(axis=1).mean() / found.shape[1]
+    return result
+
+def faiss_engines(embeddings, positions, index_types, nprobes, ef_searches, rerank=None):
+    """(label, engine) for every index type and search parameter value to evaluate.
+
+    Compressed indexes are re-ranked on `rerank` (the cosine engine) as the service does.
+    """
+    stored = FaissIndexFile.from_settings(DataGenerations(settings.DATA_DIR).current_dir())
+    for index_type in index_types:
+        if index_type == settings.FAISS_INDEX_TYPE and settings.SEARCH_SHARDS == 1:
+            # The index the service serves (built and saved if missing or stale)
+            index = stored.load_or_build(embeddings)
+        else:
+            index = build_index(embeddings, index_type, nlist=settings.FAISS_NLIST, hnsw_m=settings.FAISS_HNSW_M,
+                                ef_construction=settings.FAISS_EF_CONSTRUCTION, pq_m=settings.FAISS_PQ_M, pq_nbits=settings.FAISS_PQ_NBITS,
+                                truncate_dim=settings.FAISS_TRUNCATE_DIM)
+        name, params = f"faiss {index_type}", {}
+        if settings.FAISS_TRUNCATE_DIM:
+            name += f" dim={settings.FAISS_TRUNCATE_DIM}"
+        compressed = index_type in COMPRESSED_INDEX_TYPES or settings.FAISS_TRUNCATE_DIM
+        if compressed and rerank is not None and settings.FAISS_RERANK_CANDIDATES:
+            name += f" rerank={settings.FAISS_RERANK_CANDIDATES}"
+            params = dict(rerank=rerank, rerank_candidates=settings.FAISS_RERANK_CANDIDATES)
+        if index_type.startswith("ivf"):
+            for nprobe in nprobes:
+                yield f"{name} nprobe={nprobe}", FaissSearchEngine(index, positions, nprobe=nprobe, **params)
+        elif index_type == "hnsw":
+            for ef_search in ef_searches:
+                yield f"{name} ef_search={ef_search}", FaissSearchEngine(index, positions, ef_search=ef_search, **params)
+        else:
+            yield name, FaissSearchEngine(index, positions, **params)
+
+def evaluate_offline(embeddings, positions, titles, ks, index_types, nprobes, ef_searches, test_size=0.2, batch_size=1024):
+    """One row of metrics per (backend configuration, k) over the test split, queried with stored vectors."""
+    live_rows = np.flatnonzero(positions >= 0)
+    _, test_positions = train_test_split(np.arange(len(live_rows)), test_size=test_size, random_state=42)
+    queries = embeddings[live_rows[np.sort(test_positions)]]
+    title_codes = pd.factorize(titles)[0]
+    actual_codes = title_codes[np.sort(test_positions)]
+    # Every k is a prefix of the largest search (exactly so for exact search; approximate
+    # indexes are searched with their configured nprobe / efSearch either way)
+    max_k = max(ks)
+
+    cosine = CosineSearchEngine(embeddings, dtype=settings.COSINE_DTYPE, positions=positions)
+    exact, exact_scores, qps = search_all(cosine, queries, max_k, batch_size)
+    rows = [{'backend': 'cosine', 'k': k, 'queries': len(queries), 'qps': qps,
+             **offline_metrics(exact[:, :k], title_codes, actual_codes)} for k in ks]
+    for label, engine in faiss_engines(embeddings, positions, index_types, nprobes, ef_searches, rerank=cosine):
+        found, scores, qps = search_all(engine, queries, max_k, batch_size)
+        rows.extend({'backend': label, 'k': k, 'queries': len(queries), 'qps': qps,
+                     **offline_metrics(found[:, :k], title_codes, actual_codes, scores[:, :k], exact_scores[:, :k])} for k in ks)
+    return pd.DataFrame(rows)
+
+def parse_list(cast):
+    return lambda text: [cast(value) for value in text.split(",")]
+
+def run_offline(args):
+    embeddings, positions, titles = load_offline_data(settings.DATA_DIR)
+    start = time.perf_counter()
+    results = evaluate_offline(embeddings, positions, titles, args.k, args.index_types, args.nprobe, args.ef_search,
+                               test_size=args.test_size, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"\nOffline evaluation of {results['queries'].iloc[0]} test books out of {len(titles)} ({elapsed:.1f}s):")
+    print(f"{'backend':>44} {'k':>4} {'hit rate':>9} {'diversity':>10} {'serendip.':>10} {'recall':>8} {'qps':>10}")
+    for row in results.itertuples():
+        recall = getattr(row, 'recall_vs_exact', np.nan)
+        print(f"{row.backend:>44} {row.k:>4} {row.hit_rate:>9.3f} {row.diversity:>10.3f} {row.serendipity:>10.3f} "
+              f"{recall:>8.3f} {row.qps:>10.0f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results.replace({np.nan: None}).to_dict(orient='records'), f, indent=2)
+
+def run_online():
     book_service = BookService()
     recommendation_service = RecommendationService()
 
@@ -186,6 +327,22 @@ def main():
     print(f"Cosine MRR: {results['cosine_mrr']:.2f}")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate FAISS and cosine recommendations")
+    parser.add_argument("--offline", action="store_true", help="Query with stored embeddings instead of the embeddings API")
+    parser.add_argument("--k", type=parse_list(int), default=[5], help="Offline: comma-separated k values")
+    parser.add_argument("--index-types", type=parse_list(str), default=[settings.FAISS_INDEX_TYPE],
+                        help=f"Offline: comma-separated FAISS index types out of {', '.join(INDEX_TYPES)}")
+    parser.add_argument("--nprobe", type=parse_list(int), default=[settings.FAISS_NPROBE], help="Offline: nprobe values for IVF indexes")
+    parser.add_argument("--ef-search", type=parse_list(int), default=[settings.FAISS_EF_SEARCH], help="Offline: efSearch values for HNSW")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=1024, help="Offline: queries per batched search")
+    parser.add_argument("--output", help="Offline: also write the results as JSON")
+    args = parser.parse_args()
+    if args.offline:
+        run_offline(args)
+    else:
+        run_online()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
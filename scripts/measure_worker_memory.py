@@ -0,0 +1,87 @@
+import sys
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.cosine_engine import CosineSearchEngine, load_normalized_matrix
+from app.services.faiss_engine import FaissIndexFile, FaissSearchEngine
+
+# Load time and memory per worker when N processes (like uvicorn workers) load the same embeddings,
+# normalized cosine matrix and FAISS index, either into private heap memory or memory-mapped.
+# PSS splits shared pages between the processes mapping them, so N x PSS is the real host cost.
+
+def read_memory():
+    status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+    memory = {key: int(status[key].split()[0]) / 1024 for key in ("VmRSS", "RssAnon", "RssFile")}
+    with open("/proc/self/smaps_rollup") as f:
+        next(f)  # address range header
+        rollup = dict(line.split(":", 1) for line in f)
+    memory["Pss"] = int(rollup["Pss"].split()[0]) / 1024
+    return memory
+
+def load_engines(data_dir, mmap, index_type):
+    embeddings_path = os.path.join(data_dir, "embeddings.npy")
+    embeddings = np.load(embeddings_path, mmap_mode='r' if mmap else None)
+    positions = np.arange(len(embeddings))
+    index_file = FaissIndexFile(os.path.join(data_dir, "faiss.index"), index_type=index_type, mmap=mmap)
+    faiss_engine = FaissSearchEngine(index_file.read(), positions)
+    if mmap:
+        matrix = load_normalized_matrix(embeddings_path, os.path.join(data_dir, "embeddings_normalized_float32.npy"))
+        cosine_engine = CosineSearchEngine(matrix, positions=positions, normalized=True)
+    else:
+        cosine_engine = CosineSearchEngine(embeddings, positions=positions)
+    return embeddings, faiss_engine, cosine_engine
+
+def worker(data_dir, mmap, index_type, barrier, results):
+    start = time.perf_counter()
+    embeddings, faiss_engine, cosine_engine = load_engines(data_dir, mmap, index_type)
+    load_time = time.perf_counter() - start
+    # Serve a few queries so the pages a real worker touches are resident
+    queries = np.random.default_rng(os.getpid()).standard_normal((8, cosine_engine.dim), dtype=np.float32)
+    faiss_engine.search_batch(queries, 10)
+    cosine_engine.search_batch(queries, 10)
+    # Measure while every worker is alive, so shared pages are actually shared
+    barrier.wait()
+    results.put({"load_time": load_time, **read_memory()})
+    barrier.wait()
+
+def prepare(data_dir, rows, dim, index_type):
+    vectors = np.random.default_rng(0).standard_normal((rows, dim), dtype=np.float32)
+    embeddings_path = os.path.join(data_dir, "embeddings.npy")
+    np.save(embeddings_path, vectors)
+    FaissIndexFile(os.path.join(data_dir, "faiss.index"), index_type=index_type).rebuild(vectors)
+    load_normalized_matrix(embeddings_path, os.path.join(data_dir, "embeddings_normalized_float32.npy"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-worker memory of heap vs memory-mapped loading")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--index-type", default="flat_ip")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    size = args.rows * args.dim * 4 / 2**20
+    print(f"rows={args.rows} dim={args.dim} ({size:.0f} MB per float32 copy) workers={args.workers} index={args.index_type}")
+    print(f"{'mode':>6} {'load s':>8} {'RSS MB':>9} {'anon MB':>9} {'file MB':>9} {'PSS MB':>9} {'host MB':>9}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        prepare(data_dir, args.rows, args.dim, args.index_type)
+        for mode, mmap in (("heap", False), ("mmap", True)):
+            barrier, results = context.Barrier(args.workers), context.Queue()
+            processes = [context.Process(target=worker, args=(data_dir, mmap, args.index_type, barrier, results)) for _ in range(args.workers)]
+            for process in processes:
+                process.start()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            mean = {key: np.mean([stat[key] for stat in stats]) for key in stats[0]}
+            host = sum(stat["Pss"] for stat in stats)
+            print(f"{mode:>6} {mean['load_time']:>8.2f} {mean['VmRSS']:>9.0f} {mean['RssAnon']:>9.0f} {mean['RssFile']:>9.0f} {mean['Pss']:>9.0f} {host:>9.0f}")
+
+if __name__ == "__main__":
+    main()
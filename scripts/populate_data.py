@@ -1,64 +1,100 @@
 import os
-import json
 import numpy as np
 import sys
 import time
+import argparse
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.services.book_service import BookService
+from app.services.books_harvester import BooksHarvester
 from app.services.processing_chain import ProcessingChain
+from app.services.incremental_indexer import IncrementalIndexer, COMPACTION_MIN_RATIO
+from app.services.faiss_engine import FaissShardFiles
+from app.services.neighbor_graph import NeighborGraph
+from app.services.data_generations import DataGenerations, save_npy
+from app.services.embedding_providers import EMBEDDING_PROVIDERS, model_name, write_embeddings_model
 from app.core.config import settings
 
 book_service = BookService()
-processing_chain = ProcessingChain()
+# Created in main, once --embedding-provider is known
+processing_chain = None
 
 predefined_genres = ["science-fiction", "non-fiction", "science", "history", "fantasy", "mystery", "romance", "horror", "biography", "self-help", "technology", "python",
                     "rest-api", "programming", "web-development", "data-science", "machine-learning", "deep-learning", "artificial-intelligence", "cloud-computing"]
 
 def fetch_books(genres):
-    all_books = []
+    # All genres and pages are fetched concurrently, rate-limited, retried, and deduplicated by id
     books_per_genre = 2400 // len(genres)
-    for genre in genres:
-        print(f"Collecting books for genre: {genre}")
-        books_data = book_service.collect_books(query=genre, max_results=books_per_genre)
-        all_books.extend(books_data.get('items', []))
-    return all_books
+    print(f"Collecting up to {books_per_genre} books for each of {len(genres)} genres")
+    with BooksHarvester.from_settings() as harvester:
+        return list(harvester.harvest(genres, books_per_genre))
 
 def append_or_save_books(all_books):
-    file_path = 'data/books.json'
-    if not os.path.exists(file_path):
-        data = {'items': all_books}
-    else:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            data['items'].extend(all_books)
-    with open(file_path, 'w') as file:
-        json.dump(data, file, indent=4)
+    # Only the new volumes are written, as a new shard; earlier shards are never rewritten
+    return book_service.save_books(all_books)
 
-def save_dataframe_and_embeddings():
-    df = book_service.create_dataframe()
-    embeddings = processing_chain.create_embeddings(df['processed_description'].tolist())
-    df['embeddings'] = embeddings
-    np.save(os.path.join(settings.DATA_DIR, "embeddings.npy"), embeddings)
+def save_dataframe_and_embeddings(data_dir):
+    # The deduplication signatures are kept so incremental updates only sign incoming books
+    df = book_service.create_dataframe(catalog_dir=os.path.join(data_dir, "catalog"), signatures_dir=data_dir)
+    texts = df['processed_description'].tolist()
+    # A local model (tfidf_svd) is refitted on the whole catalog on every full rebuild
+    processing_chain.fit_embeddings(texts, data_dir=data_dir)
+    # Batches are checkpointed, so rerunning after a crash only embeds the missing batches
+    checkpoint_dir = os.path.join(settings.DATA_DIR, "embedding_checkpoints")
+    embeddings = processing_chain.create_embeddings(texts, checkpoint_dir=checkpoint_dir)
+    df['embeddings'] = list(embeddings)
+    save_npy(os.path.join(data_dir, "embeddings.npy"), embeddings)
+    write_embeddings_model(data_dir, model_name(processing_chain.embeddings))
     return df
 
-def save_faiss_index():
-    df = book_service.create_dataframe()
-    faiss_index = processing_chain.create_faiss_index(df)
-    faiss_index.save_local(os.path.join(settings.DATA_DIR, "faiss_index"))
-    return faiss_index
+def save_faiss_index(df, data_dir):
+    # df carries the embeddings computed above, so the index is built without re-embedding
+    return FaissShardFiles.from_settings(data_dir).rebuild(np.stack(df['embeddings'].tolist()))
+
+def save_neighbor_graph(df, data_dir):
+    # Top-NEIGHBORS_M similar books of every book, for /recommend/by-id; blocked, so memory stays bounded
+    NeighborGraph.from_settings(data_dir).rebuild(np.stack(df['embeddings'].tolist()))
+
+def update_index_incrementally(all_books):
+    # Only new and changed books are embedded; the running API picks the changes up on /admin/reload
+    indexer = IncrementalIndexer(book_service, processing_chain)
+    changes = indexer.apply(all_books)
+    print(f"Added: {len(changes.added)}, re-embedded: {len(changes.reembedded)}, updated: {len(changes.updated)}, "
+          f"duplicates skipped: {len(changes.duplicates)}")
+    if indexer.tombstone_ratio() >= COMPACTION_MIN_RATIO:
+        print(f"Tombstoned rows compacted: {indexer.compact()}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect books and build the recommendation data")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Update the existing dataframe, embeddings and FAISS index instead of rebuilding them")
+    parser.add_argument("--embedding-provider", choices=EMBEDDING_PROVIDERS, default=settings.EMBEDDING_PROVIDER,
+                        help="Model to embed the catalog with; the API must run with the same EMBEDDING_PROVIDER")
+    args = parser.parse_args()
+    processing_chain = ProcessingChain(args.embedding_provider)
+
     start_time = time.time()
     all_books = fetch_books(predefined_genres)
     print(f"Total books collected: {len(all_books)}")
     append_or_save_books(all_books)
     print("Books saved successfully!")
-    df = save_dataframe_and_embeddings()
-    print("Dataframe and embeddings saved successfully!")
-    faiss_index = save_faiss_index()
-    print("FAISS index saved successfully!")
+    if args.incremental:
+        update_index_incrementally(all_books)
+        print("Index updated incrementally!")
+    else:
+        # Everything is written to a new data generation, which the API only sees once it is committed
+        generations = DataGenerations(settings.DATA_DIR)
+        data_dir = generations.begin(link=False)
+        df = save_dataframe_and_embeddings(data_dir)
+        print("Dataframe and embeddings saved successfully!")
+        save_faiss_index(df, data_dir)
+        print("FAISS index saved successfully!")
+        if settings.NEIGHBORS_M:
+            save_neighbor_graph(df, data_dir)
+            print("Neighbor graph saved successfully!")
+        generations.commit(data_dir, len(df))
+        print("Data generation committed")
     print("Data population completed successfully!")
     time_spent = time.time() - start_time
     print(f"Time taken: {time_spent:.2f} seconds")
@@ -0,0 +1,10 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Test runs log into a temporary directory rather than the repository's logs/; this runs
+# before any test module imports app.core.logger
+LOG_DIR = tempfile.mkdtemp(prefix="book-recommendation-logs-")
+os.environ["LOG_DIR"] = LOG_DIR
+atexit.register(shutil.rmtree, LOG_DIR, ignore_errors=True)
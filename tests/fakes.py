@@ -0,0 +1,82 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from app.services.book_service import BookService
+from app.services.columnar_catalog import ColumnarCatalog
+from app.services.processing_chain import ProcessingChain
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings so tests never call OpenAI."""
+
+    def __init__(self, dim=64):
+        self.model = "fake-embedding"
+        self.dim = dim
+        self.calls = []
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            seed = int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little")
+            vector += np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls.append(("documents", len(texts)))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append(("query", 1))
+        return self._embed(text)
+
+def fake_normalize(text):
+    return ' '.join(token for token in text.lower().split() if token.isalpha())
+
+class FakeBookService(BookService):
+    def __init__(self, df):
+        self.df = df
+
+    def _clean_text(self, text):
+        return fake_normalize(text)
+
+    def load_dataframe(self, catalog_dir=None):
+        return self.df
+
+    def save_dataframe(self, df, catalog_dir=None):
+        self.df = df
+
+    def load_catalog(self, catalog_dir=None):
+        # The real columnar catalog, written from the in-memory dataframe
+        catalog_dir = catalog_dir or self.catalog_dir
+        ColumnarCatalog.write(self.df, catalog_dir)
+        return ColumnarCatalog(catalog_dir)
+
+class FakeProcessingChain(ProcessingChain):
+    def __init__(self, embeddings=None):
+        self.llm = None
+        self.embeddings = embeddings or FakeEmbeddings()
+        self.base_embeddings = self.embeddings
+
+def make_books_df(n=20):
+    topics = ["space", "dragon", "murder", "python", "history"]
+    rows = []
+    for i in range(n):
+        topic = topics[i % len(topics)]
+        description = f"A book about {topic} number {i} with {topic} adventures"
+        rows.append({
+            'id': f"book{i}",
+            'title': f"{topic.title()} Book {i}",
+            'authors': [f"Author {i % 3}"],
+            'processed_description': ' '.join(w for w in description.lower().split() if w.isalpha()),
+            'description': description,
+            'genres': [topic],
+        })
+    return pd.DataFrame(rows)
+
+def to_raw_items(df):
+    """Turn dataframe rows back into Google Books volume items."""
+    return [
+        {'id': row['id'], 'volumeInfo': {'title': row['title'], 'authors': list(row['authors']), 'description': row['description']}}
+        for row in df.to_dict('records')
+    ]
@@ -0,0 +1,99 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api import endpoints
+from app.api.endpoints import get_recommendation_service
+from app.core.config import settings
+from app.services.compute_executor import ComputeExecutor
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    app.dependency_overrides[get_recommendation_service] = lambda: service
+    # Not used as a context manager, so the startup hook does not build the real service
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+BATCH = [
+    {"description": "dragon adventures", "num_recommendations": 3},
+    {"description": "python programming", "num_recommendations": 2},
+    {"description": "space opera", "num_recommendations": 0},
+]
+
+@pytest.mark.parametrize("method", ["faiss", "cosine"])
+def test_batch_returns_results_in_order(client, method):
+    response = client.post(f"{settings.V1_STR}/recommend/batch", json={"requests": BATCH, "method": method})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [len(result["recommendations"]) for result in results] == [3, 2, 0]
+    assert all("Dragon" in book["title"] for book in results[0]["recommendations"])
+
+def test_batch_streams_ndjson(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_CHUNK_SIZE", 2)
+    response = client.post(f"{settings.V1_STR}/recommend/batch", json={"requests": BATCH, "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert all(line["error"] is None for line in lines)
+
+def test_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_SIZE", 2)
+    response = client.post(f"{settings.V1_STR}/recommend/batch", json={"requests": BATCH})
+    assert response.status_code == 422
+
+def test_item_errors_do_not_fail_the_batch(client, monkeypatch):
+    service = app.dependency_overrides[get_recommendation_service]()
+    embed_query = service.processing_chain.embeddings.embed_query
+
+    def embed_documents(texts):
+        raise RuntimeError("provider rejected the batch")
+
+    def flaky_embed_query(text):
+        if "poison" in text:
+            raise ValueError("Input could not be embedded")
+        return embed_query(text)
+
+    monkeypatch.setattr(service.processing_chain.embeddings, "embed_documents", embed_documents)
+    monkeypatch.setattr(service.processing_chain.embeddings, "embed_query", flaky_embed_query)
+    requests = [{"description": "dragon", "num_recommendations": 2}, {"description": "poison pill", "num_recommendations": 2}]
+    results = client.post(f"{settings.V1_STR}/recommend/batch", json={"requests": requests, "method": "cosine"}).json()["results"]
+    assert len(results[0]["recommendations"]) == 2
+    assert results[1] == {"index": 1, "recommendations": None, "error": "Input could not be embedded"}
+
+def test_full_compute_pool_returns_503(client, monkeypatch):
+    executor = ComputeExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(endpoints, "compute_executor", executor)
+    service = app.dependency_overrides[get_recommendation_service]()
+    embed_query = service.processing_chain.embeddings.embed_query
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_embed_query(text):
+        started.set()
+        release.wait(5)
+        return embed_query(text)
+
+    monkeypatch.setattr(service.processing_chain.embeddings, "embed_query", blocking_embed_query)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        first = pool.submit(client.post, f"{settings.V1_STR}/recommend/cosine", json={"description": "dragon"})
+        try:
+            assert started.wait(5)
+            # The only worker is busy and nothing may queue; a different description is not coalesced
+            for path, body in (("/recommend/cosine", {"description": "python"}),
+                               ("/recommend/faiss", {"description": "python"}),
+                               ("/recommend/batch", {"requests": BATCH})):
+                response = client.post(f"{settings.V1_STR}{path}", json=body)
+                assert response.status_code == 503
+                assert response.headers["Retry-After"] == "1"
+        finally:
+            release.set()
+        assert first.result().status_code == 200
+    assert executor.rejected == 3
+    executor.shutdown()
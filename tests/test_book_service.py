@@ -1,3 +1,4 @@
+import json
 from unittest.mock import patch, mock_open
 import pytest
 from app.services.book_service import BookService
@@ -11,30 +12,32 @@ def test_initialization():
     assert service.df_file.endswith("books_df.pkl")
 
 # Test collect_books Method
-@patch("app.services.book_service.requests.get")
-def test_collect_books_default(mock_get):
-    mock_get.return_value.json.return_value = {"items": []}
+@patch("app.services.books_harvester.BooksHarvester.fetch_page")
+def test_collect_books_default(mock_fetch_page):
+    mock_fetch_page.return_value = []
     service = BookService()
     result = service.collect_books()
     assert result == {"items": []}
+    mock_fetch_page.assert_called_once_with("", 0, 40)
 
-@patch("app.services.book_service.requests.get")
-def test_collect_books_custom_query(mock_get):
-    mock_get.return_value.json.return_value = {"items": ["book1", "book2"]}
+@patch("app.services.books_harvester.BooksHarvester.fetch_page")
+def test_collect_books_custom_query(mock_fetch_page):
+    mock_fetch_page.return_value = [{"id": "book1"}, {"id": "book2"}]
     service = BookService()
     result = service.collect_books(query="python", max_results=2)
-    assert result == {"items": ["book1", "book2"]}
+    assert result == {"items": [{"id": "book1"}, {"id": "book2"}]}
 
-@patch("app.services.book_service.requests.get")
-def test_collect_books_pagination(mock_get):
-    mock_get.return_value.json.side_effect = [{"items": ["book1"]}, {"items": ["book2"]}]
+@patch("app.services.books_harvester.BooksHarvester.fetch_page")
+def test_collect_books_pagination(mock_fetch_page):
+    mock_fetch_page.side_effect = lambda query, start, size: [{"id": f"book{start}"}] * size
     service = BookService()
     result = service.collect_books(max_results=41)
-    assert result == {"items": ["book1", "book2"]}
+    # Pages of 40 and 1; repeated ids are returned once
+    assert sorted(book["id"] for book in result["items"]) == ["book0", "book40"]
 
-@patch("app.services.book_service.requests.get")
-def test_collect_books_api_error(mock_get):
-    mock_get.side_effect = Exception("API Error")
+@patch("app.services.books_harvester.BooksHarvester.fetch_page")
+def test_collect_books_api_error(mock_fetch_page):
+    mock_fetch_page.side_effect = Exception("API Error")
     service = BookService()
     with pytest.raises(Exception):
         service.collect_books()
@@ -55,11 +58,46 @@ def test_clean_text():
     assert cleaned_text == "test punctuation"
 
 # Test load_dataframe Method
+@patch("app.services.book_service.ColumnarCatalog")
+def test_load_dataframe_exists(mock_catalog):
+    mock_catalog.exists.return_value = True
+    mock_catalog.return_value.to_dataframe.return_value = pd.DataFrame()
+    service = BookService()
+    df = service.load_dataframe()
+    assert isinstance(df, pd.DataFrame)
+
+# Test a legacy pickled catalog is converted to the columnar catalog
+@patch("app.services.book_service.ColumnarCatalog")
 @patch("os.path.exists")
 @patch("pandas.read_pickle")
-def test_load_dataframe_exists(mock_read_pickle, mock_exists):
+def test_load_dataframe_converts_pickle(mock_read_pickle, mock_exists, mock_catalog):
+    mock_catalog.exists.return_value = False
     mock_exists.return_value = True
-    mock_read_pickle.return_value = pd.DataFrame()
+    mock_read_pickle.return_value = pd.DataFrame({"id": ["1"]})
     service = BookService()
     df = service.load_dataframe()
-    assert isinstance(df, pd.DataFrame)
\ No newline at end of file
+    assert list(df["id"]) == ["1"]
+    mock_catalog.write.assert_called_once_with(df, service.catalog_dir)
+
+# Test parallel cleaning gives the same rows, in the same order, as the serial path
+def test_clean_data_parallel_matches_serial():
+    service = BookService()
+    books = {"items": [
+        {"id": str(i), "volumeInfo": {"title": f"Book {i}", "description": f"Running dogs and {i} flying geese."}}
+        for i in range(50)
+    ] + [{"id": "no-description", "volumeInfo": {"title": "Skipped"}}]}
+    serial = service.clean_data(books)
+    parallel = service.clean_data(books, workers=2, chunksize=8)
+    assert parallel == serial
+    assert len(parallel) == 50
+
+# Test a legacy books.json is imported into the shard store, and later saves only append
+def test_save_books_migrates_books_json(tmp_path):
+    service = BookService()
+    service.books_file = str(tmp_path / "books.json")
+    service.raw_books.directory = str(tmp_path / "raw_books")
+    with open(service.books_file, 'w') as f:
+        json.dump({"items": [{"id": "1"}, {"id": "2"}]}, f)
+    assert service.save_books([{"id": "3"}]) == 1
+    assert [book["id"] for book in service.iter_books()] == ["1", "2", "3"]
+    assert len(service.raw_books.shards()) == 2
@@ -0,0 +1,28 @@
+import pytest
+from app.services.book_store import BookMetadataStore
+from app.models import RecommendedBook
+from tests.fakes import make_books_df
+
+def test_from_dataframe_keeps_serving_columns():
+    df = make_books_df(5)
+    store = BookMetadataStore.from_dataframe(df)
+    assert len(store) == 5
+    assert store.position_of("book3") == 3
+    assert store.position_of("missing") is None
+    assert store.authors[1] == ["Author 1"]
+    assert not hasattr(store, "processed_descriptions")
+
+def test_to_recommended_books():
+    store = BookMetadataStore.from_dataframe(make_books_df(5))
+    books = store.to_recommended_books([4, 0], [0.9, 0.5])
+    assert [book.id for book in books] == ["book4", "book0"]
+    assert all(isinstance(book, RecommendedBook) for book in books)
+    assert books[0].similarity == pytest.approx(0.9)
+
+def test_duplicate_ids_resolve_to_first_row():
+    store = BookMetadataStore(["a", "b", "a"], ["A", "B", "A2"], [[], [], []], ["", "", ""])
+    assert store.position_of("a") == 0
+
+def test_mismatched_columns():
+    with pytest.raises(ValueError):
+        BookMetadataStore(["a"], [], [[]], [""])
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+import requests
+from app.services.books_harvester import BooksHarvester, RateLimiter
+
+# Each query has this many volumes; "shared-*" ids appear under every query
+CATALOG_SIZE = 90
+
+def volumes(query):
+    return [{"id": f"shared-{i}" if i < 5 else f"{query}-{i}", "volumeInfo": {"title": f"{query} {i}"}}
+            for i in range(CATALOG_SIZE)]
+
+class MockVolumesAPI:
+    """A local stand-in for the Google Books volumes endpoint, with scripted failures."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                with api.lock:
+                    api.requests.append(params)
+                    api.connections.add(self.client_address)
+                    status = api.failures.pop(0) if api.failures else 200
+                if status == 200:
+                    start, size = int(params["startIndex"]), int(params["maxResults"])
+                    items = volumes(params["q"])[start:start + size]
+                    body = json.dumps({"totalItems": CATALOG_SIZE, **({"items": items} if items else {})}).encode()
+                else:
+                    body = b"{}"
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/books/v1/volumes"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def mock_api():
+    apis = []
+    def start(failures=()):
+        apis.append(MockVolumesAPI(failures))
+        return apis[-1]
+    yield start
+    for api in apis:
+        api.close()
+
+def harvester(api, **kwargs):
+    return BooksHarvester(api_key="test-key", url=api.url, qps=1000, backoff=0.001, **{"max_concurrency": 4, **kwargs})
+
+def test_harvest_fetches_all_pages_and_deduplicates(mock_api):
+    api = mock_api()
+    with harvester(api) as client:
+        books = list(client.harvest(["python", "history"], 80))
+    ids = [book["id"] for book in books]
+    assert len(ids) == len(set(ids))
+    expected = {book["id"] for query in ("python", "history") for book in volumes(query)[:80]}
+    assert set(ids) == expected
+    # Volumes remember every query that returned them
+    queries = {book["id"]: book["harvestQueries"] for book in books}
+    assert sorted(queries["shared-0"]) == ["history", "python"]
+    assert queries["python-10"] == ["python"]
+    assert all(request["key"] == "test-key" for request in api.requests)
+    assert sorted(int(request["startIndex"]) for request in api.requests) == [0, 0, 40, 40]
+
+def test_harvest_skips_pages_past_the_end(mock_api):
+    api = mock_api()
+    with harvester(api, max_concurrency=1) as client:
+        books = list(client.harvest(["python"], 400))
+    assert len(books) == CATALOG_SIZE
+    # The short page at startIndex 80 marks the end; later pages are never requested
+    assert [int(request["startIndex"]) for request in api.requests] == [0, 40, 80]
+
+def test_retries_rate_limits_and_server_errors(mock_api):
+    api = mock_api(failures=[429, 503, 500])
+    with harvester(api, max_concurrency=1) as client:
+        books = client.fetch_page("python", 0, 40)
+    assert len(books) == 40
+    assert len(api.requests) == 4
+
+def test_gives_up_after_max_retries(mock_api):
+    api = mock_api(failures=[503] * 10)
+    with harvester(api, max_retries=2) as client:
+        with pytest.raises(requests.HTTPError):
+            client.fetch_page("python")
+    assert len(api.requests) == 3
+
+def test_client_errors_are_not_retried(mock_api):
+    api = mock_api(failures=[400])
+    with harvester(api) as client:
+        with pytest.raises(requests.HTTPError):
+            client.fetch_page("python")
+    assert len(api.requests) == 1
+
+def test_connections_are_pooled(mock_api):
+    api = mock_api()
+    with harvester(api, max_concurrency=2) as client:
+        list(client.harvest(["a", "b", "c", "d"], 80))
+    assert len(api.requests) == 8
+    assert len(api.connections) <= 2
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(qps=100)
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,51 @@
+import json
+import os
+import pandas as pd
+import pytest
+from app.services.book_store import BookMetadataStore
+from app.services.columnar_catalog import ColumnarCatalog
+from tests.fakes import make_books_df
+
+def test_round_trip(tmp_path):
+    df = make_books_df(6)
+    df.at[1, 'authors'] = []
+    df.loc[2, 'title'] = "Ünïcode — ☃"
+    df.loc[3, 'description'] = ""
+    ColumnarCatalog.write(df, str(tmp_path))
+    catalog = ColumnarCatalog(str(tmp_path))
+    assert len(catalog) == 6
+    pd.testing.assert_frame_equal(catalog.to_dataframe(), df[list(catalog.columns)])
+    assert catalog.column('title')[2] == "Ünïcode — ☃"
+    assert catalog.column('authors')[1] == []
+
+def test_unknown_column(tmp_path):
+    ColumnarCatalog.write(make_books_df(3), str(tmp_path))
+    with pytest.raises(KeyError):
+        ColumnarCatalog(str(tmp_path)).column('genre')
+
+def test_rewrite_keeps_open_catalog_readable(tmp_path):
+    ColumnarCatalog.write(make_books_df(3), str(tmp_path))
+    old = ColumnarCatalog(str(tmp_path))
+    ColumnarCatalog.write(make_books_df(5), str(tmp_path))
+    # The old files are deleted, but every column of a catalog opened before is still readable
+    pd.testing.assert_frame_equal(old.to_dataframe(), make_books_df(3)[list(old.columns)])
+    assert len(ColumnarCatalog(str(tmp_path))) == 5
+    # A plain directory: the data generation it belongs to is what gets committed atomically
+    assert 'manifest.json' in os.listdir(tmp_path) and not any(entry.startswith('g0') for entry in os.listdir(tmp_path))
+
+def test_reads_catalogs_with_nested_generations(tmp_path):
+    ColumnarCatalog.write(make_books_df(4), str(tmp_path / "g000003"))
+    (tmp_path / "g000003" / "manifest.json").rename(tmp_path / "manifest.json")
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    (tmp_path / "manifest.json").write_text(json.dumps({**manifest, "generation": "g000003"}))
+    pd.testing.assert_frame_equal(ColumnarCatalog(str(tmp_path)).to_dataframe(), make_books_df(4)[list(manifest["columns"])])
+
+def test_metadata_store_from_catalog(tmp_path):
+    ColumnarCatalog.write(make_books_df(5), str(tmp_path))
+    store = BookMetadataStore.from_catalog(ColumnarCatalog(str(tmp_path)), rows=[0, 2, 4])
+    assert len(store) == 3
+    assert store.position_of('book4') == 2
+    assert store.position_of('book1') is None
+    books = store.to_recommended_books([2, 1], [0.9, 0.8])
+    assert [book.id for book in books] == ['book4', 'book2']
+    assert books[0].authors == ["Author 1"]
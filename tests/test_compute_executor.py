@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import pytest
+from app.services.compute_executor import ComputeExecutor, ExecutorSaturatedError
+
+def test_run_returns_result_off_loop():
+    executor = ComputeExecutor(max_workers=2, max_queue=2)
+    loop_thread = threading.get_ident()
+
+    async def main():
+        return await executor.run(None, threading.get_ident)
+
+    assert asyncio.run(main()) != loop_thread
+    assert executor.pending == 0
+    executor.shutdown()
+
+def test_identical_requests_are_coalesced():
+    executor = ComputeExecutor(max_workers=4, max_queue=4)
+    calls = []
+    release = threading.Event()
+
+    def recommend(description, k):
+        calls.append((description, k))
+        release.wait(5)
+        return [description] * k
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run(("cosine", "space opera", 3), recommend, "space opera", 3)) for _ in range(5)]
+        other = asyncio.ensure_future(executor.run(("cosine", "space opera", 5), recommend, "space opera", 5))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks), await other
+
+    results, other = asyncio.run(main())
+    assert len(calls) == 2
+    assert all(result == ["space opera"] * 3 for result in results)
+    assert other == ["space opera"] * 5
+    assert executor.coalesced == 4
+    executor.shutdown()
+
+def test_rejects_when_queue_is_full():
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.ensure_future(executor.run(None, release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(None, release.wait, 5)
+        release.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(main())
+    assert executor.rejected == 1
+    assert executor.pending == 0
+    executor.shutdown()
+
+def test_errors_are_shared_by_coalesced_callers():
+    executor = ComputeExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("Number of recommendations must be greater than 0")
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run("key", fail)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    executor.shutdown()
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+from app.services.cosine_engine import CosineSearchEngine, top_k, load_normalized_matrix
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).standard_normal((500, 32)).tolist()
+
+def test_matrix_is_normalized_float32(embeddings):
+    engine = CosineSearchEngine(embeddings)
+    assert engine.matrix.dtype == np.float32
+    assert engine.matrix.flags["C_CONTIGUOUS"]
+    assert np.allclose(np.linalg.norm(engine.matrix, axis=1), 1.0, atol=1e-5)
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_matches_sklearn(embeddings, dtype):
+    engine = CosineSearchEngine(embeddings, dtype=dtype)
+    query = np.random.default_rng(1).standard_normal(32)
+    expected_scores = cosine_similarity([query], embeddings).flatten()
+    expected = expected_scores.argsort()[-10:][::-1]
+
+    indices, scores = engine.search(query, 10)
+    if dtype == "float32":
+        assert list(indices) == list(expected)
+    else:
+        # Half precision may swap near-ties, but must still return (almost) the same neighbours
+        assert len(set(indices) & set(expected)) >= 9
+    assert np.allclose(scores, expected_scores[indices], atol=1e-2 if dtype == "float16" else 1e-5)
+
+def test_search_batch_matches_single(embeddings):
+    engine = CosineSearchEngine(embeddings)
+    queries = np.random.default_rng(2).standard_normal((4, 32))
+    indices, scores = engine.search_batch(queries, 5)
+    assert indices.shape == scores.shape == (4, 5)
+    for row, query in enumerate(queries):
+        single_indices, single_scores = engine.search(query, 5)
+        assert list(indices[row]) == list(single_indices)
+        assert np.allclose(scores[row], single_scores, atol=1e-5)
+
+def test_k_larger_than_corpus(embeddings):
+    engine = CosineSearchEngine(embeddings[:3])
+    indices, scores = engine.search(embeddings[0], 10)
+    assert len(indices) == 3
+    assert indices[0] == 0
+    assert np.all(np.diff(scores) <= 0)
+
+def test_dimension_mismatch(embeddings):
+    engine = CosineSearchEngine(embeddings)
+    with pytest.raises(ValueError):
+        engine.search(np.ones(8), 5)
+
+def test_top_k_sorted():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7]])
+    assert top_k(scores, 2).tolist() == [[1, 3]]
+    assert top_k(scores, 0).shape == (1, 0)
+
+def test_dead_rows_are_never_returned(embeddings):
+    positions = np.arange(len(embeddings)) - 5
+    positions[:5] = -1
+    engine = CosineSearchEngine(embeddings, positions=positions)
+    assert len(engine) == len(embeddings) - 5
+    indices, _ = engine.search(embeddings[2], 10)
+    assert len(indices) == 10 and indices.min() >= 0
+    indices, _ = CosineSearchEngine(embeddings[:8], positions=positions[:8]).search(embeddings[6], 10)
+    assert sorted(indices) == [0, 1, 2]
+
+def test_memory_mapped_normalized_matrix(embeddings, tmp_path):
+    source, path = str(tmp_path / "embeddings.npy"), str(tmp_path / "normalized.npy")
+    np.save(source, np.array(embeddings, dtype=np.float32))
+    matrix = load_normalized_matrix(source, path, block_rows=64)
+    engine = CosineSearchEngine(matrix, normalized=True)
+    assert isinstance(matrix, np.memmap) and np.shares_memory(engine.matrix, matrix)
+    assert np.allclose(engine.matrix, CosineSearchEngine(embeddings).matrix, atol=1e-6)
+    # A source with more rows (an incremental update) triggers a rewrite
+    np.save(source, np.array(embeddings + embeddings[:3], dtype=np.float32))
+    assert load_normalized_matrix(source, path).shape[0] == len(embeddings) + 3
+    with pytest.raises(ValueError):
+        CosineSearchEngine(matrix, dtype="float16", normalized=True)
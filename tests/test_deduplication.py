@@ -0,0 +1,193 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.endpoints import get_recommendation_service
+from app.core.config import settings
+from app.services.data_generations import DataGenerations
+from app.services.deduplication import Deduplicator, MinHasher, SignatureFiles, content_hash, work_key
+from app.services.incremental_indexer import IncrementalIndexer
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df, to_raw_items
+
+STORY = ("a young wizard leaves the village of his birth to study at a school of magic where he makes friends "
+         "and enemies and learns that an ancient evil is rising in the northern mountains beyond the sea")
+
+def book(book_id, text, genres=()):
+    return {'id': book_id, 'title': book_id, 'authors': ["A"], 'description': text,
+            'processed_description': text, 'genres': list(genres)}
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=128, threshold=0.8)
+    same = hasher.signature(STORY)
+    assert (hasher.signature(STORY) == same).all()
+    near = (hasher.signature(STORY.replace("sea", "ocean")) == same).mean()
+    far = (hasher.signature("a cookbook of quick vegetarian dinners for busy weeknights") == same).mean()
+    assert near > 0.8 and far < 0.2
+    assert hasher.signature("   ") is None
+    assert content_hash("A  Story\n") == content_hash("a story")
+
+# Books whose descriptions share more or fewer words with an earlier one, around the threshold
+DEDUP_SCRIPT = """
+import json, random
+from app.services.deduplication import Deduplicator
+rng = random.Random(0)
+words = [f"word{i}" for i in range(300)]
+books = []
+for i in range(200):
+    text = [rng.choice(words) for _ in range(40)]
+    books.append({'id': f"b{i}", 'processed_description': " ".join(text), 'genres': []})
+    for j in range(2):
+        variant = [rng.choice(words) if rng.random() < 0.04 * (j + 1) else word for word in text]
+        books.append({'id': f"b{i}-{j}", 'processed_description': " ".join(variant), 'genres': []})
+print(json.dumps(Deduplicator(threshold=0.8).deduplicate(books)[1].duplicates))
+"""
+
+def test_duplicates_do_not_depend_on_the_hash_seed():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    reports = [
+        json.loads(subprocess.run([sys.executable, "-c", DEDUP_SCRIPT], cwd=root, env={**os.environ, "PYTHONHASHSEED": seed},
+                                  capture_output=True, text=True, check=True).stdout)
+        for seed in ("1", "2")
+    ]
+    assert reports[0] and reports[0] == reports[1]
+
+def test_deduplicate_ids_exact_and_near_duplicates():
+    books = [
+        book("b1", STORY, ["fantasy"]),
+        book("b2", "a cookbook of quick vegetarian dinners", ["cooking"]),
+        book("b1", STORY, ["magic"]),
+        book("b3", STORY.upper(), ["young adult"]),
+        book("b4", STORY.replace("sea", "ocean"), ["epic"]),
+        book("b5", "a history of the roman empire", ["history"]),
+    ]
+    kept, report = Deduplicator(threshold=0.8).deduplicate(books)
+    assert [b['id'] for b in kept] == ["b1", "b2", "b5"]
+    assert kept[0]['genres'] == ["fantasy", "magic", "young adult", "epic"]
+    assert (report.duplicate_ids, report.exact_duplicates, report.near_duplicates) == (1, 1, 1)
+    assert report.duplicates == {"b3": "b1", "b4": "b1"}
+
+    # Without a threshold only identical descriptions are duplicates
+    kept, report = Deduplicator(threshold=0).deduplicate(books)
+    assert [b['id'] for b in kept] == ["b1", "b2", "b4", "b5"]
+
+def test_deduplicate_against_existing_books():
+    kept, report = Deduplicator().deduplicate([book("new", STORY.replace("sea", "ocean")), book("other", "gardening")],
+                                              existing=Deduplicator().sign(["old"], [STORY]))
+    assert [b['id'] for b in kept] == ["other"]
+    assert report.duplicates == {"new": "old"}
+
+def test_deduplicate_leaves_input_books_unchanged():
+    books = [book("b1", STORY, ["fantasy"]), book("b2", STORY.upper(), ["magic"]), book("b1", STORY, ["epic"])]
+    kept, _ = Deduplicator().deduplicate(books)
+    assert kept[0]['genres'] == ["fantasy", "epic", "magic"]
+    assert [b['genres'] for b in books] == [["fantasy"], ["magic"], ["epic"]]
+
+def test_work_key_ignores_edition_notes():
+    key = work_key("Dune", ["Frank Herbert"])
+    for title in ("DUNE (40th Anniversary Edition)", "Dune: Deluxe Edition", "Dune - Revised and Updated",
+                  "Dune [Paperback]", "Dune: A Novel", "Dune - Collector's Edition", "  dune. "):
+        assert work_key(title, ["Frank Herbert"]) == key
+    assert work_key("Harry Potter", ["J.K. Rowling", "Mary GrandPré"]) == work_key("Harry Potter", ["Mary Grandpré", "J. K. Rowling"])
+    assert work_key("Dune Messiah", ["Frank Herbert"]) != key
+    assert work_key("Dune", ["Brian Herbert"]) != key
+    assert work_key("(Untitled)", [])[0] == "untitled"
+
+def test_work_key_keeps_subtitles():
+    # clean_book joins subtitles with " - "; a subtitle that is not an edition note names another work
+    volumes = [work_key(f"The Art of Computer Programming - Volume {n}", ["Donald E. Knuth"]) for n in (1, 3)]
+    assert volumes[0] != volumes[1]
+    assert volumes[0] == work_key("The Art of Computer Programming: Volume 1 (3rd Edition)", ["Donald E. Knuth"])
+    assert work_key("Deep Learning - Foundations and Concepts", ["Bishop"]) != work_key("Deep Learning - A Visual Approach", ["Bishop"])
+    assert work_key("Dune - Book 1", ["Frank Herbert"]) != work_key("Dune - Book 2", ["Frank Herbert"])
+
+def test_incremental_apply_skips_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    book_service, chain = FakeBookService(make_books_df(10)), FakeProcessingChain()
+    RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+    chain.embeddings.calls.clear()
+    items = to_raw_items(book_service.df)
+    copy = {**items[2], 'id': 'copy2'}
+    fresh = {'id': 'new1', 'volumeInfo': {'title': 'Glacier Tales', 'authors': ['Ice'], 'description': 'glacier glacier ice'}}
+    changes = IncrementalIndexer(book_service, chain, data_dir=str(tmp_path)).apply(items + [copy, fresh, {**fresh, 'id': 'new2'}])
+    assert changes.added == ['new1']
+    assert sorted(changes.duplicates) == ['copy2', 'new2']
+    assert chain.embeddings.calls == [("documents", 1)]
+
+def test_incremental_dedup_signs_only_incoming_books(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    book_service, chain = FakeBookService(make_books_df(10)), FakeProcessingChain()
+    RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+    indexer = IncrementalIndexer(book_service, chain, data_dir=str(tmp_path))
+    story = {'id': 'story', 'volumeInfo': {'title': 'Story', 'authors': ['A'], 'description': STORY}}
+    # The first update signs the catalog built without signatures, and stores the signatures
+    assert indexer.apply([story]).added == ['story']
+
+    signature = MinHasher.signature
+    signed = []
+    monkeypatch.setattr(MinHasher, "signature", lambda self, text: signed.append(text) or signature(self, text))
+    assert indexer.apply([story]).empty and signed == []
+    near = {'id': 'near', 'volumeInfo': {'title': 'Near', 'authors': ['B'], 'description': STORY.replace("sea", "ocean")}}
+    assert indexer.apply([near]).duplicates == ['near']
+    assert len(signed) == 1
+
+    # Compaction keeps the stored signatures row for row with the catalog
+    indexer.delete(['book1', 'book2'])
+    indexer.compact()
+    df = book_service.df
+    stored = SignatureFiles.from_settings(DataGenerations(str(tmp_path)).current_dir()).load(df['id'])
+    expected = Deduplicator.from_settings().sign(df['id'], df['processed_description'])
+    assert stored.ids == expected.ids == [book_id for book_id in df['id']]
+    assert np.array_equal(stored.digests, expected.digests) and np.array_equal(stored.signatures, expected.signatures)
+
+@pytest.fixture
+def editions_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    df = make_books_df(20)
+    # Two more editions of every dragon book: same work, another id, description and title suffix
+    editions = df[df['title'].str.startswith("Dragon")]
+    copies = [editions.assign(id=editions['id'] + f"-ed{n}", title=editions['title'] + suffix,
+                              description=editions['description'] + " edition",
+                              processed_description=editions['processed_description'] + " edition")
+              for n, suffix in ((1, ""), (2, ": Deluxe Edition"))]
+    df = pd.concat([df, *copies], ignore_index=True)
+    return RecommendationService(book_service=FakeBookService(df), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+
+def works(books):
+    return {work_key(book.title, book.authors) for book in books}
+
+@pytest.mark.parametrize("method", ["recommend_books_faiss", "recommend_books_cosine"])
+def test_collapse_returns_k_distinct_works(editions_service, method):
+    search = getattr(editions_service, method)
+    assert len(works(search("dragon adventures", 6))) < 6
+    for k in (4, 6):
+        books = search("dragon adventures", k, collapse=True)
+        assert len(books) == k and len(works(books)) == k
+        assert books[0].similarity >= books[-1].similarity
+    assert sum(book.title.startswith("Dragon") for book in search("dragon adventures", 6, collapse=True)) == 4
+    # More than there are works: every work once
+    assert len(search("dragon", 100, collapse=True)) == 20
+    books = search("dragon", 3, filters={"genres": ["dragon"]}, collapse=True)
+    assert len(works(books)) == 3
+
+@pytest.mark.parametrize("method", ["faiss", "cosine"])
+def test_batch_with_collapse(editions_service, method):
+    results = editions_service.recommend_books_batch([("dragon", 6), ("dragon", 6, None, True)], method=method)
+    assert len(works(results[0])) < 6
+    assert len(works(results[1])) == 6
+
+def test_collapse_api_field(editions_service):
+    app.dependency_overrides[get_recommendation_service] = lambda: editions_service
+    try:
+        client = TestClient(app)
+        response = client.post(f"{settings.V1_STR}/recommend/cosine",
+                               json={"description": "dragon", "num_recommendations": 6, "collapse_duplicates": True})
+        assert response.status_code == 200
+        assert len({book["title"] for book in response.json()["recommendations"]}) == 6
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,58 @@
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from tests.fakes import FakeEmbeddings
+
+def test_lru_eviction_and_counters():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("model", "a", [1.0])
+    cache.put("model", "b", [2.0])
+    assert cache.get("model", "a") is not None  # a becomes most recently used
+    cache.put("model", "c", [3.0])
+    assert cache.get("model", "b") is None
+    assert cache.get("model", "c") is not None
+    assert cache.hits == 2
+    assert cache.misses == 1
+    assert len(cache) == 2
+
+def test_key_is_normalized_text_and_model():
+    cache = EmbeddingCache()
+    cache.put("model", "  A space   opera ", [1.0, 2.0])
+    assert np.array_equal(cache.get("model", "A space opera"), [1.0, 2.0])
+    assert cache.get("other-model", "A space opera") is None
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.services.embedding_cache.time.time", lambda: now[0])
+    cache = EmbeddingCache(ttl=60)
+    cache.put("model", "text", [1.0])
+    now[0] += 30
+    assert cache.get("model", "text") is not None
+    now[0] += 61
+    assert cache.get("model", "text") is None
+    assert len(cache) == 0
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(path=path).put("model", "text", [0.5, 0.25])
+    restarted = EmbeddingCache(path=path)
+    assert np.array_equal(restarted.get("model", "text"), np.array([0.5, 0.25], dtype=np.float32))
+    assert restarted.disk_hits == 1
+
+def test_cached_embeddings_calls_model_once_per_text():
+    fake = FakeEmbeddings()
+    embeddings = CachedEmbeddings(fake, EmbeddingCache())
+    first = embeddings.embed_query("a book about dragons")
+    second = embeddings.embed_query("a book  about dragons")
+    assert np.allclose(first, second)
+    assert fake.calls == [("query", 1)]
+    embeddings.embed_documents(["x", "y"])
+    assert fake.calls[-1] == ("documents", 2)
+
+def test_embed_queries_batches_misses():
+    embeddings = FakeEmbeddings()
+    cached = CachedEmbeddings(embeddings, EmbeddingCache())
+    cached.embed_query("space opera")
+    vectors = cached.embed_queries(["space opera", "dragons", "dragons", "robots"])
+    assert embeddings.calls == [("query", 1), ("documents", 2)]
+    assert vectors[1] == vectors[2]
+    assert np.allclose(vectors[0], embeddings.embed_query("space opera"))
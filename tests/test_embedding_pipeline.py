@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from app.services.embedding_pipeline import EmbeddingPipeline
+from tests.fakes import FakeEmbeddings
+
+TEXTS = [f"book description number {i}" for i in range(23)]
+
+class FlakyEmbeddings(FakeEmbeddings):
+    def __init__(self, fail_on_call):
+        super().__init__()
+        self.fail_on_call = fail_on_call
+
+    def embed_documents(self, texts):
+        if len(self.calls) + 1 == self.fail_on_call:
+            raise RuntimeError("simulated crash")
+        return super().embed_documents(texts)
+
+def test_batches_match_single_call():
+    fake = FakeEmbeddings()
+    pipeline = EmbeddingPipeline(fake, batch_size=5, max_concurrency=3)
+    result = pipeline.run(TEXTS)
+    assert result.shape == (23, fake.dim)
+    assert result.dtype == np.float32
+    assert np.allclose(result, fake.embed_documents(TEXTS))
+    assert sorted(size for _, size in fake.calls[:-1]) == [3, 5, 5, 5, 5]
+
+def test_resumes_from_checkpoints(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    flaky = FlakyEmbeddings(fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        EmbeddingPipeline(flaky, batch_size=5, max_concurrency=1, checkpoint_dir=checkpoint_dir).run(TEXTS)
+
+    fake = FakeEmbeddings()
+    result = EmbeddingPipeline(fake, batch_size=5, max_concurrency=1, checkpoint_dir=checkpoint_dir).run(TEXTS)
+    # Two batches were checkpointed before the crash; only the remaining three are embedded
+    assert len(fake.calls) == 3
+    assert np.allclose(result, FakeEmbeddings().embed_documents(TEXTS))
+
+def test_checkpoints_for_other_corpus_are_discarded(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    EmbeddingPipeline(FakeEmbeddings(), batch_size=5, checkpoint_dir=checkpoint_dir).run(TEXTS)
+
+    fake = FakeEmbeddings()
+    changed = TEXTS[:-1] + ["a different last book"]
+    result = EmbeddingPipeline(fake, batch_size=5, checkpoint_dir=checkpoint_dir).run(changed)
+    assert len(fake.calls) == 5
+    assert np.allclose(result, FakeEmbeddings().embed_documents(changed))
+
+def test_empty_corpus():
+    assert EmbeddingPipeline(FakeEmbeddings()).run([]).shape == (0, 0)
@@ -0,0 +1,71 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.data_generations import DataGenerations
+from app.services.embedding_providers import TfidfSvdEmbeddings, create_embeddings, read_embeddings_model, TFIDF_SVD_MODEL_FILE
+from app.services.processing_chain import ProcessingChain
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+def test_tfidf_svd_embeddings(tmp_path):
+    texts = make_books_df(40)['processed_description'].tolist()
+    embeddings = TfidfSvdEmbeddings(dim=16).fit(texts)
+    matrix = embeddings.embed_matrix(texts)
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (40, 16)
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+    query = np.array(embeddings.embed_query("dragon adventures"))
+    assert np.argmax(matrix @ query) % 5 == 1  # a dragon book
+
+    path = tmp_path / "model.joblib"
+    embeddings.save(path)
+    loaded = TfidfSvdEmbeddings.load(path, mmap=True)
+    assert loaded.model == embeddings.model
+    assert np.allclose(loaded.embed_documents(texts[:3]), matrix[:3], atol=1e-6)
+
+def test_unfitted_and_unknown_providers(monkeypatch):
+    with pytest.raises(ValueError):
+        TfidfSvdEmbeddings().embed_query("dragon")
+    with pytest.raises(ValueError):
+        create_embeddings("word2vec")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    with pytest.raises(ValueError):
+        create_embeddings("openai")
+
+def test_service_on_local_embeddings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_DIM", 8)
+    book_service = FakeBookService(make_books_df())
+    service = RecommendationService(book_service=book_service, processing_chain=ProcessingChain("tfidf_svd"), query_normalizer=fake_normalize)
+    # Fitted on the catalog, saved, and recorded as the model of embeddings.npy
+    assert (tmp_path / TFIDF_SVD_MODEL_FILE).exists()
+    assert read_embeddings_model(tmp_path).startswith("tfidf-svd-8-")
+    assert service.recommend_books_cosine("space adventures", 1)[0].title.startswith("Space")
+
+    # The next process loads the saved model instead of fitting again
+    reloaded = RecommendationService(book_service=book_service, processing_chain=ProcessingChain("tfidf_svd"), query_normalizer=fake_normalize)
+    assert reloaded.recommend_books_faiss("space adventures", 1)[0].title.startswith("Space")
+
+    # Vectors of another model are not comparable with the stored ones
+    with pytest.raises(ValueError):
+        RecommendationService(book_service=book_service, processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+
+def test_refit_is_saved_in_the_generation_being_built(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "EMBEDDING_DIM", 8)
+    book_service = FakeBookService(make_books_df())
+    RecommendationService(book_service=book_service, processing_chain=ProcessingChain("tfidf_svd"), query_normalizer=fake_normalize)
+    generations = DataGenerations(str(tmp_path))
+    generations.commit(generations.begin(), 20)
+    live_model = (Path(generations.current_dir()) / TFIDF_SVD_MODEL_FILE).read_bytes()
+
+    # A rebuild refits into its own generation; until it commits, the live model is untouched
+    chain = ProcessingChain("tfidf_svd")
+    assert chain.base_embeddings.is_fitted
+    rebuild = generations.begin(link=False)
+    chain.fit_embeddings([text + " glacier" for text in make_books_df(40)['processed_description']], data_dir=rebuild)
+    assert (Path(rebuild) / TFIDF_SVD_MODEL_FILE).exists()
+    assert (Path(generations.current_dir()) / TFIDF_SVD_MODEL_FILE).read_bytes() == live_model
+    reloaded = RecommendationService(book_service=book_service, processing_chain=ProcessingChain("tfidf_svd"), query_normalizer=fake_normalize)
+    assert reloaded.recommend_books_cosine("space adventures", 1)[0].title.startswith("Space")
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.faiss_engine import FaissSearchEngine, FaissIndexFile, build_index, index_spec
+
+@pytest.fixture(scope="module")
+def vectors():
+    # Clustered data, like real embeddings, so approximate indexes have structure to exploit
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 32))
+    return (centers[rng.integers(0, 20, 4000)] + 0.3 * rng.standard_normal((4000, 32))).astype(np.float32)
+
+def recall(engine, exact, queries, k):
+    found = [set(positions) for positions, _ in engine.search_batch(queries, k)]
+    expected = [set(row) for row in exact.search_batch(queries, k)[0]]
+    return np.mean([len(f & e) / k for f, e in zip(found, expected)])
+
+def test_flat_ip_matches_exact_cosine(vectors):
+    engine = FaissSearchEngine(build_index(vectors, "flat_ip"), np.arange(len(vectors)))
+    exact = CosineSearchEngine(vectors)
+    positions, scores = engine.search(vectors[7] + 0.01, 5)
+    expected_positions, expected_scores = exact.search(vectors[7] + 0.01, 5)
+    assert list(positions) == list(expected_positions)
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw", "ivf_pq"])
+def test_approximate_indexes_have_high_recall(vectors, index_type):
+    # dim 32 only leaves room for 2 sub-quantizers by default; use 8 so PQ is not the bottleneck
+    index = build_index(vectors, index_type, pq_m=8)
+    engine = FaissSearchEngine(index, np.arange(len(vectors)), nprobe=16, ef_search=64)
+    queries = np.random.default_rng(1).standard_normal((50, 32)).astype(np.float32)
+    assert recall(engine, CosineSearchEngine(vectors), queries, 10) >= (0.5 if index_type == "ivf_pq" else 0.9)
+
+def test_tombstoned_rows_are_skipped(vectors):
+    positions = np.arange(len(vectors))
+    positions[:100] = -1
+    engine = FaissSearchEngine(build_index(vectors, "flat_ip"), positions)
+    assert len(engine) == len(vectors) - 100
+    found, _ = engine.search(vectors[3], 10)
+    assert len(found) == 10 and 3 not in found
+
+def test_index_spec_defaults():
+    assert index_spec("flat_ip", 1000, 3072) == "Flat"
+    assert index_spec("ivf_flat", 1_000_000, 3072) == "IVF4000,Flat"
+    assert index_spec("ivf_pq", 1_000_000, 3072) == "IVF4000,PQ192x8np"
+    assert index_spec("ivf_pq", 20, 64) == "IVF1,PQ4x1np"
+    assert index_spec("sq8", 1000, 3072) == "SQ8"
+    assert index_spec("pq", 1_000_000, 3072) == "PQ192x8np"
+    with pytest.raises(ValueError):
+        index_spec("lsh", 1000, 64)
+
+@pytest.mark.parametrize("index_type,truncate_dim", [("sq8", 0), ("pq", 0), ("flat_ip", 16), ("sq8", 16)])
+def test_compressed_indexes_rerank_exactly(vectors, index_type, truncate_dim):
+    # Decaying variance per component, so a prefix carries most of each vector as in Matryoshka embeddings
+    vectors = vectors / np.sqrt(1 + np.arange(32, dtype=np.float32))
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), 50)] + 0.05 * rng.standard_normal((50, 32)).astype(np.float32)
+    exact = CosineSearchEngine(vectors)
+    index = build_index(vectors, index_type, pq_m=16, truncate_dim=truncate_dim)
+    assert index.d == (truncate_dim or 32)
+    engine = FaissSearchEngine(index, np.arange(len(vectors)), rerank=exact, rerank_candidates=200)
+    assert recall(engine, exact, queries, 10) >= 0.95
+    # Re-ranked scores are the exact cosine similarities, not the estimates from the codes
+    positions, scores = engine.search(queries[0], 10)
+    assert np.allclose(scores, exact.search_subset(queries[0], positions, 10)[1], atol=1e-5)
+    if index_type != "pq":
+        found, _ = engine.search_subset(queries[0], np.arange(0, len(vectors), 2), 10)
+        assert len(found) == 10 and all(position % 2 == 0 for position in found)
+
+def test_index_file_appends_and_rebuilds(vectors, tmp_path):
+    index_file = FaissIndexFile(str(tmp_path / "faiss.index"), index_type="hnsw", hnsw_m=16)
+    assert index_file.load_or_build(vectors[:3000]).ntotal == 3000
+    assert index_file.load_or_build(vectors).ntotal == 4000
+    # Different build parameters invalidate the stored index
+    other = FaissIndexFile(str(tmp_path / "faiss.index"), index_type="flat_ip")
+    assert type(other.load_or_build(vectors[:10])).__name__ == "IndexFlat"
+
+def test_index_file_truncation(vectors, tmp_path):
+    index_file = FaissIndexFile(str(tmp_path / "faiss.index"), index_type="flat_ip", truncate_dim=8)
+    assert index_file.compressed
+    assert not FaissIndexFile(str(tmp_path / "other.index"), index_type="hnsw").compressed
+    index_file.load_or_build(vectors[:3000])
+    # Appended vectors are truncated the same way
+    index = index_file.load_or_build(vectors)
+    assert (index.ntotal, index.d) == (4000, 8)
+
+def test_memory_mapped_index_file(vectors, tmp_path):
+    index_file = FaissIndexFile(str(tmp_path / "faiss.index"), index_type="flat_ip", mmap=True)
+    index = index_file.load_or_build(vectors[:3000])
+    # Appending goes through a writable copy and the result is mapped again
+    index = index_file.load_or_build(vectors)
+    assert index.ntotal == 4000
+    engine = FaissSearchEngine(index, np.arange(len(vectors)))
+    assert engine.search(vectors[3500], 1)[0][0] == 3500
+
+def test_mmap_fallback_is_logged(vectors, tmp_path, monkeypatch):
+    warnings = []
+    monkeypatch.setattr("app.services.faiss_engine.HAS_MMAP_IFC", False)
+    monkeypatch.setattr("app.services.faiss_engine.service_logger.warning", warnings.append)
+    index_file = FaissIndexFile(str(tmp_path / "faiss.index"), index_type="ivf_flat", nlist=16, mmap=True)
+    index_file.load_or_build(vectors)
+    assert index_file.read().ntotal == 4000
+    assert warnings and "IO_FLAG_MMAP_IFC" in warnings[-1]
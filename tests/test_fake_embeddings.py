@@ -0,0 +1,26 @@
+import time
+import numpy as np
+from app.services.fake_embeddings import HashingEmbeddings
+
+def test_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(dim=256)
+    first = embeddings.embed_query("A dragon over the mountains")
+    assert first == HashingEmbeddings(dim=256).embed_query("a dragon over the MOUNTAINS")
+    assert len(first) == 256
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert first != HashingEmbeddings(dim=256, seed=1).embed_query("A dragon over the mountains")
+
+def test_shared_words_are_similar():
+    embeddings = HashingEmbeddings(dim=1024)
+    matrix = embeddings.embed_matrix(["space opera with starships", "starships in a space opera", "a cozy village bakery"])
+    assert matrix.dtype == np.float32
+    assert matrix[0] @ matrix[1] > 0.5
+    assert matrix[0] @ matrix[1] > matrix[0] @ matrix[2]
+    assert np.allclose(matrix[0], embeddings.embed_documents(["space opera with starships"])[0])
+
+def test_injected_latency():
+    embeddings = HashingEmbeddings(dim=64, latency=0.05)
+    start = time.perf_counter()
+    embeddings.embed_documents(["one", "two", "three"])
+    # Once per call, not per text
+    assert 0.05 <= time.perf_counter() - start < 0.15
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.endpoints import get_recommendation_service
+from app.core.config import settings
+from app.services.filter_index import FilterIndex, InvertedIndex
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+def test_inverted_index_lookup():
+    index = InvertedIndex([["Ann Lee", "Bo"], [], ["bo"], ["Cy"], ["Ann  Lee"]])
+    assert index.lookup(["ann lee"]).tolist() == [0, 4]
+    assert index.lookup(["BO", "cy", "nobody"]).tolist() == [0, 2, 3]
+    assert index.lookup(["nobody"]).tolist() == []
+
+def test_filter_index_combines_fields():
+    filters = FilterIndex({"authors": InvertedIndex([["A"], ["B"], ["A"], ["C"]]),
+                           "genres": InvertedIndex([["x"], ["x"], ["y"], ["x"]])}, 4)
+    assert filters.select(None) is None
+    assert filters.select({"authors": [], "genres": None}) is None
+    assert filters.select({"authors": ["A", "B"]}).tolist() == [0, 1, 2]
+    assert filters.select({"authors": ["A", "B"], "genres": ["x"]}).tolist() == [0, 1]
+    with pytest.raises(ValueError):
+        filters.select({"publisher": ["P"]})
+
+@pytest.fixture
+def filtered_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    return RecommendationService(book_service=FakeBookService(make_books_df(60)), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+
+@pytest.mark.parametrize("method", ["recommend_books_faiss", "recommend_books_cosine"])
+def test_filtered_recommendations_return_exactly_k(filtered_service, method):
+    search = getattr(filtered_service, method)
+    # The query matches dragon books, the filter only allows python books
+    books = search("dragon adventures", 5, filters={"genres": ["python"], "authors": ["author 0", "AUTHOR 1"]})
+    assert len(books) == 5
+    assert all(book.title.startswith("Python") and book.authors[0] in ("Author 0", "Author 1") for book in books)
+    assert books[0].similarity >= books[-1].similarity
+    # Fewer matches than k: all of them
+    assert len(search("dragon", 50, filters={"genres": ["python"]})) == 12
+    assert search("dragon", 5, filters={"authors": ["nobody"]}) == []
+
+def test_filtered_search_on_approximate_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_NPROBE", 1)
+    service = RecommendationService(book_service=FakeBookService(make_books_df(200)), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    books = service.recommend_books_faiss("dragon", 10, filters={"genres": ["history"]})
+    assert len(books) == 10
+    assert all(book.title.startswith("History") for book in books)
+
+@pytest.mark.parametrize("method", ["faiss", "cosine"])
+def test_batch_with_filters(filtered_service, method):
+    requests = [("dragon", 3), ("dragon", 3, {"genres": ["space"]}), ("dragon", 3, {"authors": ["nobody"]})]
+    results = filtered_service.recommend_books_batch(requests, method=method)
+    assert all(book.title.startswith("Dragon") for book in results[0])
+    assert len(results[1]) == 3 and all(book.title.startswith("Space") for book in results[1])
+    assert results[2] == []
+
+def test_filters_in_api(filtered_service):
+    app.dependency_overrides[get_recommendation_service] = lambda: filtered_service
+    try:
+        client = TestClient(app)
+        response = client.post(f"{settings.V1_STR}/recommend/cosine", json={
+            "description": "dragon", "num_recommendations": 4, "filters": {"genres": ["murder"]}})
+        assert response.status_code == 200
+        titles = [book["title"] for book in response.json()["recommendations"]]
+        assert len(titles) == 4 and all(title.startswith("Murder") for title in titles)
+    finally:
+        app.dependency_overrides.clear()
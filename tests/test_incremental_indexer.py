@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.data_generations import DataGenerations, InconsistentDataError
+from app.services.incremental_indexer import IncrementalIndexer, load_tombstones
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df, to_raw_items
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    book_service = FakeBookService(make_books_df(10))
+    chain = FakeProcessingChain()
+    RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+    chain.embeddings.calls.clear()
+    return book_service, chain, IncrementalIndexer(book_service, chain, data_dir=str(tmp_path))
+
+def reload(book_service, chain):
+    return RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+
+def test_only_changed_books_are_embedded(catalog):
+    book_service, chain, indexer = catalog
+    items = to_raw_items(book_service.df)
+    items[2]['volumeInfo']['description'] = "An entirely new story about volcano eruptions"
+    items[3]['volumeInfo']['title'] = "Renamed Book"
+    items.append({'id': 'new1', 'volumeInfo': {'title': 'Glacier Tales', 'authors': ['Ice'], 'description': 'glacier glacier ice'}})
+
+    changes = indexer.apply(items)
+    assert changes.added == ['new1']
+    assert changes.reembedded == ['book2']
+    assert changes.updated == ['book3']
+    assert chain.embeddings.calls == [("documents", 2)]
+
+    service = reload(book_service, chain)
+    assert service.num_books == 11
+    assert len(service.faiss_engine) == 11
+    for method in (service.recommend_books_faiss, service.recommend_books_cosine):
+        assert method("glacier ice", 1)[0].id == 'new1'
+        assert method("volcano eruptions", 1)[0].id == 'book2'
+    renamed = service.book_store.to_recommended_books([service.book_store.position_of('book3')], [1.0])[0]
+    assert renamed.title == "Renamed Book"
+
+def test_unchanged_catalog_is_a_no_op(catalog):
+    book_service, chain, indexer = catalog
+    assert indexer.apply(to_raw_items(book_service.df)).empty
+    assert chain.embeddings.calls == []
+
+def test_delete_and_compact(catalog, tmp_path):
+    book_service, chain, indexer = catalog
+    changes = indexer.apply(to_raw_items(book_service.df)[1:], remove_missing=True)
+    assert changes.removed == ['book0']
+    indexer.delete(['book1', 'unknown'])
+
+    service = reload(book_service, chain)
+    assert service.num_books == 8
+    assert service.book_store.position_of('book0') is None
+    generations = DataGenerations(str(tmp_path))
+    assert len(load_tombstones(generations.current_dir())) == 2
+
+    assert indexer.compact_in_background(min_ratio=0.5) is None
+    indexer.compact_in_background(min_ratio=0.1).join()
+    directory, num_rows = generations.current()
+    assert len(load_tombstones(directory)) == 0
+    assert len(book_service.df) == num_rows == 8
+    assert np.load(f"{directory}/embeddings.npy").shape[0] == 8
+    assert [book.id for book in reload(book_service, chain).recommend_books_cosine("dragon", 2)] == \
+        [book.id for book in service.recommend_books_cosine("dragon", 2)]
+
+def test_failed_update_leaves_the_current_generation(catalog, tmp_path, monkeypatch):
+    book_service, chain, indexer = catalog
+    indexer.apply(to_raw_items(book_service.df)[1:], remove_missing=True)
+    generations = DataGenerations(str(tmp_path))
+    before = generations.current()
+    df_before = book_service.df
+
+    def crash(self, embeddings):
+        raise OSError("disk full")
+
+    items = [{'id': 'new1', 'volumeInfo': {'title': 'Glacier Tales', 'authors': ['Ice'], 'description': 'glacier glacier ice'}}]
+    with monkeypatch.context() as patch:
+        # Fails after the embeddings were appended and the catalog written, before the commit
+        patch.setattr("app.services.faiss_engine.FaissShardFiles.load_or_build", crash)
+        with pytest.raises(OSError):
+            indexer.apply(items)
+    # The fake keeps its dataframe in memory rather than in the generation
+    book_service.df = df_before
+    assert generations.current() == before
+    assert np.load(f"{before[0]}/embeddings.npy").shape[0] == before[1] == 10
+    assert reload(book_service, chain).num_books == 9
+    # The next update starts over from the committed generation
+    assert indexer.apply(items).added == ['new1']
+    assert reload(book_service, chain).num_books == 10
+
+def test_mismatched_rows_are_refused(catalog, tmp_path):
+    book_service, chain, indexer = catalog
+    path = str(tmp_path / "embeddings.npy")
+    np.save(path, np.concatenate([np.load(path), np.zeros((1, 64), dtype=np.float32)]))
+    with pytest.raises(InconsistentDataError):
+        reload(book_service, chain)
+    with pytest.raises(InconsistentDataError):
+        indexer.apply(to_raw_items(book_service.df))
@@ -0,0 +1,124 @@
+import json
+import logging
+import queue
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.endpoints import get_recommendation_service
+from app.core.config import settings
+from app.core.logger import JsonFormatter, LogPipeline, SuccessSampler, api_logger, request_id, _QueueHandler
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_json_formatter_emits_fields_and_extras():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "failed %d", (3,), exc_info=sys.exc_info())
+    record.request_id = "abc"
+    record.duration_ms = 1.5
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "test"
+    assert entry["message"] == "failed 3"
+    assert entry["request_id"] == "abc"
+    assert entry["duration_ms"] == 1.5
+    assert "ValueError: boom" in entry["exc_info"]
+
+def test_pipeline_routes_loggers_to_their_files(tmp_path):
+    pipeline = LogPipeline(log_dir=tmp_path)
+    first = pipeline.add_logger("pipeline_test_first", "first.log")
+    second = pipeline.add_logger("pipeline_test_second", "second.log")
+    pipeline.start()
+    token = request_id.set("req-1")
+    try:
+        first.info("one %s", "arg", extra={"status": 200})
+        second.warning("two")
+    finally:
+        request_id.reset(token)
+    first.info("outside a request")
+    pipeline.stop()
+
+    first_lines = read_lines(tmp_path / "first.log")
+    assert [line["message"] for line in first_lines] == ["one arg", "outside a request"]
+    assert first_lines[0]["request_id"] == "req-1"
+    assert first_lines[0]["status"] == 200
+    assert "request_id" not in first_lines[1]
+    assert [line["message"] for line in read_lines(tmp_path / "second.log")] == ["two"]
+
+def test_pipeline_text_format_and_rotation(tmp_path):
+    pipeline = LogPipeline(log_dir=tmp_path, fmt="text", max_bytes=200, backup_count=2)
+    logger = pipeline.add_logger("pipeline_test_rotation", "rotating.log")
+    pipeline.start()
+    for i in range(20):
+        logger.info("line number %d with some padding text", i)
+    pipeline.stop()
+    assert (tmp_path / "rotating.log.1").exists()
+    assert not (tmp_path / "rotating.log.3").exists()
+    assert "INFO line number 19" in (tmp_path / "rotating.log").read_text()
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    pipeline = LogPipeline(log_dir=tmp_path, queue_size=2)
+    logger = pipeline.add_logger("pipeline_test_full", "full.log")
+    # Not started: nothing drains the queue
+    for i in range(5):
+        logger.info("record %d", i)
+    assert pipeline.dropped == 3
+
+@pytest.mark.parametrize("rate", [0.0, 0.5])
+def test_sampling_keeps_requests_together(rate):
+    sampler = SuccessSampler(rate)
+    assert sampler.filter(make_record(level=logging.WARNING, request_id="r1"))
+    assert sampler.filter(make_record())  # not part of a request
+    for i in range(20):
+        decisions = {sampler.filter(make_record(request_id=f"request-{i}")) for _ in range(3)}
+        assert len(decisions) == 1
+    kept = sum(sampler.filter(make_record(request_id=f"request-{i}")) for i in range(1000))
+    assert (kept == 0) if rate == 0.0 else 400 < kept < 600
+
+@pytest.fixture
+def access_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    service = RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    app.dependency_overrides[get_recommendation_service] = lambda: service
+    # A second queue handler, so the records are captured as the log writer would receive them
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records, 1000)
+    api_logger.addHandler(handler)
+    yield records
+    api_logger.removeHandler(handler)
+    app.dependency_overrides.clear()
+
+def test_request_id_and_access_log(access_log):
+    client = TestClient(app)
+    response = client.post(f"{settings.V1_STR}/recommend/faiss", json={"description": "dragon adventures", "num_recommendations": 2})
+    assert response.status_code == 200
+    generated = response.headers["X-Request-ID"]
+    assert len(generated) == 32
+
+    records = []
+    while not access_log.empty():
+        records.append(access_log.get())
+    access = [record for record in records if hasattr(record, "duration_ms")]
+    assert len(access) == 1
+    assert access[0].status == 200
+    assert access[0].route.endswith("/recommend/faiss")
+    assert set(access[0].stages_ms) == {"normalize", "embed", "search", "build"}
+    # Every api record of the request carries its id
+    assert len(records) > 1
+    assert {record.request_id for record in records} == {generated}
+
+def test_request_id_from_client(access_log):
+    client = TestClient(app)
+    assert client.get(f"{settings.V1_STR}/health/live", headers={"X-Request-ID": "client-id.1"}).headers["X-Request-ID"] == "client-id.1"
+    # Not a plain token: replaced by a generated id
+    assert client.get(f"{settings.V1_STR}/health/live", headers={"X-Request-ID": "bad id"}).headers["X-Request-ID"] != "bad id"
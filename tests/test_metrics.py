@@ -0,0 +1,96 @@
+import math
+import re
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.endpoints import router, get_recommendation_service
+from app.api.middleware import MetricsMiddleware
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, metrics, request_timings, RequestTimings, _NULL_TIMER
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    return RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+
+def test_render_counters_gauges_and_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    registry.gauge("queue_size", "Queue size", collect=lambda: 7)
+    registry.gauge("not_ready", "Skipped", collect=lambda: None)
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'queue_size 7' in text
+    assert 'not_ready' not in text
+
+def test_histogram_buckets_and_quantiles():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3, 1.0):
+        histogram.observe(value)
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="0.2"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 5' in text
+    assert 'latency_seconds_count 5' in text
+    values = histogram.labels()
+    assert 0.1 < values.quantile(0.5) <= 0.2
+    assert values.quantile(0.99) == 0.4
+    assert math.isnan(registry.histogram("empty", "Empty").labels().quantile(0.5))
+
+def test_duplicate_metric_names_are_rejected():
+    registry = MetricsRegistry()
+    registry.counter("things_total", "Things")
+    with pytest.raises(ValueError):
+        registry.gauge("things_total", "Things")
+
+def test_disabled_stage_is_a_no_op():
+    registry = MetricsRegistry(enabled=False)
+    assert registry.stage("faiss", "embed") is _NULL_TIMER
+    # Server-Timing still gets the stage even with metrics disabled
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    try:
+        with registry.stage("faiss", "embed"):
+            pass
+    finally:
+        request_timings.reset(token)
+    assert list(timings.stages) == ["embed"]
+    assert registry.stage_seconds.labels("faiss", "embed").count == 0
+
+def test_metrics_endpoint_reports_stages_and_gauges(service):
+    app.dependency_overrides[get_recommendation_service] = lambda: service
+    try:
+        client = TestClient(app)
+        response = client.post(f"{settings.V1_STR}/recommend/faiss", json={"description": "dragon adventures", "num_recommendations": 2})
+        assert response.status_code == 200
+        assert "Server-Timing" not in response.headers
+        text = client.get(f"{settings.V1_STR}/metrics").text
+    finally:
+        app.dependency_overrides.clear()
+    for stage in ("normalize", "embed", "search", "build"):
+        assert f'recommendation_stage_seconds_count{{backend="faiss",stage="{stage}"}}' in text
+    # The route template; whether it carries the router prefix depends on the FastAPI version
+    assert re.search(r'http_request_duration_seconds_count\{method="POST",route="[^"]*/recommend/faiss",status="200"\}', text)
+    assert "embedding_cache_hit_ratio" in text
+    assert "compute_jobs_in_flight 0" in text
+
+def test_metrics_endpoint_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    assert TestClient(app).get(f"{settings.V1_STR}/metrics").status_code == 404
+
+def test_server_timing_header(service):
+    timed_app = FastAPI()
+    timed_app.include_router(router, prefix=settings.V1_STR)
+    timed_app.add_middleware(MetricsMiddleware, server_timing=True)
+    timed_app.dependency_overrides[get_recommendation_service] = lambda: service
+    response = TestClient(timed_app).post(f"{settings.V1_STR}/recommend/cosine", json={"description": "space opera", "num_recommendations": 2})
+    assert response.status_code == 200
+    entries = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert entries == ["embed", "search", "build", "total"]
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.endpoints import get_recommendation_service
+from app.core.config import settings
+from app.services.incremental_indexer import IncrementalIndexer
+from app.services.neighbor_graph import NeighborGraph, neighbor_lists
+from app.services.recommendation_service import BookNotFoundError, RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+@pytest.fixture(scope="module")
+def vectors():
+    return np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+
+def brute_force(vectors, m, dead=()):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ normalized.T
+    np.fill_diagonal(scores, -np.inf)
+    scores[:, list(dead)] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :m]
+
+def test_blocked_lists_match_brute_force(vectors):
+    dead = np.zeros(len(vectors), dtype=bool)
+    dead[[3, 50, 199]] = True
+    ids, scores = neighbor_lists(vectors, (0, 200), (0, 200), 10, dead, query_block=7, candidate_block=13)
+    assert np.array_equal(ids, brute_force(vectors, 10, [3, 50, 199]))
+    assert np.all(scores[:, :-1] >= scores[:, 1:])
+    # Fewer candidates than m: padded
+    ids, scores = neighbor_lists(vectors, (0, 5), (0, 4), 6)
+    assert (ids >= 0).sum(axis=1).tolist() == [3, 3, 3, 3, 4]
+    assert np.isneginf(scores[ids < 0]).all()
+
+def test_update_matches_rebuild(vectors, tmp_path):
+    graph = NeighborGraph(str(tmp_path), m=10)
+    graph.rebuild(vectors[:150], query_block=32, candidate_block=40)
+    graph.update(vectors, query_block=32, candidate_block=40)
+    ids, scores = graph.load(200)
+    assert ids.dtype == np.int32 and scores.dtype == np.float16
+    rebuilt = NeighborGraph(str(tmp_path / "rebuilt"), m=10)
+    (tmp_path / "rebuilt").mkdir()
+    rebuilt.rebuild(vectors)
+    expected_ids, expected_scores = rebuilt.load(200)
+    # Stored lists carry float16 scores, so near-ties may swap places after a merge
+    assert np.allclose(scores.astype(np.float32), expected_scores.astype(np.float32), atol=2e-3)
+    assert (ids == expected_ids).mean() > 0.95
+    assert np.array_equal(expected_ids, brute_force(vectors, 10))
+    assert graph.load(199) is None
+
+@pytest.fixture
+def service_with_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    book_service, chain = FakeBookService(make_books_df(30)), FakeProcessingChain()
+    RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+    NeighborGraph.from_settings(str(tmp_path)).rebuild(np.load(tmp_path / "embeddings.npy"))
+    chain.embeddings.calls.clear()
+    return RecommendationService(book_service=book_service, processing_chain=chain, query_normalizer=fake_normalize)
+
+def test_by_id_answers_from_the_graph(service_with_graph):
+    service = service_with_graph
+    assert service.neighbor_graph is not None
+    books = service.recommend_books_by_id("book1", 4)
+    assert len(books) == 4 and "book1" not in [book.id for book in books]
+    assert all(book.title.startswith("Dragon") for book in books)
+    assert service.processing_chain.embeddings.calls == []
+    # The graph holds 29 neighbors per book here; asking for more than it holds falls back to exact search
+    assert len(service.recommend_books_by_id("book1", 100)) == 29
+    with pytest.raises(BookNotFoundError):
+        service.recommend_books_by_id("nobody", 3)
+
+def test_by_id_without_graph_matches(service_with_graph, tmp_path):
+    expected = service_with_graph.recommend_books_by_id("book2", 5)
+    service_with_graph.neighbor_graph = None
+    found = service_with_graph.recommend_books_by_id("book2", 5)
+    assert [book.similarity for book in found] == pytest.approx([book.similarity for book in expected], abs=1e-3)
+
+def test_graph_follows_incremental_updates(service_with_graph, tmp_path):
+    service = service_with_graph
+    indexer = IncrementalIndexer(service.book_service, service.processing_chain, data_dir=str(tmp_path))
+    indexer.apply([{'id': 'new1', 'volumeInfo': {'title': 'Murder Anew', 'authors': ['X'],
+                                                   'description': 'A murder mystery in a lighthouse with murder adventures'}}])
+    reloaded = RecommendationService(book_service=service.book_service, processing_chain=service.processing_chain, query_normalizer=fake_normalize)
+    assert reloaded.neighbor_graph is not None and len(reloaded.neighbor_graph[0]) == 31
+    assert reloaded.recommend_books_by_id("new1", 3)[0].title.startswith("Murder")
+    assert "new1" in [book.id for book in reloaded.recommend_books_by_id("book2", 6)]
+
+def test_by_id_api(service_with_graph):
+    app.dependency_overrides[get_recommendation_service] = lambda: service_with_graph
+    try:
+        client = TestClient(app)
+        response = client.get(f"{settings.V1_STR}/recommend/by-id/book3", params={"num_recommendations": 2})
+        assert response.status_code == 200
+        assert len(response.json()["recommendations"]) == 2
+        assert client.get(f"{settings.V1_STR}/recommend/by-id/nobody").status_code == 404
+        assert client.get(f"{settings.V1_STR}/recommend/by-id/book3", params={"num_recommendations": -1}).status_code == 422
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,54 @@
+import json
+import os
+import pytest
+from app.services.raw_book_store import RawBookStore
+
+def volumes(start, stop):
+    return [{"id": f"vol-{i}", "volumeInfo": {"title": f"Book {i}", "description": "Café société"}} for i in range(start, stop)]
+
+def test_append_and_stream_in_order(tmp_path):
+    store = RawBookStore(str(tmp_path / "raw"), shard_size=4)
+    assert not store.exists()
+    assert list(store.iter_items()) == []
+    assert store.append(volumes(0, 10)) == 10
+    assert store.append(volumes(10, 13)) == 3
+    assert [shard["count"] for shard in store.shards()] == [4, 4, 2, 3]
+    assert len(store) == 13
+    assert list(store.iter_items()) == volumes(0, 13)
+
+def test_append_never_rewrites_existing_shards(tmp_path):
+    store = RawBookStore(str(tmp_path / "raw"))
+    store.append(volumes(0, 5))
+    first = os.path.join(store.directory, store.shards()[0]["name"])
+    before = os.stat(first)
+    store.append(volumes(5, 8))
+    after = os.stat(first)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert len(store.shards()) == 2
+
+def test_empty_append_writes_nothing(tmp_path):
+    store = RawBookStore(str(tmp_path / "raw"))
+    assert store.append([]) == 0
+    assert not store.exists()
+
+def test_shard_left_by_crashed_append_is_ignored(tmp_path):
+    store = RawBookStore(str(tmp_path / "raw"))
+    store.append(volumes(0, 3))
+    # A shard written before a crash, but never added to the manifest
+    with open(os.path.join(store.directory, "shard-000002.jsonl.gz"), 'wb') as f:
+        f.write(b"garbage")
+    assert list(store.iter_items()) == volumes(0, 3)
+    store.append(volumes(3, 5))
+    assert list(store.iter_items()) == volumes(0, 5)
+
+def test_import_books_json(tmp_path):
+    path = tmp_path / "books.json"
+    path.write_text(json.dumps({"kind": "books#volumes", "items": volumes(0, 25)}, indent=4))
+    store = RawBookStore(str(tmp_path / "raw"), shard_size=10)
+    assert store.import_books_json(str(path)) == 25
+    assert len(store.shards()) == 3
+    assert list(store.iter_items()) == volumes(0, 25)
+
+def test_invalid_shard_size(tmp_path):
+    with pytest.raises(ValueError):
+        RawBookStore(str(tmp_path), shard_size=0)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.recommendation_service import RecommendationService
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+@pytest.fixture
+def offline_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    return RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+
+def test_builds_index_and_embeddings(offline_service, tmp_path):
+    assert (tmp_path / "faiss.index").exists()
+    assert (tmp_path / "embeddings.npy").exists()
+    assert offline_service.num_books == 20
+    assert len(offline_service.faiss_engine) == 20
+
+@pytest.mark.parametrize("method", ["recommend_books_faiss", "recommend_books_cosine"])
+def test_recommendations_resolve_metadata(offline_service, method):
+    recommendations = getattr(offline_service, method)("dragon adventures", 4)
+    assert len(recommendations) == 4
+    assert all("Dragon" in book.title for book in recommendations)
+    assert recommendations[0].similarity >= recommendations[-1].similarity
+
+def test_reloads_from_saved_files(offline_service, tmp_path):
+    reloaded = RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    before = [book.id for book in offline_service.recommend_books_faiss("python", 3)]
+    after = [book.id for book in reloaded.recommend_books_faiss("python", 3)]
+    assert before == after
+
+def test_corpus_is_embedded_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    chain = FakeProcessingChain()
+    RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=chain, query_normalizer=fake_normalize)
+    assert sum(size for kind, size in chain.embeddings.calls if kind == "documents") == 20
+
+@pytest.mark.parametrize("method", ["faiss", "cosine"])
+def test_batch_matches_single_queries(offline_service, method):
+    requests = [("dragon adventures", 3), ("python programming", 5), ("space", 0), ("robots", 2)]
+    results = offline_service.recommend_books_batch(requests, method=method)
+    single = getattr(offline_service, f"recommend_books_{method}")
+    for (description, k), result in zip(requests, results):
+        expected = single(description, k)
+        # Books share descriptions in the fake catalog, so tied books may come back in either order
+        assert [book.similarity for book in result] == pytest.approx([book.similarity for book in expected], abs=1e-5)
+
+def test_batch_embeds_once_and_reports_item_errors(offline_service):
+    chain = offline_service.processing_chain
+    chain.embeddings.calls.clear()
+    results = offline_service.recommend_books_batch([("dragon", 2), ("python", -1), ("mystery", 2)], method="cosine")
+    assert chain.embeddings.calls == [("documents", 2)]
+    assert isinstance(results[1], ValueError)
+    assert len(results[0]) == len(results[2]) == 2
+
+def test_matrices_are_memory_mapped(offline_service):
+    assert isinstance(offline_service.cosine_engine.matrix.base, np.memmap)
+
+def test_compressed_index_is_reranked(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "sq8")
+    monkeypatch.setattr(settings, "FAISS_TRUNCATE_DIM", 8)
+    service = RecommendationService(book_service=FakeBookService(make_books_df()), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    assert service.faiss_engine.rerank is service.cosine_engine
+    assert service.faiss_engine.index.d == 8
+    faiss_books = service.recommend_books_faiss("dragon adventures", 4)
+    cosine_books = service.recommend_books_cosine("dragon adventures", 4)
+    assert [book.similarity for book in faiss_books] == pytest.approx([book.similarity for book in cosine_books], abs=1e-5)
@@ -0,0 +1,59 @@
+import threading
+import pytest
+from app.services.service_provider import RecommendationServiceProvider, ServiceNotReadyError
+
+class FakeService:
+    def __init__(self, name):
+        self.name = name
+        self.num_books = 0
+
+def make_factory():
+    built = []
+    def factory():
+        service = FakeService(f"service-{len(built)}")
+        built.append(service)
+        return service
+    return factory, built
+
+def test_get_before_load_raises():
+    provider = RecommendationServiceProvider(factory=lambda: FakeService("unused"))
+    assert not provider.ready
+    with pytest.raises(ServiceNotReadyError):
+        provider.get()
+
+def test_load_builds_once():
+    factory, built = make_factory()
+    provider = RecommendationServiceProvider(factory=factory)
+    threads = [threading.Thread(target=provider.load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert provider.ready
+    assert provider.get() is built[0]
+    assert provider.generation == 1
+
+def test_reload_swaps_service():
+    factory, built = make_factory()
+    provider = RecommendationServiceProvider(factory=factory)
+    provider.load()
+    in_flight = provider.get()
+    provider.reload()
+    # Holders of the previous instance keep using it; new callers get the rebuilt one
+    assert in_flight is built[0]
+    assert provider.get() is built[1]
+    assert provider.generation == 2
+
+def test_failed_reload_keeps_live_service():
+    factory, built = make_factory()
+    provider = RecommendationServiceProvider(factory=factory)
+    provider.load()
+
+    def broken_factory():
+        raise RuntimeError("index build failed")
+    provider._factory = broken_factory
+    with pytest.raises(RuntimeError):
+        provider.reload()
+    assert provider.get() is built[0]
+    assert not provider.reloading
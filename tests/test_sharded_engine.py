@@ -0,0 +1,73 @@
+import json
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.cosine_engine import CosineSearchEngine
+from app.services.faiss_engine import FaissSearchEngine, FaissShardFiles, build_index
+from app.services.recommendation_service import RecommendationService
+from app.services.sharded_engine import ShardedSearchEngine, merge_top_k, shard_ranges
+from tests.fakes import fake_normalize, FakeBookService, FakeProcessingChain, make_books_df
+
+@pytest.fixture(scope="module")
+def vectors():
+    return np.random.default_rng(0).standard_normal((1000, 16)).astype(np.float32)
+
+def test_shard_ranges_and_merge():
+    assert shard_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    merged = merge_top_k([(np.array([4, 1]), np.array([0.9, 0.2])), (np.array([7, 8, 9]), np.array([0.5, 0.3, 0.1]))], 3)
+    assert merged[0].tolist() == [4, 7, 8]
+    assert np.allclose(merged[1], [0.9, 0.5, 0.3])
+
+def test_sharded_cosine_matches_unsharded(vectors):
+    positions = np.arange(len(vectors))
+    positions[::7] = -1
+    engine = CosineSearchEngine(vectors, positions=positions)
+    sharded = ShardedSearchEngine([(start, engine.shard(start, stop)) for start, stop in shard_ranges(len(vectors), 4)])
+    assert len(sharded) == len(engine)
+    queries = vectors[:5] + 0.1
+    expected = engine.search_batch(queries, 10)
+    found = sharded.search_batch(queries, 10)
+    assert np.array_equal(found[0], expected[0]) and np.allclose(found[1], expected[1])
+    rows = np.arange(100, 900, 3)
+    assert np.array_equal(sharded.search_subset(queries[0], rows, 10)[0], engine.search_subset(queries[0], rows, 10)[0])
+
+def test_sharded_faiss_matches_flat(vectors):
+    flat = FaissSearchEngine(build_index(vectors), np.arange(len(vectors)))
+    shards = [(start, FaissSearchEngine(build_index(vectors[start:stop]), np.arange(start, stop)))
+              for start, stop in shard_ranges(len(vectors), 3)]
+    sharded = ShardedSearchEngine(shards)
+    for (found, scores), (expected, expected_scores) in zip(sharded.search_batch(vectors[:5], 10), flat.search_batch(vectors[:5], 10)):
+        assert found.tolist() == expected.tolist() and np.allclose(scores, expected_scores, atol=1e-5)
+    found, _ = sharded.search_subset(vectors[0], np.arange(0, 1000, 2), 5)
+    assert len(found) == 5 and found[0] == 0 and all(position % 2 == 0 for position in found)
+
+def test_shard_files_append_to_last_shard(vectors, tmp_path):
+    index_files = FaissShardFiles.from_settings(str(tmp_path), num_shards=3)
+    shards = index_files.load_or_build(vectors[:900])
+    assert [start for start, _ in shards] == [0, 300, 600]
+    assert json.loads((tmp_path / "faiss.shards.json").read_text()) == {"starts": [0, 300, 600]}
+    first_shard_mtime = (tmp_path / "faiss.shard0.index").stat().st_mtime_ns
+    shards = index_files.load_or_build(vectors)
+    assert [index.ntotal for _, index in shards] == [300, 300, 400]
+    assert (tmp_path / "faiss.shard0.index").stat().st_mtime_ns == first_shard_mtime
+    # A new shard count lays the rows out again
+    shards = FaissShardFiles.from_settings(str(tmp_path), num_shards=2).load_or_build(vectors)
+    assert [(start, index.ntotal) for start, index in shards] == [(0, 500), (500, 500)]
+
+def test_sharded_service_matches_unsharded(tmp_path, monkeypatch):
+    books = make_books_df(60)
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path / "single"))
+    (tmp_path / "single").mkdir()
+    single = RecommendationService(book_service=FakeBookService(books), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path / "sharded"))
+    monkeypatch.setattr(settings, "SEARCH_SHARDS", 4)
+    (tmp_path / "sharded").mkdir()
+    sharded = RecommendationService(book_service=FakeBookService(books), processing_chain=FakeProcessingChain(), query_normalizer=fake_normalize)
+    assert isinstance(sharded.faiss_engine, ShardedSearchEngine) and len(sharded.faiss_engine.shards) == 4
+    for method in ("recommend_books_faiss", "recommend_books_cosine"):
+        for filters in (None, {"genres": ["space"]}):
+            expected = getattr(single, method)("dragon adventures", 5, filters=filters)
+            found = getattr(sharded, method)("dragon adventures", 5, filters=filters)
+            assert [book.similarity for book in found] == pytest.approx([book.similarity for book in expected], abs=1e-5)
+    results = sharded.recommend_books_batch([("dragon", 3), ("python", 2)], method="cosine")
+    assert [len(books) for books in results] == [3, 2]
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+import nltk
+import pandas as pd
+import pytest
+from nltk.tokenize.destructive import NLTKWordTokenizer
+from app.services.text_cleaning import iter_json_array, map_chunks_in_order, clean_book, regex_tokenize, TextCleaner
+
+# Sentence boundaries of the corpus descriptions, so the comparison below does not need punkt
+SENTENCE_END = re.compile(r"(?<=\.)\s+|(?<=\.[\"'”’)\]])\s+")
+
+# The sample corpus shipped in data/, whatever directory pytest runs from
+BOOKS_PICKLE = os.path.join(os.path.dirname(__file__), "..", "data", "books_df.pkl")
+
+def corpus_descriptions():
+    if not os.path.exists(BOOKS_PICKLE):
+        pytest.skip("data/books_df.pkl not available")
+    return pd.read_pickle(BOOKS_PICKLE)["description"]
+
+def alpha_tokens(tokens):
+    return [token for token in tokens if token.isalpha()]
+
+def nltk_data_available(*resources):
+    try:
+        for resource in resources:
+            nltk.data.find(resource)
+    except LookupError:
+        return False
+    return True
+
+def upper_chunk(items):
+    return [item.upper() for item in items]
+
+def test_map_chunks_in_order_preserves_order():
+    items = (f"book{i}" for i in range(250))
+    assert list(map_chunks_in_order(upper_chunk, items, workers=3, chunksize=7)) == [f"BOOK{i}" for i in range(250)]
+
+def test_iter_json_array_streams_items(tmp_path):
+    items = [{"id": str(i), "volumeInfo": {"description": "x" * (i * 37), "tags": ["[", "]", ","]}} for i in range(60)]
+    path = tmp_path / "books.json"
+    with open(path, 'w') as f:
+        json.dump({"kind": "books#volumes", "totalItems": 60, "items": items}, f, indent=4)
+    # A tiny read size forces items to be split across reads
+    assert list(iter_json_array(str(path), chunk_size=64)) == items
+
+def test_iter_json_array_empty(tmp_path):
+    path = tmp_path / "books.json"
+    path.write_text('{"items": []}')
+    assert list(iter_json_array(str(path))) == []
+
+def test_clean_book_skips_books_without_description():
+    assert clean_book({"id": "1", "volumeInfo": {"title": "No description"}}, str.lower) is None
+    book = clean_book({"id": "2", "volumeInfo": {"title": "T", "subtitle": "S", "description": "Some Text"}}, str.lower)
+    assert book == {"id": "2", "title": "T - S", "authors": [], "processed_description": "some text", "description": "Some Text", "genres": []}
+
+def test_regex_tokenizer_matches_nltk_on_corpus():
+    tokenizer = NLTKWordTokenizer()
+    descriptions = corpus_descriptions()
+    sentences = [sentence for description in descriptions for sentence in SENTENCE_END.split(description.lower())]
+    mismatches = [
+        sentence for sentence in sentences
+        if alpha_tokens(regex_tokenize(sentence)) != alpha_tokens(tokenizer.tokenize(sentence))
+    ]
+    # Only sentences where punkt's sentence splitting and ours disagree may differ
+    assert len(mismatches) <= len(sentences) // 1000
+
+def test_regex_tokenizer_splits_like_nltk():
+    text = "i can't believe it's 'the' book... dr. smith's \"best\" (so far). that''s it."
+    assert alpha_tokens(regex_tokenize(text)) == alpha_tokens(NLTKWordTokenizer().tokenize(text))
+
+def test_unknown_tokenizer_is_rejected():
+    with pytest.raises(ValueError):
+        TextCleaner(tokenizer="spacy")
+
+@pytest.mark.skipif(not nltk_data_available("tokenizers/punkt", "corpora/stopwords", "corpora/wordnet"), reason="NLTK data not installed")
+def test_regex_cleaner_matches_nltk_cleaner():
+    descriptions = corpus_descriptions().tolist()
+    nltk_cleaner, regex_cleaner = TextCleaner(tokenizer="nltk"), TextCleaner(tokenizer="regex")
+    matching = sum(nltk_cleaner(text) == regex_cleaner(text) for text in descriptions)
+    assert matching >= 0.99 * len(descriptions)